@@ -1,28 +1,25 @@
-from typing import Optional, List, Any
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Optional, List, Any, AsyncIterator
 from typing_extensions import TypedDict
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from openai import OpenAI
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
-from app import schemas
+from app import classifier, prescreen, schemas
+from app.classifier import classification_cache, classifier_settings
+from app.clients import clients
+from app.context_builder import build_context
+from app.json_stream import JSONObjectStream
+from app.vector_backends import vector_similarity
 from app.models import PolicyType
-from app.vectorstore import query_policy_chunks
+from app.vectorstore import query_policy_chunks, aquery_policy_chunks
 
 
-# ---------- Settings for LLM ----------
-
-class LLMSettings(BaseSettings):
-    OPENAI_API_KEY: str
-
-    model_config = SettingsConfigDict(
-        extra="ignore",
-        env_file=".env",
-    )
-
-
-llm_settings = LLMSettings()
-llm_client = OpenAI(api_key=llm_settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
 
 # ---------- Graph state ----------
@@ -33,10 +30,14 @@ class ComplianceState(TypedDict, total=False):
     department: Optional[str]
     policy_type: Optional[PolicyType]
     top_k: int
+    query_embedding: Optional[List[float]]  # precomputed by batch callers
+    rewrite: str  # schemas.RewriteMode value
 
     # intermediate
     matches: List[Any]
     context_text: str
+    classification: dict  # department / policy_type inferred for the retrieval
+    prescreen: dict  # PrescreenResult as a dict
 
     # final output (as plain dict so it’s JSON-able)
     response: dict
@@ -44,11 +45,9 @@ class ComplianceState(TypedDict, total=False):
 
 # ---------- Node 1: retrieve policies from Pinecone ----------
 
-def retrieve_policies(state: ComplianceState) -> ComplianceState:
-    text = state["text"]
+def _build_filters(state: ComplianceState) -> Optional[dict[str, Any]]:
     department = state.get("department")
     policy_type = state.get("policy_type")
-    top_k = state.get("top_k", 5)
 
     # Build filters same as before
     filters: dict[str, Any] = {}
@@ -58,36 +57,188 @@ def retrieve_policies(state: ComplianceState) -> ComplianceState:
         # Stored as string in metadata
         filters["policy_type"] = policy_type.value
 
-    matches = query_policy_chunks(
-        query=text,
-        top_k=top_k,
-        filters=filters or None,
-    )
+    return filters or None
 
-    # Build context snippets (assumes query_policy_chunks returns Pinecone matches
-    # with .metadata; if yours returns just IDs, adapt this to fetch from DB).
-    context_snippets: List[str] = []
-    for m in matches:
-        meta = getattr(m, "metadata", None) or m.get("metadata", {})
-        snippet = (
-            f"[doc_id={meta.get('document_id')}, "
-            f"chunk_id={meta.get('chunk_id')}] "
-            f"{meta.get('text', '')}"
-        )
-        context_snippets.append(snippet)
-
-    context_text = "\n\n".join(context_snippets)
 
+def _build_context(state: ComplianceState, matches: List[Any]) -> ComplianceState:
+    # adjacent chunks are merged, duplicates dropped and the result trimmed
+    # to CONTEXT_TOKEN_BUDGET (see app.context_builder)
     return {
         **state,
         "matches": matches,
-        "context_text": context_text,
+        "context_text": build_context(matches),
     }
 
 
-# ---------- Node 2: analyze + rewrite via LLM ----------
+def classify_context_with_llm(text: str) -> classifier.Classification:
+    """
+    Use the LLM to infer department and policy_type from the user's text.
+    Returns (department, policy_type_enum_or_None); cached per text.
+    """
+    cached = classification_cache.get(text)
+    if cached is not None:
+        return cached
+    completion = clients.openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=classifier.build_classification_messages(text),
+        response_format={"type": "json_object"},
+    )
+    result = classifier.parse_classification(completion.choices[0].message.content)
+    classification_cache.set(text, result)
+    return result
+
+
+async def aclassify_context(text: str) -> classifier.Classification:
+    cached = classification_cache.get(text)
+    if cached is not None:
+        return cached
+    completion = await clients.async_openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=classifier.build_classification_messages(text),
+        response_format={"type": "json_object"},
+    )
+    result = classifier.parse_classification(completion.choices[0].message.content)
+    classification_cache.set(text, result)
+    return result
+
+
+def _needs_classification(state: ComplianceState) -> bool:
+    return classifier_settings.CLASSIFIER_ENABLED and not (state.get("department") and state.get("policy_type"))
+
+
+def _classified(
+    state: ComplianceState,
+    candidates: List[Any],
+    classification: Optional[classifier.Classification],
+) -> ComplianceState:
+    top_k = state.get("top_k", 5)
+    if classification is None:
+        return _build_context(state, candidates[:top_k])
+
+    # only the fields the caller left out are inferred
+    department = None if state.get("department") else classification[0]
+    policy_type = None if state.get("policy_type") else classification[1]
+    matches = classifier.rerank(candidates, department, policy_type, top_k)
+    inferred = {"department": department, "policy_type": policy_type.value if policy_type else None}
+    return _build_context({**state, "classification": inferred}, matches)
+
 
-def analyze_and_rewrite(state: ComplianceState) -> ComplianceState:
+_classify_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_classify_pool() -> ThreadPoolExecutor:
+    global _classify_pool
+    if _classify_pool is None:
+        _classify_pool = ThreadPoolExecutor(
+            max_workers=classifier_settings.CLASSIFIER_SYNC_WORKERS,
+            thread_name_prefix="classify",
+        )
+    return _classify_pool
+
+
+def retrieve_policies(state: ComplianceState) -> ComplianceState:
+    if not _needs_classification(state):
+        matches = query_policy_chunks(
+            query=state["text"],
+            top_k=state.get("top_k", 5),
+            filters=_build_filters(state),
+            query_embedding=state.get("query_embedding"),
+        )
+        return _build_context(state, matches)
+
+    # same shape as aretrieve_policies: classify on a worker thread while
+    # this one embeds and retrieves
+    classifying = _get_classify_pool().submit(classify_context_with_llm, state["text"])
+    try:
+        candidates = query_policy_chunks(
+            query=state["text"],
+            top_k=state.get("top_k", 5) * classifier_settings.CLASSIFIER_CANDIDATE_MULTIPLIER,
+            filters=_build_filters(state),
+            query_embedding=state.get("query_embedding"),
+        )
+    except BaseException:
+        classifying.cancel()
+        raise
+
+    if prescreen.would_skip(state["text"], candidates):
+        # a call already in flight finishes on its thread; its result is unused
+        classifying.cancel()
+        return _classified(state, candidates, None)
+    try:
+        classification = classifying.result()
+    except Exception:
+        classification_cache.record_error()
+        logger.warning("Classification failed; using unfiltered matches", exc_info=True)
+        classification = None
+    return _classified(state, candidates, classification)
+
+
+async def aretrieve_policies(state: ComplianceState) -> ComplianceState:
+    if not _needs_classification(state):
+        matches = await aquery_policy_chunks(
+            query=state["text"],
+            top_k=state.get("top_k", 5),
+            filters=_build_filters(state),
+            query_embedding=state.get("query_embedding"),
+        )
+        return _build_context(state, matches)
+
+    # classify while embedding + an unfiltered, deeper retrieval run, then
+    # re-rank the candidates: no extra round trip on the critical path
+    classifying = asyncio.create_task(aclassify_context(state["text"]))
+    try:
+        candidates = await aquery_policy_chunks(
+            query=state["text"],
+            top_k=state.get("top_k", 5) * classifier_settings.CLASSIFIER_CANDIDATE_MULTIPLIER,
+            filters=_build_filters(state),
+            query_embedding=state.get("query_embedding"),
+        )
+    except BaseException:
+        classifying.cancel()
+        raise
+
+    # nothing close even unfiltered: the pre-screen will answer without the LLM
+    if prescreen.would_skip(state["text"], candidates):
+        classifying.cancel()
+        return _classified(state, candidates, None)
+    try:
+        classification = await classifying
+    except Exception:
+        classification_cache.record_error()
+        logger.warning("Classification failed; using unfiltered matches", exc_info=True)
+        classification = None
+    return _classified(state, candidates, classification)
+
+
+# ---------- Node 2: local pre-screen ----------
+
+def prescreen_text(state: ComplianceState) -> ComplianceState:
+    """Answer NONE without the LLM when no rule fires and no policy is close."""
+    result = prescreen.screen(state["text"], state.get("matches", []))
+    new_state: ComplianceState = {**state, "prescreen": asdict(result)}
+    if result.skip:
+        # nothing to fix; "always" still gets the (already compliant) text back
+        wants_text = state.get("rewrite") == schemas.RewriteMode.always.value
+        new_state["response"] = schemas.ComplianceCheckResponse(
+            overall_risk="NONE",
+            issues=[],
+            suggested_text=state["text"] if wants_text else None,
+        ).model_dump()
+    return new_state
+
+
+async def aprescreen_text(state: ComplianceState) -> ComplianceState:
+    # cheap and non-blocking: no need for a worker thread
+    return prescreen_text(state)
+
+
+def _after_prescreen(state: ComplianceState) -> str:
+    return "skip" if state["prescreen"]["skip"] else "analyze"
+
+
+# ---------- Node 3: analyze via LLM ----------
+
+def _build_analysis_messages(state: ComplianceState) -> List[dict]:
     text = state["text"]
     context_text = state.get("context_text", "")
 
@@ -106,8 +257,6 @@ Decide:
   - excerpt (the risky part of the user text)
   - explanation (why it is a problem)
 
-Then propose a fully rewritten version of the text that is compliant.
-
 Return ONLY a JSON object with this structure:
 
 {{
@@ -119,8 +268,7 @@ Return ONLY a JSON object with this structure:
       "excerpt": "some text from the user message",
       "explanation": "short explanation"
     }}
-  ],
-  "suggested_text": "rewritten compliant text"
+  ]
 }}
 
 User text:
@@ -130,17 +278,13 @@ User text:
 Policy context:
 \"\"\"{context_text}\"\"\""""
 
-    completion = llm_client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": "You are a strict compliance reviewer."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-    )
+    return [
+        {"role": "system", "content": "You are a strict compliance reviewer."},
+        {"role": "user", "content": prompt},
+    ]
 
-    raw_json = completion.choices[0].message.content
 
+def _parse_analysis(state: ComplianceState, raw_json: str) -> ComplianceState:
     # Parse into your existing Pydantic schema, then dump back to plain dict
     resp_model = schemas.ComplianceCheckResponse.model_validate_json(raw_json)
     resp_dict = resp_model.model_dump()
@@ -151,17 +295,207 @@ Policy context:
     }
 
 
+def analyze_policies(state: ComplianceState) -> ComplianceState:
+    completion = clients.openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=_build_analysis_messages(state),
+        response_format={"type": "json_object"},
+    )
+    return _parse_analysis(state, completion.choices[0].message.content)
+
+
+async def aanalyze_policies(state: ComplianceState) -> ComplianceState:
+    completion = await clients.async_openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=_build_analysis_messages(state),
+        response_format={"type": "json_object"},
+    )
+    return _parse_analysis(state, completion.choices[0].message.content)
+
+
+def _needs_rewrite(state: ComplianceState) -> bool:
+    mode = state.get("rewrite", schemas.RewriteMode.if_risky.value)
+    if mode == schemas.RewriteMode.always.value:
+        return True
+    if mode == schemas.RewriteMode.never.value:
+        return False
+    return state["response"]["overall_risk"].upper() not in ("NONE", "LOW")
+
+
+def _after_analysis(state: ComplianceState) -> str:
+    return "rewrite" if _needs_rewrite(state) else "done"
+
+
+# ---------- Node 4: rewrite via LLM (optional) ----------
+
+def _build_rewrite_messages(state: ComplianceState) -> List[dict]:
+    issues = json.dumps(state["response"].get("issues") or [], ensure_ascii=False, indent=2)
+
+    prompt = f"""
+Rewrite the user's text so that it complies with the policy excerpts and
+resolves the issues listed below. Keep the meaning, tone and format of
+the original wherever possible.
+
+Return ONLY the rewritten text, with no preamble or quotes.
+
+Issues found:
+{issues}
+
+User text:
+\"\"\"{state["text"]}\"\"\"
+
+
+Policy context:
+\"\"\"{state.get("context_text", "")}\"\"\""""
+
+    return [
+        {"role": "system", "content": "You rewrite drafts so they are compliant."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _with_rewrite(state: ComplianceState, suggested_text: str) -> ComplianceState:
+    return {
+        **state,
+        "response": {**state["response"], "suggested_text": suggested_text.strip()},
+    }
+
+
+def rewrite_text(state: ComplianceState) -> ComplianceState:
+    completion = clients.openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=_build_rewrite_messages(state),
+    )
+    return _with_rewrite(state, completion.choices[0].message.content or "")
+
+
+async def arewrite_text(state: ComplianceState) -> ComplianceState:
+    completion = await clients.async_openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=_build_rewrite_messages(state),
+    )
+    return _with_rewrite(state, completion.choices[0].message.content or "")
+
+
+# ---------- Streaming variant ----------
+
+def _policy_refs(matches: List[Any]) -> List[dict]:
+    refs = []
+    for m in matches:
+        meta = getattr(m, "metadata", None) or m.get("metadata", {})
+        refs.append({
+            "document_id": meta.get("document_id"),
+            "chunk_id": meta.get("chunk_id"),
+            "policy_type": meta.get("policy_type"),
+            "department": meta.get("department"),
+            "page_start": meta.get("page_start"),
+            "page_end": meta.get("page_end"),
+            "similarity": vector_similarity(m),
+        })
+    return refs
+
+
+# JSON fields of the analysis and the stream events they become
+_STREAMED_FIELDS = {"overall_risk": "risk", "issues": "issue"}
+
+
+async def astream_compliance(state: ComplianceState) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Run the pipeline and yield (event, data) as results become available:
+    "policies" right after retrieval, then "risk" and one "issue" per issue
+    parsed from the streamed analysis, "suggested_text" deltas of the
+    streamed rewrite (if the rewrite mode calls for one), and finally
+    "response" with the complete result.
+    """
+    state = await aretrieve_policies(state)
+    yield "policies", _policy_refs(state["matches"])
+
+    state = prescreen_text(state)
+    if state["prescreen"]["skip"]:
+        yield "risk", state["response"]["overall_risk"]
+        if state["response"]["suggested_text"] is not None:
+            yield "suggested_text", state["response"]["suggested_text"]
+        yield "response", state["response"]
+        return
+
+    stream = await clients.async_openai.chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=_build_analysis_messages(state),
+        response_format={"type": "json_object"},
+        stream=True,
+    )
+    parser = JSONObjectStream()
+    raw: List[str] = []
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if not content:
+            continue
+        raw.append(content)
+        for kind, key, value in parser.feed(content):
+            event = _STREAMED_FIELDS.get(key)
+            if event == "risk" and kind == "field":
+                yield event, value
+            elif event == "issue" and kind == "item":
+                yield event, value
+
+    state = _parse_analysis(state, "".join(raw))
+    if _needs_rewrite(state):
+        stream = await clients.async_openai.chat.completions.create(
+            model="gpt-4.1-mini",
+            messages=_build_rewrite_messages(state),
+            stream=True,
+        )
+        rewritten: List[str] = []
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                rewritten.append(content)
+                yield "suggested_text", content
+        state = _with_rewrite(state, "".join(rewritten))
+
+    yield "response", state["response"]
+
+
 # ---------- Build & export the graph ----------
 
 def build_compliance_graph():
     graph = StateGraph(ComplianceState)
 
-    graph.add_node("retrieve_policies", retrieve_policies)
-    graph.add_node("analyze_and_rewrite", analyze_and_rewrite)
+    # each node carries a sync and an async implementation, so the compiled
+    # graph supports both invoke() and ainvoke()
+    graph.add_node(
+        "retrieve_policies",
+        RunnableLambda(retrieve_policies, afunc=aretrieve_policies),
+    )
+    graph.add_node(
+        "prescreen",
+        RunnableLambda(prescreen_text, afunc=aprescreen_text),
+    )
+    graph.add_node(
+        "analyze_policies",
+        RunnableLambda(analyze_policies, afunc=aanalyze_policies),
+    )
+    graph.add_node(
+        "rewrite_text",
+        RunnableLambda(rewrite_text, afunc=arewrite_text),
+    )
 
     graph.set_entry_point("retrieve_policies")
-    graph.add_edge("retrieve_policies", "analyze_and_rewrite")
-    graph.add_edge("analyze_and_rewrite", END)
+    graph.add_edge("retrieve_policies", "prescreen")
+    graph.add_conditional_edges(
+        "prescreen",
+        _after_prescreen,
+        {"skip": END, "analyze": "analyze_policies"},
+    )
+    # by default only MEDIUM / HIGH verdicts pay for a rewrite (see RewriteMode)
+    graph.add_conditional_edges(
+        "analyze_policies",
+        _after_analysis,
+        {"rewrite": "rewrite_text", "done": END},
+    )
+    graph.add_edge("rewrite_text", END)
 
     return graph.compile()
 
@@ -0,0 +1,144 @@
+"""
+Incrementally maintained rollups of compliance checks (see the
+ComplianceDaily* models). The audit log writer adds each batch of checks
+to them in the same transaction; recompute_rollups() rebuilds a range of
+days from compliance_checks, to backfill history or repair drift:
+
+    python -m app.analytics --days 90
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+_MAX_ISSUE_TYPE_LENGTH = 100
+
+
+def utc_day(created_at: datetime) -> date:
+    # SQLite hands back naive datetimes; they were written in UTC
+    if created_at.tzinfo is None:
+        return created_at.date()
+    return created_at.astimezone(timezone.utc).date()
+
+
+def _dimension(value: Any) -> str:
+    if value is None:
+        return ""
+    return getattr(value, "value", value)
+
+
+def issue_types(issues: Optional[Iterable[Any]]) -> List[str]:
+    types = []
+    for issue in issues or []:
+        kind = issue.get("type") if isinstance(issue, dict) else getattr(issue, "type", None)
+        if kind and kind.strip():
+            types.append(kind.strip()[:_MAX_ISSUE_TYPE_LENGTH])
+    return types
+
+
+def aggregate(rows: Iterable[dict]) -> Tuple[Counter, Counter]:
+    """Risk and issue-type counts for compliance_checks rows (as dicts)."""
+    risks: Counter = Counter()
+    issues: Counter = Counter()
+    for row in rows:
+        day = utc_day(row["created_at"])
+        department = _dimension(row.get("department"))
+        risks[(day, department, _dimension(row.get("policy_type")), row["overall_risk"])] += 1
+        for kind in issue_types(row.get("issues")):
+            issues[(day, department, kind)] += 1
+    return risks, issues
+
+
+# ---------- Incremental updates ----------
+
+def _upsert_counts(db: Session, model, key_columns: List[str], counts: Counter) -> None:
+    """count += n per key, inserting missing keys."""
+    rows = [{**dict(zip(key_columns, key)), "count": n} for key, n in counts.items()]
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(model)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={"count": model.count + stmt.excluded.count},
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        where = [getattr(model, c) == row[c] for c in key_columns]
+        if not db.execute(update(model).where(*where).values(count=model.count + row["count"])).rowcount:
+            db.add(model(**row))
+
+
+def _add_counts(db: Session, risks: Counter, issues: Counter) -> None:
+    _upsert_counts(db, models.ComplianceDailyRiskCount, ["day", "department", "policy_type", "overall_risk"], risks)
+    _upsert_counts(db, models.ComplianceDailyIssueCount, ["day", "department", "issue_type"], issues)
+
+
+def record_checks(db: Session, rows: List[dict]) -> None:
+    """Add freshly inserted compliance_checks rows to the rollups; the caller commits."""
+    _add_counts(db, *aggregate(rows))
+
+
+# ---------- Compaction / backfill ----------
+
+def recompute_rollups(db: Session, start: date, end: date, batch_size: int = 5000) -> int:
+    """
+    Rebuild the rollups for days in [start, end] from compliance_checks, in
+    one transaction. Returns the number of checks scanned.
+    """
+    start_at = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    end_at = datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    if db.get_bind().dialect.name == "sqlite":
+        # stored naive; compare naive
+        start_at, end_at = start_at.replace(tzinfo=None), end_at.replace(tzinfo=None)
+    check = models.ComplianceCheck
+    stmt = (
+        select(check.created_at, check.department, check.policy_type, check.overall_risk, check.issues)
+        .where(check.created_at >= start_at, check.created_at < end_at)
+        .execution_options(yield_per=batch_size)
+    )
+    scanned = 0
+
+    def rows():
+        nonlocal scanned
+        for row in db.execute(stmt):
+            scanned += 1
+            yield row._asdict()
+
+    risks, issues = aggregate(rows())
+
+    for model in (models.ComplianceDailyRiskCount, models.ComplianceDailyIssueCount):
+        db.execute(delete(model).where(model.day >= start, model.day <= end))
+    _add_counts(db, risks, issues)
+    db.commit()
+    return scanned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90, help="rebuild this many days, up to today (UTC)")
+    args = parser.parse_args()
+
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=args.days - 1)
+    with SessionLocal() as db:
+        scanned = recompute_rollups(db, start, end)
+    print(f"Rebuilt rollups for {start}..{end} from {scanned} checks")
+
+
+if __name__ == "__main__":
+    main()
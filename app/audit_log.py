@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import analytics, models
+from app.database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+class AuditLogSettings(BaseSettings):
+    # queue checks and insert them in the background; off = insert on the request path
+    AUDIT_LOG_WRITE_BEHIND: bool = True
+    AUDIT_LOG_QUEUE_SIZE: int = 10_000
+    # a batch is flushed when it has this many rows ...
+    AUDIT_LOG_BATCH_SIZE: int = 500
+    # ... or this long after its first row arrived
+    AUDIT_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # backpressure: with a full queue, a request waits this long for room,
+    # then writes its rows itself
+    AUDIT_LOG_ENQUEUE_TIMEOUT_SECONDS: float = 2.0
+    # batches that fail to insert are written here and replayed later
+    AUDIT_LOG_SPILL_DIR: Path = BASE_DIR / "storage" / "audit_spill"
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+audit_log_settings = AuditLogSettings()
+
+
+def write_check_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Bulk-insert ComplianceCheck rows and add them to the analytics rollups, in one transaction."""
+    if not rows:
+        return
+    db.execute(insert(models.ComplianceCheck), rows)
+    analytics.record_checks(db, rows)
+    db.commit()
+
+
+def write_check_rows_in_new_session(rows: List[Dict[str, Any]]) -> None:
+    with SessionLocal() as db:
+        write_check_rows(db, rows)
+
+
+# ---------- Spill files (NDJSON) ----------
+
+def _to_json(row: Dict[str, Any]) -> str:
+    return json.dumps({
+        **row,
+        "created_at": row["created_at"].isoformat(),
+        "policy_type": row["policy_type"].value if row.get("policy_type") else None,
+    }, ensure_ascii=False)
+
+
+def _from_json(line: str) -> Dict[str, Any]:
+    row = json.loads(line)
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    row["policy_type"] = models.PolicyType(row["policy_type"]) if row.get("policy_type") else None
+    return row
+
+
+_STOP = object()
+
+
+class AuditLogWriter:
+    """
+    Write-behind writer for compliance check logs. Requests enqueue rows;
+    a background task inserts them in batches (AUDIT_LOG_BATCH_SIZE rows or
+    AUDIT_LOG_FLUSH_INTERVAL_SECONDS, whichever comes first). Batches that
+    fail are spilled to AUDIT_LOG_SPILL_DIR and replayed once inserts work
+    again; stop() flushes everything still queued.
+
+    Until start() is called (or with AUDIT_LOG_WRITE_BEHIND off) rows are
+    written synchronously, off the event loop.
+    """
+
+    def __init__(self, settings: AuditLogSettings):
+        self.settings = settings
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0, "written": 0, "batches": 0, "direct_writes": 0,
+            "backpressure_waits": 0, "spilled": 0, "replayed": 0, "errors": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if not self.settings.AUDIT_LOG_WRITE_BEHIND or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.settings.AUDIT_LOG_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(), name="audit-log-writer")
+        # rows spilled during a previous outage or run
+        await asyncio.to_thread(self.replay_spilled)
+
+    async def stop(self) -> None:
+        """Flush every queued row, then stop the background task."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def enqueue(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if not self.running:
+            await run_in_threadpool(self._write_or_spill, rows)
+            self._counters["direct_writes"] += 1
+            return
+
+        for i, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self._counters["backpressure_waits"] += 1
+                try:
+                    await asyncio.wait_for(self._queue.put(row), self.settings.AUDIT_LOG_ENQUEUE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    # the writer can't keep up: this request pays for its own rows
+                    await run_in_threadpool(self._write_or_spill, rows[i:])
+                    self._counters["direct_writes"] += 1
+                    return
+            self._counters["enqueued"] += 1
+
+    # --- background task ---
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.settings.AUDIT_LOG_FLUSH_INTERVAL_SECONDS
+            while len(batch) < self.settings.AUDIT_LOG_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    await asyncio.sleep(min(remaining, 0.05))
+                    continue
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await asyncio.to_thread(self._write_or_spill, batch)
+
+    def _write_or_spill(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            write_check_rows_in_new_session(rows)
+        except Exception:
+            self._counters["errors"] += 1
+            logger.exception("Writing %d compliance check logs failed; spilling to disk", len(rows))
+            self._spill(rows)
+            return
+        self._counters["written"] += len(rows)
+        self._counters["batches"] += 1
+        if self._has_spilled():
+            self.replay_spilled()
+
+    # --- spill / replay ---
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        directory = self.settings.AUDIT_LOG_SPILL_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson"
+        tmp = directory / f".{name}.tmp"
+        with tmp.open("w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(_to_json(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # complete files only: a crash mid-write leaves a .tmp that is never replayed
+        tmp.replace(directory / name)
+        self._counters["spilled"] += len(rows)
+
+    def _has_spilled(self) -> bool:
+        directory = self.settings.AUDIT_LOG_SPILL_DIR
+        return directory.is_dir() and any(directory.glob("*.ndjson"))
+
+    def replay_spilled(self) -> int:
+        """Insert spilled batches, oldest first, deleting each once written. Returns rows replayed."""
+        if not self._has_spilled() or not self._spill_lock.acquire(blocking=False):
+            return 0
+        replayed = 0
+        try:
+            for path in sorted(self.settings.AUDIT_LOG_SPILL_DIR.glob("*.ndjson")):
+                with path.open(encoding="utf-8") as f:
+                    rows = [_from_json(line) for line in f if line.strip()]
+                try:
+                    write_check_rows_in_new_session(rows)
+                except Exception:
+                    logger.warning("Replaying %s failed; will retry", path.name, exc_info=True)
+                    break
+                path.unlink()
+                replayed += len(rows)
+        finally:
+            self._spill_lock.release()
+        self._counters["replayed"] += replayed
+        return replayed
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "write_behind": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+audit_log_writer = AuditLogWriter(audit_log_settings)
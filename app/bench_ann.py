@@ -0,0 +1,76 @@
+"""
+Recall@k vs latency of the local IVF index against exact search.
+
+    python -m app.bench_ann --vectors 200000 --dim 384 --nprobe 4 8 16 32
+
+Vectors are synthetic (Gaussian clusters, like embeddings of many
+similar policy chunks); queries are perturbed copies of stored vectors.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.local_vectorstore import LocalVectorStore
+
+
+def _clustered(rng: np.random.Generator, n: int, dim: int, clusters: int) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    return centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def _timed_queries(store: LocalVectorStore, queries: np.ndarray, k: int, **kwargs) -> tuple[list, np.ndarray]:
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        matches = store.query(q.tolist(), k, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        results.append({m.id for m in matches})
+    return results, np.array(latencies) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = _clustered(rng, args.vectors, args.dim, args.clusters)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # train explicitly once everything is loaded
+        store = LocalVectorStore(directory, ann_min_vectors=args.vectors + 1, nlist=args.lists)
+        start = time.perf_counter()
+        for i in range(0, args.vectors, 10_000):
+            store.upsert([{"id": str(j), "values": data[j]} for j in range(i, min(i + 10_000, args.vectors))])
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.train()
+        train_s = time.perf_counter() - start
+        print(f"{args.vectors} x {args.dim} vectors, {store.describe()['ann_lists']} lists "
+              f"(load {load_s:.1f}s, train {train_s:.1f}s)")
+
+        picks = rng.integers(0, args.vectors, args.queries)
+        queries = data[picks] + 0.1 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+        truth, exact_ms = _timed_queries(store, queries, args.k, exact=True)
+        print(f"{'search':>12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+        print(f"{'exact':>12} {1.0:>10.3f} {np.percentile(exact_ms, 50):>8.2f} {np.percentile(exact_ms, 95):>8.2f}")
+
+        for nprobe in args.nprobe:
+            found, ms = _timed_queries(store, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(f & t) / args.k for f, t in zip(found, truth)])
+            print(f"{'nprobe=' + str(nprobe):>12} {recall:>10.3f} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+import threading
+from typing import Any, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app import models
+from app.embedding_cache import text_hash
+from app.lru_cache import LRUCache
+
+
+class ClassifierSettings(BaseSettings):
+    # infer department / policy_type for checks that don't specify them
+    CLASSIFIER_ENABLED: bool = True
+    CLASSIFIER_CACHE_MAX_ENTRIES: int = 5000
+    CLASSIFIER_CACHE_TTL_SECONDS: float = 3600.0
+    # unfiltered candidates retrieved per requested chunk while classifying
+    CLASSIFIER_CANDIDATE_MULTIPLIER: int = 3
+    # threads running classifications alongside retrieval in the sync graph
+    CLASSIFIER_SYNC_WORKERS: int = 4
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+classifier_settings = ClassifierSettings()
+
+Classification = tuple[Optional[str], Optional[models.PolicyType]]
+
+
+def build_classification_messages(text: str) -> List[dict]:
+    prompt = f"""
+You are a classifier for an AI compliance system.
+
+Given a piece of text, infer:
+- which department it most likely belongs to (e.g. "Sales", "Support", "HR", "Legal", "Marketing")
+- which policy_type applies, from this fixed list:
+  ["confidentiality", "external_communication", "data_privacy", "security", "hr"]
+
+If you are unsure about a field, set it to null.
+
+Return ONLY a JSON object with this exact shape:
+
+{{
+  "department": "Sales" | "Support" | "HR" | "Legal" | "Marketing" | null,
+  "policy_type": "confidentiality" | "external_communication" | "data_privacy" | "security" | "hr" | null
+}}
+
+Text:
+\"\"\"{text}\"\"\"
+"""
+
+    return [
+        {"role": "system", "content": "You classify text into department and policy_type for compliance checks."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_classification(content: str) -> Classification:
+    data = json.loads(content)
+
+    department = data.get("department") or None
+    policy_type_str = data.get("policy_type")
+
+    policy_type_enum: models.PolicyType | None = None
+    if policy_type_str:
+        try:
+            policy_type_enum = models.PolicyType(policy_type_str)
+        except ValueError:
+            policy_type_enum = None
+
+    return department, policy_type_enum
+
+
+class ClassificationCache:
+    """In-process LRU of classifications keyed by sha256 of the (stripped) text."""
+
+    def __init__(self, settings: ClassifierSettings):
+        self.local = LRUCache(settings.CLASSIFIER_CACHE_MAX_ENTRIES, settings.CLASSIFIER_CACHE_TTL_SECONDS)
+        # bumped from the event loop and from the classification pool
+        self._counters_lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def key(text: str) -> str:
+        return text_hash(text.strip())
+
+    def get(self, text: str) -> Optional[Classification]:
+        hit = self.local.get(self.key(text))
+        self._count("hits" if hit is not None else "misses")
+        return hit
+
+    def set(self, text: str, classification: Classification) -> None:
+        self.local.set(self.key(text), classification)
+
+    def record_error(self) -> None:
+        self._count("errors")
+
+    def _count(self, name: str) -> None:
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {**counters, "entries": len(self.local)}
+
+
+classification_cache = ClassificationCache(classifier_settings)
+
+
+def _match_metadata(match: Any) -> dict:
+    return getattr(match, "metadata", None) or match.get("metadata", {})
+
+
+def _same(value: Any, expected: str) -> bool:
+    return isinstance(value, str) and value.casefold() == expected.casefold()
+
+
+def rerank(
+    candidates: List[Any],
+    department: Optional[str],
+    policy_type: Optional[models.PolicyType],
+    top_k: int,
+) -> List[Any]:
+    """
+    Top `top_k` candidates, preferring those whose metadata agrees with the
+    inferred department / policy_type (None means "not inferred"). Order is
+    kept within each group, so a wrong guess only demotes, never drops,
+    the best unfiltered matches.
+    """
+    if department is None and policy_type is None:
+        return candidates[:top_k]
+
+    agreeing, others = [], []
+    for match in candidates:
+        meta = _match_metadata(match)
+        ok = (department is None or _same(meta.get("department"), department)) and (
+            policy_type is None or _same(meta.get("policy_type"), policy_type.value)
+        )
+        (agreeing if ok else others).append(match)
+    return (agreeing + others)[:top_k]
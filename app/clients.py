@@ -0,0 +1,116 @@
+import threading
+from typing import Any, Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, Timeout
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class ClientSettings(BaseSettings):
+    # only required once a client is first used, so imports work without it
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MAX_RETRIES: int = 2
+
+    # shared by all OpenAI calls (chat + embeddings), per sync / async client
+    HTTP_TIMEOUT_SECONDS: float = 60.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    # max requests in flight; further calls wait up to HTTP_TIMEOUT_SECONDS for a slot
+    HTTP_MAX_CONNECTIONS: int = 64
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 32
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+
+    # threads (and pooled connections) of the Pinecone index handle
+    PINECONE_POOL_THREADS: int = 8
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+client_settings = ClientSettings()
+
+
+class _Lazy:
+    """Like functools.cached_property, but built at most once across threads."""
+
+    def __init__(self, factory: Callable[["ClientRegistry"], Any]):
+        self.factory = factory
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __get__(self, registry: Optional["ClientRegistry"], owner=None):
+        if registry is None:
+            return self
+        with registry._lock:
+            # once built, the instance attribute shadows this descriptor
+            if self.name not in registry.__dict__:
+                registry.__dict__[self.name] = self.factory(registry)
+        return registry.__dict__[self.name]
+
+
+class ClientRegistry:
+    """
+    Process-wide clients, created on first use and shared by all modules:
+    OpenAI (sync + async) over keep-alive connection pools, and the
+    configured vector store. Tests can monkeypatch the attributes.
+    """
+
+    def __init__(self, settings: ClientSettings):
+        self.settings = settings
+        self._lock = threading.RLock()
+
+    def _api_key(self) -> str:
+        if not self.settings.OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY is not set")
+        return self.settings.OPENAI_API_KEY
+
+    def _timeout(self) -> Timeout:
+        return Timeout(self.settings.HTTP_TIMEOUT_SECONDS, connect=self.settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=self.settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=self.settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+
+    @_Lazy
+    def openai(self) -> OpenAI:
+        return OpenAI(
+            api_key=self._api_key(),
+            timeout=self._timeout(),
+            max_retries=self.settings.OPENAI_MAX_RETRIES,
+            http_client=DefaultHttpxClient(timeout=self._timeout(), limits=self._limits()),
+        )
+
+    @_Lazy
+    def async_openai(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key=self._api_key(),
+            timeout=self._timeout(),
+            max_retries=self.settings.OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(timeout=self._timeout(), limits=self._limits()),
+        )
+
+    @_Lazy
+    def vector_store(self):
+        # imported here: app.vectorstore itself uses this registry
+        from app.vectorstore import build_vector_store, settings
+        return build_vector_store(settings, pool_threads=self.settings.PINECONE_POOL_THREADS)
+
+    def close(self) -> None:
+        """Close the sync connection pool (the async one is closed by aclose())."""
+        client = self.__dict__.pop("openai", None)
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        client = self.__dict__.pop("async_openai", None)
+        if client is not None:
+            await client.close()
+
+
+clients = ClientRegistry(client_settings)
@@ -0,0 +1,177 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app.embedding_batcher import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the ~4 chars/token estimate
+    tiktoken = None
+
+
+class ContextSettings(BaseSettings):
+    # max tokens of policy context sent to the analysis prompt
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_TOKENIZER_ENCODING: str = "o200k_base"
+    # word-shingle Jaccard similarity above which a snippet counts as a duplicate
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8
+    # a snippet that does not fit is truncated only if this many tokens remain
+    CONTEXT_MIN_TAIL_TOKENS: int = 50
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+context_settings = ContextSettings()
+
+# adjacent chunks overlap by ~200 chars (see split_text_into_chunks)
+_MAX_OVERLAP = 1000
+_SHINGLE_SIZE = 5
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class ContextSnippet:
+    document_id: Any
+    chunk_ids: List[Any]
+    text: str
+    rank: int  # best retrieval rank among the merged chunks
+    position: Optional[int] = None  # position of the last merged chunk
+    shingles: frozenset = field(default_factory=frozenset)
+
+    def header(self) -> str:
+        if len(self.chunk_ids) == 1:
+            return f"[doc_id={self.document_id}, chunk_id={self.chunk_ids[0]}]"
+        return f"[doc_id={self.document_id}, chunk_ids={','.join(str(c) for c in self.chunk_ids)}]"
+
+
+@lru_cache(maxsize=4)
+def _encoding(name: str):
+    return tiktoken.get_encoding(name) if tiktoken is not None else None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding(context_settings.CONTEXT_TOKENIZER_ENCODING)
+    return len(enc.encode(text)) if enc is not None else estimate_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    enc = _encoding(context_settings.CONTEXT_TOKENIZER_ENCODING)
+    if enc is None:
+        return text[:max_tokens * 4]
+    tokens = enc.encode(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    for k in range(min(len(left), len(right), _MAX_OVERLAP), 0, -1):
+        if left.endswith(right[:k]):
+            return k
+    return 0
+
+
+def _shingles(text: str) -> frozenset:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _match_metadata(match: Any) -> dict:
+    return getattr(match, "metadata", None) or match.get("metadata", {})
+
+
+def merge_adjacent(matches: List[Any]) -> List[ContextSnippet]:
+    """
+    One snippet per run of consecutive chunks (by position) of the same
+    document, with the overlap between neighbours removed. Snippets are
+    returned in order of their best-ranked chunk.
+    """
+    snippets: List[ContextSnippet] = []
+    by_document: dict = {}
+    for rank, match in enumerate(matches):
+        meta = _match_metadata(match)
+        snippet = ContextSnippet(
+            document_id=meta.get("document_id"),
+            chunk_ids=[meta.get("chunk_id")],
+            text=meta.get("text", ""),
+            rank=rank,
+            position=meta.get("position"),
+        )
+        if snippet.position is None:
+            snippets.append(snippet)
+        else:
+            by_document.setdefault(snippet.document_id, []).append(snippet)
+
+    for chunks in by_document.values():
+        chunks.sort(key=lambda s: s.position)
+        current = chunks[0]
+        for nxt in chunks[1:]:
+            if nxt.position == current.position + 1:
+                cut = overlap_length(current.text, nxt.text)
+                joiner = "" if cut else "\n"
+                current.text = current.text + joiner + nxt.text[cut:]
+                current.chunk_ids.append(nxt.chunk_ids[0])
+                current.rank = min(current.rank, nxt.rank)
+                current.position = nxt.position
+            elif nxt.position != current.position:  # same chunk twice
+                snippets.append(current)
+                current = nxt
+        snippets.append(current)
+
+    snippets.sort(key=lambda s: s.rank)
+    return snippets
+
+
+def drop_near_duplicates(snippets: List[ContextSnippet], threshold: float) -> List[ContextSnippet]:
+    """Keep the best-ranked of any snippets whose word shingles mostly coincide."""
+    kept: List[ContextSnippet] = []
+    for snippet in snippets:
+        snippet.shingles = _shingles(snippet.text)
+        if all(_jaccard(snippet.shingles, k.shingles) < threshold for k in kept):
+            kept.append(snippet)
+    return kept
+
+
+def build_context(
+    matches: List[Any],
+    token_budget: Optional[int] = None,
+    count: Callable[[str], int] = count_tokens,
+) -> str:
+    """
+    Context text for the analysis prompt: adjacent chunks merged, overlap
+    and near-duplicates removed, most relevant first, cut at token_budget
+    (CONTEXT_TOKEN_BUDGET by default) with the last snippet truncated.
+    """
+    budget = context_settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    snippets = drop_near_duplicates(merge_adjacent(matches), context_settings.CONTEXT_DEDUP_THRESHOLD)
+
+    parts: List[str] = []
+    used = 0
+    separator_tokens = count("\n\n")
+    for snippet in snippets:
+        text = f"{snippet.header()} {snippet.text}"
+        cost = count(text) + (separator_tokens if parts else 0)
+        if used + cost <= budget:
+            parts.append(text)
+            used += cost
+            continue
+        remaining = budget - used - (separator_tokens if parts else 0)
+        if remaining >= context_settings.CONTEXT_MIN_TAIL_TOKENS:
+            parts.append(truncate_to_tokens(text, remaining))
+        break
+
+    return "\n\n".join(parts)
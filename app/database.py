@@ -1,19 +1,212 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import create_engine, exc, inspect, text
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from .models import Base
 
+logger = logging.getLogger(__name__)
+
 
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # below typical server / proxy idle timeouts
+    DB_POOL_PRE_PING: bool = True
+
+    # optional AsyncEngine for async code paths (PostgreSQL via asyncpg)
+    DB_ASYNC_ENABLED: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None  # default: DATABASE_URL with the asyncpg driver
+
     model_config = SettingsConfigDict(
-        extra='ignore', 
+        extra='ignore',
         env_file=".env",
         )
 
 
 settings = Settings()
 
-engine = create_engine(settings.DATABASE_URL, future=True)
+
+# ---------- Pool instrumentation ----------
+
+class _TimedCheckout:
+    """Counts checkouts and the time spent getting a connection (waiting or connecting)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return entry
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            checkouts, wait, max_wait, timeouts = self.checkouts, self.wait_seconds, self.max_wait_seconds, self.timeouts
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "avg_wait_ms": round(wait / checkouts * 1000, 3) if checkouts else 0.0,
+            "max_wait_ms": round(max_wait * 1000, 3),
+        }
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(url: URL, poolclass) -> dict:
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # one connection per thread; nothing to size
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+_url = make_url(settings.DATABASE_URL)
+engine = create_engine(_url, future=True, **_pool_options(_url, InstrumentedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# ---------- Async engine (optional) ----------
+
+def async_database_url() -> URL:
+    if settings.ASYNC_DATABASE_URL:
+        return make_url(settings.ASYNC_DATABASE_URL)
+    if _url.get_backend_name() == "postgresql":
+        return _url.set(drivername="postgresql+asyncpg")
+    if _url.get_backend_name() == "sqlite":
+        return _url.set(drivername="sqlite+aiosqlite")
+    raise ValueError(f"No async driver known for {_url.drivername}; set ASYNC_DATABASE_URL")
+
+
+_async_lock = threading.Lock()
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """async_sessionmaker bound to the AsyncEngine (built on first use), or None if DB_ASYNC_ENABLED is off."""
+    global _async_engine, _async_sessionmaker
+    if not settings.DB_ASYNC_ENABLED:
+        return None
+    if _async_sessionmaker is None:
+        with _async_lock:
+            if _async_sessionmaker is None:
+                # needs the async driver (asyncpg) installed
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                url = async_database_url()
+                _async_engine = create_async_engine(url, **_pool_options(url, InstrumentedAsyncQueuePool))
+                _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
+
+
+def pool_stats() -> dict:
+    """Checked-out / overflow connections and checkout wait times, per engine."""
+    def describe(pool) -> dict:
+        if isinstance(pool, _TimedCheckout):
+            return pool.stats()
+        return {"pool": type(pool).__name__}
+
+    stats = {"sync": describe(engine.pool)}
+    if _async_engine is not None:
+        stats["async"] = describe(_async_engine.pool)
+    return stats
+
+
+# Columns added to tables that already existed before them. create_all does
+# not alter existing tables, so init_db adds any of these that are missing
+# (all nullable, so no backfill is needed).
+ADDED_COLUMNS = {
+    "policy_chunks": ("content_hash", "position", "page_start", "page_end", "token_count"),
+    "ingestion_jobs": ("claimed_by", "heartbeat_at"),
+}
+
+
+def _add_missing_columns(bind: Engine) -> None:
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    with bind.begin() as conn:
+        for table_name, names in ADDED_COLUMNS.items():
+            if not inspector.has_table(table_name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table_name)}
+            table = Base.metadata.tables[table_name]
+            for name in names:
+                if name in existing:
+                    continue
+                column_ddl = CreateColumn(table.c[name]).compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"))
+                logger.info("Added column %s.%s", table_name, name)
+
+
+def init_db(bind: Engine = engine) -> None:
+    """Create missing tables, columns and indexes. Run at startup (see app.main) or once per deploy:
+
+        python -m app.database
+    """
+    Base.metadata.create_all(bind=bind)
+    _add_missing_columns(bind)
+    # create_all skips tables that already exist, so indexes added to an
+    # existing model are created here
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            missing = [c.name for c in index.columns if c.name not in existing]
+            if missing:
+                logger.warning("Skipping index %s: %s.%s not in the database", index.name, table.name, ", ".join(missing))
+                continue
+            index.create(bind=bind, checkfirst=True)
+
+
+if __name__ == "__main__":
+    init_db()
@@ -0,0 +1,153 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class EmbeddingBatcherSettings(BaseSettings):
+    EMBEDDING_BATCH_ENABLED: bool = True
+    # how long the first request in a batch waits for company
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0
+    # per embeddings call; the API accepts up to 2048 inputs / 300k tokens
+    EMBEDDING_BATCH_MAX_ITEMS: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100_000
+    # embeddings calls allowed in flight at once
+    EMBEDDING_BATCH_MAX_IN_FLIGHT: int = 4
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+embedding_batcher_settings = EmbeddingBatcherSettings()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-bound-ish token estimate (~4 chars per token) for batch budgeting."""
+    return len(text) // 4 + 1
+
+
+class _Item:
+    __slots__ = ("text", "tokens", "future")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.future: Future = Future()
+
+
+class EmbeddingBatcher:
+    """
+    Collects single-text embedding requests from any thread or coroutine for
+    up to EMBEDDING_BATCH_WINDOW_MS, sends them as one embeddings call
+    (bounded by item count and token budget) and fans the vectors back out.
+
+    A daemon collector thread forms batches; a small thread pool runs the
+    calls so collection continues while earlier batches are in flight.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], settings: EmbeddingBatcherSettings):
+        self.embed_fn = embed_fn
+        self.settings = settings
+        self._queue: "queue.Queue[_Item]" = queue.Queue()
+        self._carry: Optional[_Item] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._counters = {"batches": 0, "items": 0, "errors": 0}
+
+    # --- public API ---
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        self._ensure_started()
+        items = [_Item(t) for t in texts]
+        for item in items:
+            self._queue.put(item)
+        return [item.future for item in items]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Blocking: embed texts through the shared batches."""
+        return [f.result() for f in self.submit(texts)]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in self.submit(texts))))
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        batches = counters["batches"]
+        return {
+            **counters,
+            "avg_batch_size": counters["items"] / batches if batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    # --- internals ---
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.settings.EMBEDDING_BATCH_MAX_IN_FLIGHT,
+                    thread_name_prefix="embedding-batch",
+                )
+                self._thread = threading.Thread(target=self._collect_forever, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _next_item(self, timeout: Optional[float]) -> Optional[_Item]:
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _collect_forever(self) -> None:
+        window = self.settings.EMBEDDING_BATCH_WINDOW_MS / 1000.0
+        while True:
+            first = self._next_item(timeout=None)
+            batch = [first]
+            tokens = first.tokens
+            deadline = time.monotonic() + window
+
+            while len(batch) < self.settings.EMBEDDING_BATCH_MAX_ITEMS:
+                item = self._next_item(timeout=max(0.0, deadline - time.monotonic()))
+                if item is None:
+                    break
+                if tokens + item.tokens > self.settings.EMBEDDING_BATCH_MAX_TOKENS:
+                    # starts the next batch instead
+                    self._carry = item
+                    break
+                batch.append(item)
+                tokens += item.tokens
+
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[_Item]) -> None:
+        try:
+            vectors = self.embed_fn([item.text for item in batch])
+            if len(vectors) != len(batch):
+                # zip() would leave the unmatched callers waiting forever
+                raise ValueError(f"Embedding call returned {len(vectors)} vectors for {len(batch)} inputs")
+        except BaseException as e:
+            with self._counters_lock:
+                self._counters["errors"] += 1
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        with self._counters_lock:
+            self._counters["batches"] += 1
+            self._counters["items"] += len(batch)
+        for item, vec in zip(batch, vectors):
+            item.future.set_result(vec)
@@ -0,0 +1,199 @@
+import hashlib
+import sys
+import threading
+from array import array
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.lru_cache import LRUCache
+
+
+class EmbeddingCacheSettings(BaseSettings):
+    EMBEDDING_CACHE_ENABLED: bool = True
+    # also keep embeddings in the embedding_cache table, across restarts and workers
+    EMBEDDING_CACHE_PERSIST: bool = True
+    # in-process entries; each is dim * 4 bytes (~6 KB for text-embedding-3-small)
+    EMBEDDING_CACHE_LOCAL_MAX_ENTRIES: int = 10_000
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+embedding_cache_settings = EmbeddingCacheSettings()
+
+
+# ---------- Storage format ----------
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    """Encode an embedding as little-endian float32."""
+    arr = array("f", vector)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    arr = array("f")
+    arr.frombytes(data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tolist()
+
+
+# ---------- Cache ----------
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model name, sha256 of text): an in-process LRU of
+    packed float32 bytes in front of the embedding_cache table.
+    """
+
+    def __init__(self, settings: EmbeddingCacheSettings):
+        self.settings = settings
+        self.local = LRUCache(settings.EMBEDDING_CACHE_LOCAL_MAX_ENTRIES)
+        self._counters = {"local_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def _local_key(model: str, key: str) -> str:
+        return f"{model}:{key}"
+
+    def get_local(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """Non-blocking lookup in the in-process tier only."""
+        found: Dict[str, List[float]] = {}
+        if not self.settings.EMBEDDING_CACHE_ENABLED:
+            return found
+        for key in keys:
+            packed = self.local.get(self._local_key(model, key))
+            if packed is not None:
+                found[key] = unpack_vector(packed)
+        self._counters["local_hits"] += len(found)
+        return found
+
+    def get_persistent(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """Blocking lookup in the embedding_cache table; hits are promoted to the local tier."""
+        found: Dict[str, List[float]] = {}
+        if not keys or not (self.settings.EMBEDDING_CACHE_ENABLED and self.settings.EMBEDDING_CACHE_PERSIST):
+            self._counters["misses"] += len(keys)
+            return found
+        try:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(models.EmbeddingCacheEntry.text_hash, models.EmbeddingCacheEntry.vector)
+                    .where(models.EmbeddingCacheEntry.model == model)
+                    .where(models.EmbeddingCacheEntry.text_hash.in_(keys))
+                ).all()
+        except Exception:
+            self._counters["errors"] += 1
+            rows = []
+        for key, packed in rows:
+            self.local.set(self._local_key(model, key), packed)
+            found[key] = unpack_vector(packed)
+        self._counters["persistent_hits"] += len(found)
+        self._counters["misses"] += len(keys) - len(found)
+        return found
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """Blocking lookup through both tiers."""
+        found = self.get_local(model, keys)
+        found.update(self.get_persistent(model, [k for k in keys if k not in found]))
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """Blocking: store fresh embeddings in both tiers. Persistence errors are swallowed."""
+        if not vectors or not self.settings.EMBEDDING_CACHE_ENABLED:
+            return
+        packed = {key: pack_vector(vec) for key, vec in vectors.items()}
+        for key, data in packed.items():
+            self.local.set(self._local_key(model, key), data)
+
+        if not self.settings.EMBEDDING_CACHE_PERSIST:
+            return
+        rows = [
+            {"model": model, "text_hash": key, "dim": len(vectors[key]), "vector": data}
+            for key, data in packed.items()
+        ]
+        try:
+            with SessionLocal() as db:
+                _insert_ignore(db, rows)
+                db.commit()
+        except Exception:
+            self._counters["errors"] += 1
+
+    def stats(self) -> dict:
+        return {**self._counters, "local_entries": len(self.local)}
+
+
+def _insert_ignore(db: Session, rows: List[dict]) -> None:
+    """Bulk insert embedding rows, skipping keys another worker already stored."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        for row in rows:
+            db.merge(models.EmbeddingCacheEntry(**row))
+        return
+    db.execute(dialect_insert(models.EmbeddingCacheEntry).on_conflict_do_nothing(), rows)
+
+
+embedding_cache = EmbeddingCache(embedding_cache_settings)
+
+
+# ---------- Single-flight ----------
+
+class SingleFlight:
+    """
+    Coalesces concurrent work on the same keys: the first caller to claim a
+    key owns it and must resolve or fail it; later callers get the owner's
+    Future. concurrent.futures.Future is used so both threads (.result())
+    and coroutines (asyncio.wrap_future) can wait on it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def claim(self, keys: List[str]) -> tuple[List[str], Dict[str, Future]]:
+        """Return (keys this caller now owns, futures for keys owned by others)."""
+        owned: List[str] = []
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            for key in keys:
+                fut = self._inflight.get(key)
+                if fut is None:
+                    self._inflight[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = fut
+        return owned, waiting
+
+    def resolve(self, results: Dict[str, Any]) -> None:
+        with self._lock:
+            futures = [(self._inflight.pop(key), value) for key, value in results.items() if key in self._inflight]
+        for fut, value in futures:
+            fut.set_result(value)
+
+    def fail(self, keys: List[str], exc: BaseException) -> None:
+        with self._lock:
+            futures = [self._inflight.pop(key) for key in keys if key in self._inflight]
+        for fut in futures:
+            fut.set_exception(exc)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+inflight_embeddings = SingleFlight()
@@ -1,9 +1,49 @@
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from .database import SessionLocal
+from .database import SessionLocal, get_async_sessionmaker
+
+if TYPE_CHECKING:
+    # sqlalchemy.ext.asyncio needs greenlet, which only async deployments install
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
 
-def get_db():
+
+def get_db() -> Iterator[Session]:
+    """Request-scoped Session; the FastAPI dependency for sync endpoints."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[Optional["AsyncSession"]]:
+    """
+    Request-scoped AsyncSession for async endpoints, or None with
+    DB_ASYNC_ENABLED off; pass it to run_sync either way.
+    """
+    maker = get_async_sessionmaker()
+    if maker is None:
+        yield None
+        return
+    async with maker() as db:
+        yield db
+
+
+async def run_sync(db: Optional["AsyncSession"], fn: Callable[..., T], *args) -> T:
+    """
+    Call fn(session, *args) from an async endpoint: on the request's
+    AsyncSession when there is one (no thread hop), otherwise in a
+    SessionLocal session on the threadpool.
+    """
+    if db is not None:
+        return await db.run_sync(fn, *args)
+
+    def call() -> T:
+        with SessionLocal() as session:
+            return fn(session, *args)
+
+    return await run_in_threadpool(call)
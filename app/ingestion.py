@@ -1,77 +1,383 @@
-from typing import List
-from app import models
-import fitz
-from sqlalchemy.orm import Session
-from app.vectorstore import index_policy_chunks
+import argparse
+import hashlib
+import logging
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional
+from app import lexical_index, models, pdf_extract
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session, joinedload
+from app.clients import clients
+from app.database import SessionLocal
+from app.vectorstore import drop_legacy_vectors, index_policy_chunks, delete_policy_chunks, partition_for
+from app.vectorstore import settings as vector_settings
+from app.verdict_cache import bump_corpus_version
+
+
+logger = logging.getLogger(__name__)
+
+# chunks are flushed, indexed and committed in groups of this size; a
+# failed ingestion resumes from the last committed group, since committed
+# chunks are reused by hash on the next run
+INGEST_BATCH_SIZE = 512
+
+
+@dataclass
+class TextChunk:
+    text: str
+    position: int    # 0-based order within the document
+    page_start: int  # 1-based page numbers
+    page_end: int
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[tuple[int, str]]:
+    """Yield (page_number, text) for each page of a PDF, in page order.
+
+    Large documents are extracted on a process pool (see app.pdf_extract).
+    """
+    return pdf_extract.iter_pdf_pages(file_path)
 
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from a PDF file using PyMuPDF (fitz)"""
-    doc = fitz.open(file_path)
-    texts: List[str] = []
-    for page in doc:
-        texts.append(page.get_text())
-    return "\n".join(texts)
+    return "\n".join(text for _, text in iter_pdf_pages(file_path))
+
+
+def _page_at(marks: List[tuple[int, int]], offset: int) -> int:
+    """Page number of the character at `offset`, given (buffer offset, page) marks."""
+    page = marks[0][1]
+    for start, page_no in marks:
+        if start > offset:
+            break
+        page = page_no
+    return page
+
+
+def _chunk_end(buf: str, chunk_size: int) -> int:
+    """
+    Where to end a full chunk: at the last paragraph break, line break or
+    sentence end in the final quarter of the window, else at chunk_size.
+    Snapping to the text's own breaks keeps boundaries stable when earlier
+    text is edited, so unchanged chunks hash the same on re-ingestion.
+    """
+    lo = chunk_size - chunk_size // 4
+    for sep in ("\n\n", "\n", ". "):
+        idx = buf.rfind(sep, lo, chunk_size)
+        if idx != -1:
+            return idx + len(sep)
+    return chunk_size
+
+
+def iter_text_chunks(
+    pages: Iterable[tuple[int, str]],
+    chunk_size: int = 2000,
+    overlap: int = 200,
+) -> Iterator[TextChunk]:
+    """
+    Chunk a stream of (page_number, text) pages incrementally. Pages are
+    joined with newlines as in extract_text_from_pdf and chunks may span
+    page boundaries; only about one chunk plus one page is held in memory.
+    """
+    buf = ""
+    marks: List[tuple[int, int]] = []  # (offset in buf where a page starts, page number)
+    position = 0
+
+    def emit(raw: str) -> Iterator[TextChunk]:
+        nonlocal position
+        text = raw.strip()
+        if not text:
+            return
+        lead = len(raw) - len(raw.lstrip())
+        yield TextChunk(
+            text=text,
+            position=position,
+            page_start=_page_at(marks, lead),
+            page_end=_page_at(marks, lead + len(text) - 1),
+        )
+        position += 1
+
+    for page_no, page_text in pages:
+        if not marks:
+            # leading whitespace of the document is dropped, like text.strip()
+            page_text = page_text.lstrip()
+            if not page_text:
+                continue
+        else:
+            buf += "\n"
+        marks.append((len(buf), page_no))
+        buf += page_text
+
+        # a chunk is only final once we know more (non-blank) text follows it
+        while len(buf) > chunk_size and not buf[chunk_size:].isspace():
+            end = _chunk_end(buf, chunk_size)
+            yield from emit(buf[:end])
+
+            cut = end - overlap
+            if cut <= 0:
+                cut = end  # no overlap if it would go backwards / stay same
+            buf = buf[cut:]
+            kept = [(start - cut, page) for start, page in marks if start > cut]
+            carried = [page for start, page in marks if start <= cut][-1]
+            marks = [(0, carried)] + kept
+
+    if marks:
+        yield from emit(buf)
+
 
 def split_text_into_chunks(text: str, chunk_size: int = 2000, overlap: int = 200) -> list[str]:
     """Split text into chunks of a specified size"""
-    text = text.strip()
-    if not text:
-            return []
+    return [c.text for c in iter_text_chunks([(1, text)], chunk_size, overlap)]
 
-    n = len(text)
 
-    # If text is shorter than one chunk, just return it as a single chunk
-    if n <= chunk_size:
-        return [text]
+@dataclass
+class IngestionResult:
+    chunk_count: int     # chunks in the document after ingestion
+    chunks_added: int    # new or changed chunks (embedded + upserted)
+    chunks_reused: int   # unchanged chunks kept with their existing vectors
+    chunks_removed: int  # chunks that disappeared (rows + vectors deleted)
 
-    chunks: list[str] = []
-    start = 0
 
-    while start < n:
-        end = min(n, start + chunk_size)
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
+@dataclass
+class _ExistingChunk:
+    id: int
+    position: Optional[int]
+    page_start: Optional[int]
+    page_end: Optional[int]
 
-        if end == n:
-            # we've reached the end, stop
-            break
 
-        next_start = end - overlap
-        # safety: ensure progress
-        if next_start <= start:
-            next_start = end  # no overlap if it would go backwards / stay same
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _existing_chunks_by_hash(db: Session, document_id: int) -> Dict[str, Deque[_ExistingChunk]]:
+    """Index the document's current chunks by content hash (backfilling missing hashes)."""
+    legacy = db.execute(
+        select(models.PolicyChunk.id, models.PolicyChunk.text)
+        .where(models.PolicyChunk.document_id == document_id)
+        .where(models.PolicyChunk.content_hash.is_(None))
+    ).all()
+    if legacy:
+        db.execute(
+            update(models.PolicyChunk),
+            [{"id": chunk_id, "content_hash": chunk_hash(text)} for chunk_id, text in legacy],
+        )
+        db.commit()
+
+    rows = db.execute(
+        select(
+            models.PolicyChunk.content_hash,
+            models.PolicyChunk.id,
+            models.PolicyChunk.position,
+            models.PolicyChunk.page_start,
+            models.PolicyChunk.page_end,
+        )
+        .where(models.PolicyChunk.document_id == document_id)
+        .order_by(models.PolicyChunk.id)
+    ).all()
+
+    existing: Dict[str, Deque[_ExistingChunk]] = defaultdict(deque)
+    for content_hash, chunk_id, position, page_start, page_end in rows:
+        existing[content_hash].append(_ExistingChunk(chunk_id, position, page_start, page_end))
+    return existing
+
 
-        start = next_start
+def ingest_policy_document(
+    db: Session,
+    document_id: int,
+    full_reindex: bool = False,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> IngestionResult:
+    """Extract text from a PDF, split into chunks, and save to the database.
 
-    return chunks
-def ingest_policy_document(db: Session, document_id: int) -> None:
-    """Extract text from a PDF, split into chunks, and save to the database"""
+    Re-ingesting a document diffs its chunks by content hash: unchanged
+    chunks keep their rows and vectors, new or changed chunks are embedded
+    and upserted, and chunks that disappeared are deleted from both the
+    database and the vector store. Chunks that merely moved are re-upserted
+    with updated position metadata (their embeddings come from the cache).
+    full_reindex re-upserts every kept chunk, e.g. after the document's
+    department changed, and drops their copies from other partitions.
+    on_progress(chunks_processed) is called after
+    each committed batch.
+    """
     doc = db.get(models.PolicyDocument, document_id)
 
     if not doc:
-        return
-    
-    text = extract_text_from_pdf(doc.file_path)
-    chunks = split_text_into_chunks(text)
-    
-    for chunk in chunks:
-        policy_chunk = models.PolicyChunk(
-            document_id=document_id,
-            text=chunk
-        )
-        db.add(policy_chunk)
+        raise ValueError(f"Policy document id={document_id} not found")
+
+    existing = _existing_chunks_by_hash(db, document_id)
+    lexical_index.backfill_document(db, document_id)
+
+    chunk_count = added = reused = moved = 0
+    kept_ids: List[int] = []
+    new_batch: List[models.PolicyChunk] = []
+    moved_batch: List[dict] = []
+    for chunk in iter_text_chunks(iter_pdf_pages(doc.file_path)):
+        chunk_count += 1
+        content_hash = chunk_hash(chunk.text)
+        candidates = existing.get(content_hash)
+
+        if candidates:
+            old = candidates.popleft()
+            reused += 1
+            kept_ids.append(old.id)
+            placement = {"position": chunk.position, "page_start": chunk.page_start, "page_end": chunk.page_end}
+            if full_reindex or placement != {"position": old.position, "page_start": old.page_start, "page_end": old.page_end}:
+                moved_batch.append({"id": old.id, **placement})
+        else:
+            new_batch.append(
+                models.PolicyChunk(
+                    document_id=document_id,
+                    text=chunk.text,
+                    content_hash=content_hash,
+                    position=chunk.position,
+                    page_start=chunk.page_start,
+                    page_end=chunk.page_end,
+                )
+            )
+
+        if len(new_batch) >= INGEST_BATCH_SIZE:
+            added += _store_chunk_batch(db, new_batch)
+            new_batch = []
+            if on_progress:
+                on_progress(chunk_count)
+        if len(moved_batch) >= INGEST_BATCH_SIZE:
+            moved += _reindex_moved_chunks(db, moved_batch)
+            moved_batch = []
+            if on_progress:
+                on_progress(chunk_count)
+
+    if new_batch:
+        added += _store_chunk_batch(db, new_batch)
+    if moved_batch:
+        moved += _reindex_moved_chunks(db, moved_batch)
+
+    removed_ids = [old.id for olds in existing.values() for old in olds]
+    if removed_ids:
+        _delete_chunks(db, removed_ids)
+
+    if full_reindex and kept_ids:
+        # vectors indexed under the document's previous partition
+        partition = partition_for(doc.policy_type.value if doc.policy_type else None, doc.department)
+        delete_policy_chunks(kept_ids, except_partition=partition)
+
+    if added or moved or removed_ids:
+        # cached verdicts were computed against the old corpus
+        bump_corpus_version(db)
+
+    return IngestionResult(
+        chunk_count=chunk_count,
+        chunks_added=added,
+        chunks_reused=reused,
+        chunks_removed=len(removed_ids),
+    )
+
+
+def _store_chunk_batch(db: Session, batch: List[models.PolicyChunk]) -> int:
+    """
+    Insert a batch of chunks, upsert them to the vector store, then commit.
+    If indexing or the commit fails, the batch's vectors are deleted again:
+    their ids are never reused (sequences don't roll back), so they would
+    otherwise be retrieved forever without a row behind them.
+    """
+    db.add_all(batch)
+    db.flush()  # assigns ids for the vector ids / metadata
+    lexical_index.index_chunks(db, batch)
+    chunk_ids = [c.id for c in batch]
+
+    try:
+        # store doc chunks in Pinecone
+        index_policy_chunks(batch)
+        db.commit()
+    except Exception:
+        db.rollback()
+        try:
+            delete_policy_chunks(chunk_ids)
+        except Exception:
+            logger.exception("Could not delete vectors of uncommitted chunks %s", chunk_ids)
+        raise
 
+    return len(batch)
+
+
+def _reindex_moved_chunks(db: Session, moved: List[dict]) -> int:
+    """Update placement of kept chunks and refresh their vector metadata."""
+    db.execute(update(models.PolicyChunk), moved)
+    chunks = db.scalars(
+        select(models.PolicyChunk).where(models.PolicyChunk.id.in_([m["id"] for m in moved]))
+    ).all()
+    index_policy_chunks(list(chunks))
+    db.commit()
+
+    return len(moved)
+
+
+def _delete_chunks(db: Session, chunk_ids: List[int]) -> None:
+    for start in range(0, len(chunk_ids), INGEST_BATCH_SIZE):
+        batch = chunk_ids[start:start + INGEST_BATCH_SIZE]
+        delete_policy_chunks(batch)
+        lexical_index.remove_chunks(db, batch)
+        db.execute(delete(models.PolicyChunk).where(models.PolicyChunk.id.in_(batch)))
+        db.commit()
+
+
+def delete_policy_document(db: Session, document_id: int) -> int:
+    """
+    Remove a document, its chunks (rows and vectors) and its ingestion
+    jobs. Returns the number of chunks removed.
+    """
+    chunk_ids = list(db.scalars(
+        select(models.PolicyChunk.id).where(models.PolicyChunk.document_id == document_id)
+    ))
+    _delete_chunks(db, chunk_ids)
+
+    db.execute(delete(models.IngestionJob).where(models.IngestionJob.document_id == document_id))
+    db.execute(delete(models.PolicyDocument).where(models.PolicyDocument.id == document_id))
     db.commit()
 
-    # store doc chunks in Pinecone
-    db.refresh(doc)
-    doc_chunks = (
-        db.query(models.PolicyChunk)
-        .filter(models.PolicyChunk.document_id == document_id)
-        .all()
+    bump_corpus_version(db)
+    return len(chunk_ids)
+
+
+def repartition_legacy_vectors(db: Session, batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Move vectors indexed before VECTOR_PARTITIONING into their document's
+    partition: every chunk is upserted there (embeddings come from the
+    cache where possible), then its default-namespace copy is deleted.
+    Safe to re-run; returns the number of chunks moved.
+    """
+    if not vector_settings.VECTOR_PARTITIONING or "" not in clients.vector_store.namespaces():
+        return 0
+    moved = last_id = 0
+    while True:
+        chunks = db.scalars(
+            select(models.PolicyChunk)
+            .options(joinedload(models.PolicyChunk.document))
+            .where(models.PolicyChunk.id > last_id)
+            .order_by(models.PolicyChunk.id)
+            .limit(batch_size)
+        ).all()
+        if not chunks:
+            return moved
+        index_policy_chunks(list(chunks))
+        drop_legacy_vectors([c.id for c in chunks])
+        last_id = chunks[-1].id
+        moved += len(chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Policy ingestion maintenance")
+    parser.add_argument(
+        "--repartition", action="store_true",
+        help="move vectors from the default namespace into per-(policy_type, department) partitions",
     )
-    index_policy_chunks(doc_chunks)
+    args = parser.parse_args()
+    if not args.repartition:
+        parser.print_help()
+        return
+    with SessionLocal() as db:
+        moved = repartition_legacy_vectors(db)
+    print(f"Moved {moved} chunks out of the default namespace")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import exists, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+from app.database import SessionLocal
+from app import ingestion
+
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobSettings(BaseSettings):
+    INGESTION_WORKERS: int = 2
+    # a running job whose worker has not checked in for this long is
+    # considered abandoned and may be picked up again
+    INGESTION_LEASE_SECONDS: float = 120.0
+    INGESTION_HEARTBEAT_SECONDS: float = 30.0
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+job_settings = IngestionJobSettings()
+
+_executor = ThreadPoolExecutor(
+    max_workers=job_settings.INGESTION_WORKERS,
+    thread_name_prefix="ingestion",
+)
+
+# identifies this process in IngestionJob.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue_ingestion(db: Session, document_id: int, full_reindex: bool = False) -> models.IngestionJob:
+    """Persist a queued job for the document and hand it to the worker pool."""
+    job = models.IngestionJob(
+        document_id=document_id,
+        status=models.IngestionStatus.queued,
+        full_reindex=full_reindex,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _executor.submit(run_ingestion_job, job.id)
+    return job
+
+
+def run_ingestion_job(job_id: int) -> None:
+    """Worker entry point: run ingest_policy_document and record the outcome on the job row."""
+    with SessionLocal() as db:
+        document_id = db.scalar(select(models.IngestionJob.document_id).where(models.IngestionJob.id == job_id))
+        if document_id is None:
+            return
+        # one job per document at a time: two runs would diff against the
+        # same existing chunks and both insert the new ones. The row lock
+        # serializes claims on PostgreSQL; SQLite serializes the UPDATE.
+        db.execute(
+            select(models.PolicyDocument.id)
+            .where(models.PolicyDocument.id == document_id)
+            .with_for_update()
+        )
+        other = aliased(models.IngestionJob)
+        # claim atomically so a job is never run twice; the lease is kept
+        # alive by heartbeats until the job finishes
+        now = datetime.now()
+        claimed = db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.id == job_id)
+            .where(models.IngestionJob.status == models.IngestionStatus.queued)
+            .where(~exists().where(
+                other.document_id == models.IngestionJob.document_id,
+                other.status == models.IngestionStatus.running,
+            ))
+            .values(
+                status=models.IngestionStatus.running,
+                started_at=now,
+                error=None,
+                claimed_by=WORKER_ID,
+                heartbeat_at=now,
+            )
+        ).rowcount
+        db.commit()
+        if not claimed:
+            # already taken, or waiting for the document's running job,
+            # which submits it when done
+            return
+
+        job = db.get(models.IngestionJob, job_id)
+        try:
+            with _Heartbeat(job_id):
+                result = ingestion.ingest_policy_document(
+                    db,
+                    job.document_id,
+                    full_reindex=job.full_reindex,
+                    on_progress=lambda processed: _record_progress(job_id, processed),
+                )
+        except Exception as e:
+            logger.exception("Ingestion job %s failed", job_id)
+            db.rollback()
+            job = db.get(models.IngestionJob, job_id)
+            job.status = models.IngestionStatus.failed
+            job.error = str(e)
+        else:
+            job.status = models.IngestionStatus.done
+            job.chunk_count = result.chunk_count
+            job.chunks_added = result.chunks_added
+            job.chunks_reused = result.chunks_reused
+            job.chunks_removed = result.chunks_removed
+
+        job.finished_at = datetime.now()
+        job.claimed_by = None
+        db.commit()
+
+        next_job_id = db.scalar(
+            select(models.IngestionJob.id)
+            .where(models.IngestionJob.document_id == document_id)
+            .where(models.IngestionJob.status == models.IngestionStatus.queued)
+            .order_by(models.IngestionJob.id)
+            .limit(1)
+        )
+    if next_job_id is not None:
+        _executor.submit(run_ingestion_job, next_job_id)
+
+
+def _record_progress(job_id: int, processed: int) -> None:
+    # own session, so progress is visible while the job's session is mid-batch
+    with SessionLocal() as db:
+        db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.id == job_id)
+            .values(chunk_count=processed, heartbeat_at=datetime.now())
+        )
+        db.commit()
+
+
+def _renew_lease(job_id: int) -> bool:
+    with SessionLocal() as db:
+        renewed = db.execute(
+            update(models.IngestionJob)
+            .where(models.IngestionJob.id == job_id)
+            .where(models.IngestionJob.claimed_by == WORKER_ID)
+            .values(heartbeat_at=datetime.now())
+        ).rowcount
+        db.commit()
+    return bool(renewed)
+
+
+class _Heartbeat:
+    """Renews a running job's lease every INGESTION_HEARTBEAT_SECONDS from a side thread."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ingestion-heartbeat-{job_id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(job_settings.INGESTION_HEARTBEAT_SECONDS):
+            try:
+                if not _renew_lease(self.job_id):
+                    logger.warning("Ingestion job %s lost its lease", self.job_id)
+                    return
+            except Exception:
+                logger.warning("Renewing the lease of ingestion job %s failed", self.job_id, exc_info=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def retry_ingestion_job(db: Session, job: models.IngestionJob) -> models.IngestionJob:
+    """
+    Re-queue a failed job. Chunks committed before the failure are reused
+    by hash, so the retry resumes roughly where the job stopped.
+    """
+    job.status = models.IngestionStatus.queued
+    job.error = None
+    job.started_at = None
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+
+    _executor.submit(run_ingestion_job, job.id)
+    return job
+
+
+def requeue_expired_jobs(db: Session) -> List[int]:
+    """
+    Put running jobs whose lease expired (their worker died mid-way) back
+    in the queue and return their ids. Jobs another live worker is running
+    keep their lease.
+    """
+    expired_before = datetime.now() - timedelta(seconds=job_settings.INGESTION_LEASE_SECONDS)
+    job_ids = db.scalars(
+        update(models.IngestionJob)
+        .where(models.IngestionJob.status == models.IngestionStatus.running)
+        .where(or_(models.IngestionJob.heartbeat_at.is_(None), models.IngestionJob.heartbeat_at < expired_before))
+        .values(status=models.IngestionStatus.queued, claimed_by=None)
+        .returning(models.IngestionJob.id)
+    ).all()
+    db.commit()
+    return list(job_ids)
+
+
+def resume_pending_jobs() -> int:
+    """
+    Re-submit queued jobs and running jobs whose worker stopped checking
+    in, then keep checking for expired leases in the background. Call once
+    at startup; returns the number of jobs resumed.
+    """
+    with SessionLocal() as db:
+        requeue_expired_jobs(db)
+
+        job_ids = db.scalars(
+            select(models.IngestionJob.id)
+            .where(models.IngestionJob.status == models.IngestionStatus.queued)
+            .order_by(models.IngestionJob.id)
+        ).all()
+
+    for job_id in job_ids:
+        _executor.submit(run_ingestion_job, job_id)
+    _start_lease_sweeper()
+    return len(job_ids)
+
+
+_sweeper_stop = threading.Event()
+_sweeper: Optional[threading.Thread] = None
+
+
+def _sweep_expired_leases() -> None:
+    # a job whose worker died is picked up without waiting for a restart;
+    # queued jobs were already submitted when enqueued or at startup
+    while not _sweeper_stop.wait(job_settings.INGESTION_LEASE_SECONDS):
+        try:
+            with SessionLocal() as db:
+                job_ids = requeue_expired_jobs(db)
+            for job_id in sorted(job_ids):
+                _executor.submit(run_ingestion_job, job_id)
+        except Exception:
+            logger.warning("Requeueing expired ingestion jobs failed", exc_info=True)
+
+
+def _start_lease_sweeper() -> None:
+    global _sweeper
+    if _sweeper is None or not _sweeper.is_alive():
+        _sweeper_stop.clear()
+        _sweeper = threading.Thread(target=_sweep_expired_leases, name="ingestion-lease-sweeper", daemon=True)
+        _sweeper.start()
+
+
+def shutdown_ingestion_workers(wait: bool = False) -> None:
+    # unfinished jobs stay queued/running in the table; their leases expire
+    # and another worker (or the next start) resumes them
+    _sweeper_stop.set()
+    _executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,112 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+# rows scored per matmul when assigning large matrices to centroids
+_ASSIGN_CHUNK = 65536
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar (max dot product) centroid for each row."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = np.asarray(vectors[start:start + _ASSIGN_CHUNK], dtype=np.float32)
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_kmeans(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means over unit-normalized rows: returns (nlist, dim)
+    unit-norm centroids. Empty clusters are re-seeded from random rows.
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = sample[rng.choice(len(sample), empty.size, replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a vector matrix: every row is
+    assigned to its nearest centroid, and a query only scores rows in the
+    `nprobe` lists whose centroids are closest to it.
+
+    Lists are kept in CSR form (rows sorted by list) and rebuilt once the
+    buffer of recently added rows grows past a small fraction of the
+    index. Removed rows are marked with list -1 and skipped at query time,
+    so deletes never touch the lists.
+    """
+
+    def __init__(self, centroids: np.ndarray, assign: Optional[np.ndarray] = None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assign = np.full(0, -1, dtype=np.int32) if assign is None else np.asarray(assign, dtype=np.int32).copy()
+        self._recent: List[int] = []
+        self._rebuild()
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def ensure_capacity(self, rows: int) -> None:
+        if rows > len(self.assign):
+            grow = rows - len(self.assign)
+            self.assign = np.concatenate([self.assign, np.full(grow, -1, dtype=np.int32)])
+
+    def add(self, rows: np.ndarray, lists: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return
+        self.ensure_capacity(int(rows.max()) + 1)
+        self.assign[rows] = lists
+        self._recent.extend(rows.tolist())
+        if len(self._recent) > max(1024, len(self._sorted_rows) // 20):
+            self._rebuild()
+
+    def remove(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < len(self.assign)]
+        self.assign[rows] = -1
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ids of the nprobe lists whose centroids score highest against query."""
+        scores = self.centroids @ query
+        nprobe = min(nprobe, self.nlist)
+        if nprobe == self.nlist:
+            return np.arange(self.nlist)
+        return np.argpartition(-scores, nprobe - 1)[:nprobe]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows currently assigned to the probed lists (sorted, unique)."""
+        lists = self.probe(query, nprobe)
+        parts = [self._sorted_rows[self._offsets[i]:self._offsets[i + 1]] for i in lists]
+        if self._recent:
+            parts.append(np.asarray(self._recent, dtype=np.int64))
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(parts))
+        # drop removed rows and rows that moved to a list we did not probe
+        return rows[np.isin(self.assign[rows], lists)]
+
+    def _rebuild(self) -> None:
+        valid = np.flatnonzero(self.assign >= 0)
+        lists = self.assign[valid]
+        order = np.argsort(lists, kind="stable")
+        self._sorted_rows = valid[order]
+        counts = np.bincount(lists, minlength=self.nlist)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._recent = []
@@ -0,0 +1,135 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+# escape sequence lengths after the backslash: \n -> 1, \uXXXX -> 5
+_ESCAPE_LENGTH = {"u": 5}
+
+
+class JSONObjectStream:
+    """
+    Incremental parser for a streamed JSON object (e.g. a chat completion
+    in JSON mode). feed() returns events as soon as they can be decided:
+
+    - ("field", key, value)   a top-level value is complete
+    - ("item", key, value)    an element of a top-level array is complete
+    - ("delta", key, text)    more characters of a top-level string value
+
+    Only the top level is tracked; nested values are decoded with
+    json.loads once their closing bracket arrives.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.depth = 0
+        self.in_string = False
+        self._escape = ""        # pending escape sequence inside a string
+        self._expect = "key"     # at depth 1: key | colon | value | comma
+        self.key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._value_kind: Optional[str] = None  # string | array | object | scalar
+        self._item_start: Optional[int] = None
+        self._delta: List[str] = []
+        self._high_surrogate = ""
+
+    def feed(self, text: str) -> List[Tuple[str, Optional[str], Any]]:
+        events: List[Tuple[str, Optional[str], Any]] = []
+        start = len(self.buf)
+        self.buf += text
+        for i in range(start, len(self.buf)):
+            self._step(i, self.buf[i], events)
+        if self._delta:
+            events.append(("delta", self.key, "".join(self._delta)))
+            self._delta = []
+        return events
+
+    # --- internals ---
+
+    def _streaming_string(self) -> bool:
+        return self.depth == 1 and self._value_kind == "string"
+
+    def _decode_escape(self, seq: str) -> None:
+        char = json.loads(f'"{seq}"')
+        if "\ud800" <= char <= "\udbff":
+            self._high_surrogate = char
+            return
+        if self._high_surrogate:
+            char = (self._high_surrogate + char).encode("utf-16", "surrogatepass").decode("utf-16")
+            self._high_surrogate = ""
+        self._delta.append(char)
+
+    def _finish_value(self, end: int, events: list) -> None:
+        value = json.loads(self.buf[self._value_start:end])
+        events.append(("field", self.key, value))
+        self._value_start = None
+        self._value_kind = None
+        self._expect = "comma"
+
+    def _finish_item(self, end: int, events: list) -> None:
+        raw = self.buf[self._item_start:end].strip()
+        if raw:
+            events.append(("item", self.key, json.loads(raw)))
+        self._item_start = None
+
+    def _step(self, i: int, c: str, events: list) -> None:
+        if self.in_string:
+            if self._escape:
+                self._escape += c
+                if len(self._escape) == 1 + _ESCAPE_LENGTH.get(self._escape[1], 1):
+                    if self._streaming_string():
+                        self._decode_escape(self._escape)
+                    self._escape = ""
+            elif c == "\\":
+                self._escape = c
+            elif c == '"':
+                self.in_string = False
+                if self.depth == 1 and self._expect == "key":
+                    self.key = json.loads(self.buf[self._key_start:i + 1])
+                    self._expect = "colon"
+                elif self._streaming_string():
+                    if self._delta:
+                        events.append(("delta", self.key, "".join(self._delta)))
+                        self._delta = []
+                    self._finish_value(i + 1, events)
+            elif self._streaming_string():
+                self._delta.append(c)
+            return
+
+        if c == '"':
+            self.in_string = True
+            if self.depth == 1:
+                if self._expect == "key":
+                    self._key_start = i
+                elif self._expect == "value":
+                    self._value_start, self._value_kind = i, "string"
+            elif self.depth == 2 and self._value_kind == "array" and self._item_start is None:
+                self._item_start = i
+        elif c in "{[":
+            if self.depth == 1 and self._expect == "value":
+                self._value_start, self._value_kind = i, "array" if c == "[" else "object"
+            elif self.depth == 2 and self._value_kind == "array" and self._item_start is None:
+                self._item_start = i
+            self.depth += 1
+        elif c in "}]":
+            self.depth -= 1
+            if self.depth == 1 and self._value_kind in ("array", "object"):
+                if self._value_kind == "array" and self._item_start is not None:
+                    self._finish_item(i, events)
+                self._finish_value(i + 1, events)
+            elif self.depth == 0 and self._value_kind == "scalar":
+                self._finish_value(i, events)
+        elif c == ",":
+            if self.depth == 1:
+                if self._value_kind == "scalar":
+                    self._finish_value(i, events)
+                self._expect = "key"
+            elif self.depth == 2 and self._value_kind == "array" and self._item_start is not None:
+                self._finish_item(i, events)
+        elif c == ":":
+            if self.depth == 1:
+                self._expect = "value"
+        elif not c.isspace():
+            if self.depth == 1 and self._expect == "value" and self._value_start is None:
+                self._value_start, self._value_kind = i, "scalar"
+            elif self.depth == 2 and self._value_kind == "array" and self._item_start is None:
+                self._item_start = i
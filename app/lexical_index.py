@@ -0,0 +1,206 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import case, delete, func, insert, literal, select
+from sqlalchemy.orm import Session, joinedload
+
+from app import models
+from app.database import SessionLocal
+from app.vector_backends import filter_condition
+
+
+class LexicalSettings(BaseSettings):
+    LEXICAL_SEARCH_ENABLED: bool = True
+    LEXICAL_BM25_K1: float = 1.2
+    LEXICAL_BM25_B: float = 0.75
+    # only the rarest (highest-idf) query terms are scored
+    LEXICAL_MAX_QUERY_TERMS: int = 32
+    # terms in more than this share of chunks are skipped at query time
+    LEXICAL_MAX_DF_RATIO: float = 0.2
+    # corpus size / average chunk length are refreshed at most this often
+    LEXICAL_STATS_TTL_SECONDS: float = 60.0
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+lexical_settings = LexicalSettings()
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MAX_TERM_LENGTH = 64
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens, without stopwords ("NDA-2024" -> ["nda", "2024"])."""
+    return [
+        t for t in _TOKEN_RE.findall(text.lower())
+        if t not in STOPWORDS and len(t) <= _MAX_TERM_LENGTH
+    ]
+
+
+@dataclass
+class LexicalHit:
+    chunk_id: int
+    score: float
+
+
+# -----------------------------
+# Indexing
+# -----------------------------
+def index_chunks(db: Session, chunks: List[models.PolicyChunk]) -> None:
+    """Add postings for chunks (which must have ids); the caller commits."""
+    postings = []
+    for chunk in chunks:
+        tokens = tokenize(chunk.text)
+        chunk.token_count = len(tokens)
+        postings.extend(
+            {"term": term, "chunk_id": chunk.id, "tf": tf}
+            for term, tf in Counter(tokens).items()
+        )
+    if postings:
+        db.execute(insert(models.LexicalPosting), postings)
+
+
+def remove_chunks(db: Session, chunk_ids: List[int]) -> None:
+    """Drop postings of chunks about to be deleted; the caller commits."""
+    db.execute(delete(models.LexicalPosting).where(models.LexicalPosting.chunk_id.in_(chunk_ids)))
+
+
+def backfill_document(db: Session, document_id: int, batch_size: int = 512) -> int:
+    """Index chunks of a document that predate the lexical index. Returns the number indexed."""
+    indexed = 0
+    while True:
+        chunks = db.scalars(
+            select(models.PolicyChunk)
+            .where(models.PolicyChunk.document_id == document_id)
+            .where(models.PolicyChunk.token_count.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not chunks:
+            return indexed
+        index_chunks(db, list(chunks))
+        db.commit()
+        indexed += len(chunks)
+
+
+# -----------------------------
+# Search
+# -----------------------------
+class _CorpusStats:
+    """Chunk count and average token count, cached for LEXICAL_STATS_TTL_SECONDS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value: Optional[tuple[int, float]] = None
+        self._checked = 0.0
+
+    def get(self, db: Session) -> tuple[int, float]:
+        with self._lock:
+            if self._value is None or time.monotonic() - self._checked > lexical_settings.LEXICAL_STATS_TTL_SECONDS:
+                count, avg = db.execute(
+                    select(func.count(), func.avg(models.PolicyChunk.token_count))
+                    .where(models.PolicyChunk.token_count.is_not(None))
+                ).one()
+                self._value = (count or 0, float(avg or 0.0))
+                self._checked = time.monotonic()
+            return self._value
+
+
+corpus_stats = _CorpusStats()
+
+
+def _apply_filters(stmt, filters: Optional[Dict[str, Any]]):
+    """Translate vector-store metadata filters to SQL over chunks / documents."""
+    columns = {
+        "document_id": models.PolicyChunk.document_id,
+        "department": models.PolicyDocument.department,
+        "policy_type": models.PolicyDocument.policy_type,
+    }
+    for key, cond in (filters or {}).items():
+        if key not in columns:
+            raise ValueError(f"Unsupported lexical filter field: {key}")
+        op, value = filter_condition(cond)
+        values = [value] if op == "$eq" else value
+        if key == "policy_type":
+            values = [models.PolicyType(v) for v in values]
+        stmt = stmt.where(columns[key].in_(values))
+    return stmt
+
+
+def search(db: Session, query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[LexicalHit]:
+    """
+    Top `limit` chunks by BM25 score for the query terms. A draft can have
+    hundreds of distinct terms; only the LEXICAL_MAX_QUERY_TERMS rarest are
+    scored, and scoring and ranking happen in the database.
+    """
+    terms = set(tokenize(query))
+    if not terms or limit <= 0:
+        return []
+
+    n_chunks, avg_len = corpus_stats.get(db)
+    if not n_chunks:
+        return []
+
+    df = dict(db.execute(
+        select(models.LexicalPosting.term, func.count())
+        .where(models.LexicalPosting.term.in_(terms))
+        .group_by(models.LexicalPosting.term)
+    ).all())
+    # very common terms barely move BM25 scores but have huge posting lists;
+    # if every term is common, the rarest of them still rank something
+    selective = [t for t, n in df.items() if n <= n_chunks * lexical_settings.LEXICAL_MAX_DF_RATIO]
+    terms = sorted(selective or df, key=lambda t: (df[t], t))[:lexical_settings.LEXICAL_MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    k1, b = lexical_settings.LEXICAL_BM25_K1, lexical_settings.LEXICAL_BM25_B
+    idf = {t: math.log(1 + (n_chunks - df[t] + 0.5) / (df[t] + 0.5)) for t in terms}
+    posting = models.LexicalPosting
+    length = func.coalesce(models.PolicyChunk.token_count, 0)
+    norm = literal(k1) * (1 - b + b * length / (avg_len or 1))
+    score = func.sum(
+        case(idf, value=posting.term, else_=0.0) * posting.tf * (k1 + 1) / (posting.tf + norm)
+    ).label("score")
+
+    stmt = (
+        select(posting.chunk_id, score)
+        .join(models.PolicyChunk, models.PolicyChunk.id == posting.chunk_id)
+        .where(posting.term.in_(terms))
+    )
+    if filters and ({"department", "policy_type"} & set(filters)):
+        stmt = stmt.join(models.PolicyDocument, models.PolicyDocument.id == models.PolicyChunk.document_id)
+    stmt = _apply_filters(stmt, filters)
+    stmt = stmt.group_by(posting.chunk_id).order_by(score.desc(), posting.chunk_id).limit(limit)
+
+    return [LexicalHit(chunk_id=chunk_id, score=float(score)) for chunk_id, score in db.execute(stmt)]
+
+
+def search_with_session(query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[LexicalHit]:
+    with SessionLocal() as db:
+        return search(db, query, limit, filters)
+
+
+def load_chunks(chunk_ids: List[int]) -> Dict[int, models.PolicyChunk]:
+    """Chunks (with their documents) for hits that the vector search did not return."""
+    if not chunk_ids:
+        return {}
+    with SessionLocal() as db:
+        chunks = db.scalars(
+            select(models.PolicyChunk)
+            .options(joinedload(models.PolicyChunk.document))
+            .where(models.PolicyChunk.id.in_(chunk_ids))
+        ).all()
+        db.expunge_all()
+        return {chunk.id: chunk for chunk in chunks}
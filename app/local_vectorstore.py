@@ -0,0 +1,566 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from app.ivf_index import IVFIndex, nearest_centroids, train_kmeans
+from app.vector_backends import VectorMatch, VectorStore, filter_condition, metadata_matches
+
+logger = logging.getLogger(__name__)
+
+# metadata fields kept as integer-coded columns for vectorized filtering
+INDEXED_FIELDS = ("department", "policy_type", "document_id")
+
+_MIN_CAPACITY = 1024
+# retrain the ANN index once the collection has grown this much since training
+_RETRAIN_GROWTH = 4
+# rows sampled per list when training centroids
+_TRAIN_SAMPLE_PER_LIST = 64
+_TRAIN_SAMPLE_MAX = 200_000
+
+
+class LocalVectorStore:
+    """
+    One shard of the local backend (see PartitionedLocalVectorStore), an
+    in-process vector index: unit-normalized float32 rows in a memory-mapped
+    matrix (vectors.f32), plus an append-only JSONL log (metadata.jsonl) of
+    upserts/deletes that maps ids to rows and carries metadata.
+
+    Cosine top-k is one matrix-vector product plus argpartition; filters on
+    department / policy_type / document_id are boolean masks over
+    integer-coded columns. Other processes sharing the directory pick up
+    changes by replaying the log tail before each call.
+
+    Once the collection reaches `ann_min_vectors`, an IVF index is trained
+    (centroids saved as ivf-<generation>.npz, a "train" entry in the log)
+    and queries only score the `nprobe` closest lists. Training runs on a
+    background thread and the new index is swapped in when it is done, so
+    queries are not blocked meanwhile. Later upserts carry their list id in
+    the log, so inserts stay incremental. Filters that leave fewer rows
+    than a probe would scan still use exact search.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ann_min_vectors: int = 20000,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+    ):
+        self.ann_min_vectors = ann_min_vectors
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._matrix_path = self.directory / "vectors.f32"
+        self._log_path = self.directory / "metadata.jsonl"
+        self._lock_path = self.directory / ".lock"
+        self._lock = threading.RLock()
+        self._writer_depth = 0
+        self._train_lock = threading.Lock()
+        self._trainer: Optional[threading.Thread] = None
+        # rows upserted while a training run works on its snapshot
+        self._train_dirty: Optional[set[int]] = None
+        self._reset()
+        self._refresh()
+
+    # --- state ---
+
+    def _reset(self) -> None:
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes: Dict[str, np.ndarray] = {f: np.zeros(0, dtype=np.int32) for f in INDEXED_FIELDS}
+        self._vocab: Dict[str, Dict[Any, int]] = {f: {} for f in INDEXED_FIELDS}
+        self._ids: List[Optional[str]] = []
+        self._meta: List[Optional[dict]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: set[int] = set()
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._ivf: Optional[IVFIndex] = None
+        self._ivf_generation = 0
+        self._ivf_trained_rows = 0
+        self._ivf_pending: List[tuple[int, int]] = []
+
+    def _code(self, field: str, value: Any) -> int:
+        # 0 is reserved for "missing"
+        vocab = self._vocab[field]
+        if value is None:
+            return 0
+        if value not in vocab:
+            vocab[value] = len(vocab) + 1
+        return vocab[value]
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= self._capacity:
+            return
+        capacity = max(_MIN_CAPACITY, self._capacity)
+        while capacity < rows:
+            capacity *= 2
+        self._map_matrix(capacity)
+
+    def _map_matrix(self, capacity: int) -> None:
+        """(Re)map the matrix file with room for `capacity` rows, growing it if needed."""
+        nbytes = capacity * self._dim * 4
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+        grow = capacity - self._capacity
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        for f in INDEXED_FIELDS:
+            self._codes[f] = np.concatenate([self._codes[f], np.zeros(grow, dtype=np.int32)])
+        self._capacity = capacity
+
+    def _apply(self, entry: dict) -> None:
+        op = entry["op"]
+        if op == "init":
+            if self._dim is None:
+                self._dim = entry["dim"]
+        elif op == "train":
+            self._load_ivf(entry["generation"], entry["rows"])
+        elif op == "upsert":
+            row = entry["row"]
+            self._ensure_capacity(row + 1)
+            while len(self._ids) <= row:
+                self._free.add(len(self._ids))
+                self._ids.append(None)
+                self._meta.append(None)
+            self._free.discard(row)
+            old_row = self._rows.get(entry["id"])
+            if old_row is not None and old_row != row:
+                self._clear_row(old_row)
+            self._ids[row] = entry["id"]
+            self._meta[row] = entry["metadata"]
+            self._rows[entry["id"]] = row
+            self._alive[row] = True
+            for f in INDEXED_FIELDS:
+                self._codes[f][row] = self._code(f, entry["metadata"].get(f))
+            if self._ivf is not None and "list" in entry:
+                self._ivf_pending.append((row, entry["list"]))
+            if self._train_dirty is not None:
+                self._train_dirty.add(row)
+        elif op == "delete":
+            row = self._rows.pop(entry["id"], None)
+            if row is not None:
+                self._clear_row(row)
+
+    def _clear_row(self, row: int) -> None:
+        self._ids[row] = None
+        self._meta[row] = None
+        self._alive[row] = False
+        self._free.add(row)
+        if self._ivf is not None:
+            self._flush_ivf()
+            self._ivf.remove(np.array([row]))
+
+    def _flush_ivf(self) -> None:
+        # list assignments are applied in bulk after a replay, not per entry
+        if self._ivf is not None and self._ivf_pending:
+            rows, lists = zip(*self._ivf_pending)
+            self._ivf.add(np.array(rows), np.array(lists))
+        self._ivf_pending = []
+
+    def _ivf_path(self, generation: int) -> Path:
+        return self.directory / f"ivf-{generation}.npz"
+
+    def _load_ivf(self, generation: int, trained_rows: int) -> None:
+        self._ivf_pending = []
+        with np.load(self._ivf_path(generation)) as data:
+            assign = data["assign"] if "assign" in data.files else None
+            self._ivf = IVFIndex(data["centroids"], assign)
+        self._ivf_generation = generation
+        self._ivf_trained_rows = trained_rows
+
+    def _save_ivf(self, generation: int, centroids: np.ndarray, assign: Optional[np.ndarray] = None) -> None:
+        arrays = {"centroids": centroids}
+        if assign is not None:
+            arrays["assign"] = assign
+        path = self._ivf_path(generation)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _refresh(self) -> None:
+        """Replay log entries written since we last looked (by us or another process)."""
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            return
+        if self._log_inode is not None and (stat.st_ino != self._log_inode or stat.st_size < self._log_offset):
+            # log was compacted/replaced: rebuild from scratch
+            self._reset()
+        if stat.st_size == self._log_offset:
+            return
+
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # ignore a partially written trailing line
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._flush_ivf()
+        self._log_offset += end
+        self._log_inode = stat.st_ino
+
+        if self._dim is not None and self._matrix is None:
+            self._map_matrix(max(_MIN_CAPACITY, self._capacity))
+
+    @contextmanager
+    def _writer(self):
+        """Serialize writers across threads and processes sharing the directory (reentrant)."""
+        with self._lock:
+            if fcntl is None or self._writer_depth:
+                self._writer_depth += 1
+                try:
+                    yield
+                finally:
+                    self._writer_depth -= 1
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._writer_depth += 1
+                try:
+                    yield
+                finally:
+                    self._writer_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append_log(self, entries: List[dict]) -> None:
+        """Append entries and apply them locally (caller holds _writer)."""
+        payload = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries).encode("utf-8")
+        with open(self._log_path, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self._apply(entry)
+        self._flush_ivf()
+        stat = os.stat(self._log_path)
+        self._log_inode = stat.st_ino
+        self._log_offset = stat.st_size
+
+    # --- VectorStore API ---
+
+    def upsert(self, vectors: List[dict]) -> None:
+        if not vectors:
+            return
+        with self._writer():
+            self._refresh()
+            entries: List[dict] = []
+            if self._dim is None:
+                self._dim = len(vectors[0]["values"])
+                entries.append({"op": "init", "dim": self._dim})
+                self._map_matrix(_MIN_CAPACITY)
+
+            values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+            if values.shape[1] != self._dim:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self._dim}")
+            norms = np.linalg.norm(values, axis=1, keepdims=True)
+            values /= np.where(norms == 0, 1, norms)
+
+            lists = nearest_centroids(values, self._ivf.centroids) if self._ivf is not None else None
+
+            free = sorted(self._free, reverse=True)
+            next_row = len(self._ids)
+            upserts: List[dict] = []
+            for i, (vec, v) in enumerate(zip(values, vectors)):
+                row = self._rows.get(v["id"])
+                if row is None:
+                    if free:
+                        row = free.pop()
+                    else:
+                        row = next_row
+                        next_row += 1
+                self._ensure_capacity(row + 1)
+                self._matrix[row] = vec
+                entry = {"op": "upsert", "id": v["id"], "row": row, "metadata": v.get("metadata") or {}}
+                if lists is not None:
+                    entry["list"] = int(lists[i])
+                upserts.append(entry)
+
+            # vectors hit the file before the log entries that reference them
+            self._matrix.flush()
+            self._append_log(entries + upserts)
+            self._maybe_train()
+
+    def _maybe_train(self) -> None:
+        """Start (re)building the IVF index when the collection crosses the size thresholds (caller holds _writer)."""
+        count = len(self._rows)
+        if count < self.ann_min_vectors:
+            return
+        if self._ivf is not None and count < self._ivf_trained_rows * _RETRAIN_GROWTH:
+            return
+        if self._trainer is not None and self._trainer.is_alive():
+            return
+        self._trainer = threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True)
+        self._trainer.start()
+
+    def _train_in_background(self) -> None:
+        try:
+            self.train()
+        except Exception:
+            logger.exception("Training the IVF index in %s failed", self.directory)
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> None:
+        """Block until a background training run (if any) has finished."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def train(self) -> None:
+        """
+        Train IVF centroids on a sample of live rows and assign every row to
+        a list. k-means and the assignment run on a snapshot without holding
+        the lock; rows upserted meanwhile are assigned when the new index is
+        swapped in.
+        """
+        with self._train_lock:
+            with self._lock:
+                self._refresh()
+                count = len(self._rows)
+                if count == 0:
+                    return
+                n = len(self._ids)
+                # rows [0, n) of this mapping stay valid if the matrix is remapped to grow
+                matrix = self._matrix
+                live = np.flatnonzero(self._alive[:n])
+                generation = self._ivf_generation
+                self._train_dirty = set()
+            try:
+                nlist = max(1, self.nlist or int(4 * np.sqrt(count)))
+                rng = np.random.default_rng(generation)
+                sample_size = min(count, nlist * _TRAIN_SAMPLE_PER_LIST, _TRAIN_SAMPLE_MAX)
+                sample_rows = np.sort(rng.choice(live, sample_size, replace=False))
+                centroids = train_kmeans(np.asarray(matrix[sample_rows]), nlist)
+                assign = nearest_centroids(matrix[:n], centroids)
+
+                with self._writer():
+                    self._refresh()
+                    if self._ivf_generation != generation:
+                        return  # another process trained in the meantime
+                    total = len(self._ids)
+                    assign = np.concatenate([assign, np.full(total - n, -1, dtype=np.int32)])
+                    stale = np.array(sorted(self._train_dirty | set(range(n, total))), dtype=np.int64)
+                    if stale.size:
+                        assign[stale] = nearest_centroids(self._matrix[stale], centroids)
+                    assign[~self._alive[:total]] = -1
+
+                    self._save_ivf(generation + 1, centroids, assign)
+                    self._append_log([{"op": "train", "generation": generation + 1, "rows": len(self._rows)}])
+            finally:
+                with self._lock:
+                    self._train_dirty = None
+
+    def delete(self, ids: List[str]) -> None:
+        with self._writer():
+            self._refresh()
+            entries = [{"op": "delete", "id": i} for i in ids if i in self._rows]
+            if entries:
+                self._append_log(entries)
+
+    def _filter_mask(self, n: int, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive[:n].copy()
+        slow: Dict[str, Any] = {}
+        for key, cond in (filter or {}).items():
+            if key not in INDEXED_FIELDS:
+                slow[key] = cond
+                continue
+            op, value = filter_condition(cond)
+            values = [value] if op == "$eq" else value
+            codes = [self._vocab[key][v] for v in values if v in self._vocab[key]]
+            mask &= np.isin(self._codes[key][:n], codes)
+        if slow:
+            for row in np.flatnonzero(mask):
+                if not metadata_matches(self._meta[row], slow):
+                    mask[row] = False
+        return mask
+
+    def _ann_candidates(self, q: np.ndarray, n: int, mask: np.ndarray, top_k: int, nprobe: int) -> np.ndarray:
+        # widen the probe until enough rows survive the filter
+        while True:
+            rows = self._ivf.candidates(q, nprobe)
+            rows = rows[rows < n]
+            rows = rows[mask[rows]]
+            if rows.size >= top_k or nprobe >= self._ivf.nlist:
+                return rows
+            nprobe *= 2
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        exact: bool = False,
+        nprobe: Optional[int] = None,
+    ) -> List[VectorMatch]:
+        with self._lock:
+            self._refresh()
+            n = len(self._ids)
+            if self._matrix is None or n == 0 or top_k <= 0:
+                return []
+
+            q = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm:
+                q = q / norm
+
+            mask = self._filter_mask(n, filter)
+            nprobe = nprobe or self.nprobe
+            use_ann = self._ivf is not None and not exact
+            if use_ann and filter:
+                # a selective filter scans fewer rows exactly than a probe would
+                use_ann = mask.sum() > n * nprobe / self._ivf.nlist
+            if use_ann:
+                candidates = self._ann_candidates(q, n, mask, top_k, nprobe)
+            else:
+                candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+            if candidates.size == n:
+                scores = self._matrix[:n] @ q
+            else:
+                scores = self._matrix[candidates] @ q
+
+            k = min(top_k, scores.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows = top if candidates.size == n else candidates[top]
+
+            return [
+                VectorMatch(id=self._ids[row], score=float(score), metadata=dict(self._meta[row]), vector_score=float(score))
+                for row, score in zip(rows, scores[top])
+            ]
+
+    def describe(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "total_vector_count": len(self._rows),
+                "dimension": self._dim,
+                "ann_lists": self._ivf.nlist if self._ivf is not None else None,
+            }
+
+    def compact(self) -> None:
+        """Rewrite the log with only live entries (run offline or at startup)."""
+        with self._writer():
+            self._refresh()
+            if self._dim is None:
+                return
+            entries = [{"op": "init", "dim": self._dim}]
+            generation = self._ivf_generation
+            if self._ivf is not None:
+                # centroids only: each upsert below carries its list id
+                generation += 1
+                self._save_ivf(generation, self._ivf.centroids)
+                entries.append({"op": "train", "generation": generation, "rows": self._ivf_trained_rows})
+            for vid, row in self._rows.items():
+                entry = {"op": "upsert", "id": vid, "row": row, "metadata": self._meta[row]}
+                if self._ivf is not None:
+                    entry["list"] = int(self._ivf.assign[row])
+                entries.append(entry)
+            tmp = self._log_path.with_suffix(".jsonl.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for e in entries:
+                    f.write(json.dumps(e, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._log_path)
+            stat = os.stat(self._log_path)
+            self._log_inode = stat.st_ino
+            self._log_offset = stat.st_size
+            self._ivf_generation = generation
+
+            for path in self.directory.glob("ivf-*.npz"):
+                if path != self._ivf_path(generation):
+                    path.unlink(missing_ok=True)
+
+
+class PartitionedLocalVectorStore(VectorStore):
+    """
+    Local backend: one LocalVectorStore shard per namespace, under
+    <directory>/partitions/<namespace>. The default namespace lives in
+    <directory> itself. Shards are opened on first use.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: Path, **shard_options):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._partitions_dir = self.directory / "partitions"
+        self._shard_options = shard_options
+        self._shards: Dict[str, LocalVectorStore] = {}
+        self._lock = threading.Lock()
+
+    def _shard_dir(self, namespace: str) -> Path:
+        return self._partitions_dir / namespace if namespace else self.directory
+
+    def shard(self, namespace: Optional[str], create: bool = False) -> Optional[LocalVectorStore]:
+        namespace = namespace or ""
+        with self._lock:
+            store = self._shards.get(namespace)
+            if store is None:
+                directory = self._shard_dir(namespace)
+                if not create and not (directory / "metadata.jsonl").exists():
+                    return None
+                store = self._shards[namespace] = LocalVectorStore(directory, **self._shard_options)
+            return store
+
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None) -> None:
+        self.shard(namespace, create=True).upsert(vectors)
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None) -> None:
+        store = self.shard(namespace)
+        if store is not None:
+            store.delete(ids)
+
+    def query(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[VectorMatch]:
+        store = self.shard(namespace)
+        if store is None:
+            return []
+        return store.query(vector, top_k, filter)
+
+    def namespaces(self) -> List[str]:
+        names = [""] if (self.directory / "metadata.jsonl").exists() else []
+        if self._partitions_dir.is_dir():
+            names += sorted(
+                p.name for p in self._partitions_dir.iterdir()
+                if (p / "metadata.jsonl").exists()
+            )
+        return names
+
+    def describe(self) -> dict:
+        shards = [self.shard(ns) for ns in self.namespaces()]
+        stats = [s.describe() for s in shards if s is not None]
+        return {
+            "backend": self.name,
+            "total_vector_count": sum(st["total_vector_count"] for st in stats),
+            "dimension": next((st["dimension"] for st in stats if st["dimension"]), None),
+            "namespaces": len(stats),
+        }
+
+    def compact(self) -> None:
+        for ns in self.namespaces():
+            self.shard(ns).compact()
@@ -0,0 +1,196 @@
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Sequence
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import Select, select
+
+from app import models
+from app.database import SessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+
+class ExportSettings(BaseSettings):
+    # rows fetched per round trip from the server-side cursor
+    EXPORT_YIELD_PER: int = 2000
+    EXPORT_GZIP_LEVEL: int = 6
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+export_settings = ExportSettings()
+
+
+# exportable columns, in default order
+EXPORT_COLUMNS = {
+    "id": models.ComplianceCheck.id,
+    "created_at": models.ComplianceCheck.created_at,
+    "department": models.ComplianceCheck.department,
+    "policy_type": models.ComplianceCheck.policy_type,
+    "overall_risk": models.ComplianceCheck.overall_risk,
+    "issues": models.ComplianceCheck.issues,
+    "text": models.ComplianceCheck.text,
+    "suggested_text": models.ComplianceCheck.suggested_text,
+}
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parse_columns(spec: str | None) -> List[str]:
+    """'id,overall_risk' -> ["id", "overall_risk"]; all columns when empty. Raises ValueError."""
+    if not spec:
+        return list(EXPORT_COLUMNS)
+    columns = [c.strip() for c in spec.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}; choose from {', '.join(EXPORT_COLUMNS)}")
+    return list(dict.fromkeys(columns))
+
+
+def export_statement(columns: Sequence[str]) -> Select:
+    # plain column tuples, not ORM objects; oldest first along ix_compliance_checks_created_at_id
+    return (
+        select(*(EXPORT_COLUMNS[c] for c in columns))
+        .order_by(models.ComplianceCheck.created_at, models.ComplianceCheck.id)
+        .execution_options(yield_per=export_settings.EXPORT_YIELD_PER)
+    )
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def iter_rows(stmt: Select) -> Iterator[Sequence[Any]]:
+    """Rows of stmt streamed from a server-side cursor in a session of its own."""
+    with SessionLocal() as db:
+        for row in db.execute(stmt):
+            yield [_plain(v) for v in row]
+
+
+# ---------- Encoders: rows -> byte chunks ----------
+
+def _batched(rows: Iterable[Sequence[Any]], size: int) -> Iterator[List[Sequence[Any]]]:
+    batch: List[Sequence[Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_ndjson(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    for batch in _batched(rows, export_settings.EXPORT_YIELD_PER):
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def encode_csv(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for batch in _batched(rows, export_settings.EXPORT_YIELD_PER):
+        for row in batch:
+            writer.writerow([json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v for v in row])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():  # header only
+        yield buf.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_schema(columns: Sequence[str]):
+    types = {
+        "id": pa.int64(),
+        "created_at": pa.string(),
+        "overall_risk": pa.string(),
+        "issues": pa.string(),  # JSON
+    }
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def encode_parquet(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """One row group per EXPORT_YIELD_PER rows, each flushed as soon as it is written."""
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in _batched(rows, export_settings.EXPORT_YIELD_PER):
+            arrays = [
+                pa.array(
+                    [json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v for v in col],
+                    type=field.type,
+                )
+                for field, col in zip(schema, zip(*batch))
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int | None = None) -> Iterator[bytes]:
+    """Compress a byte stream into a single gzip member as it goes."""
+    compressor = zlib.compressobj(
+        export_settings.EXPORT_GZIP_LEVEL if level is None else level,
+        zlib.DEFLATED,
+        31,  # gzip container
+    )
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -1,16 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .models import Base
-from .database import engine
+from .database import dispose_async_engine, init_db
+from app.clients import clients
+from app.audit_log import audit_log_writer
 from app.routers_policies import router as policies_router
 from app.routers_compliance import router as compliance_router
 from app.routers_health import router as health_router
-
-
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="AI Compliance Policy Checker", description="A tool to check AI models for compliance with various policies.")
+from app.routers_analytics import router as analytics_router
+from app.ingestion_jobs import resume_pending_jobs, shutdown_ingestion_workers
+from app.pdf_extract import shutdown_extraction_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema creation is a startup step, not an import side effect
+    init_db()
+    # pick up ingestion jobs interrupted by the last shutdown
+    resume_pending_jobs()
+    await audit_log_writer.start()
+    yield
+    # flush queued check logs while the DB pool is still open
+    await audit_log_writer.stop()
+    shutdown_ingestion_workers()
+    shutdown_extraction_pool()
+    clients.close()
+    await clients.aclose()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="AI Compliance Policy Checker", description="A tool to check AI models for compliance with various policies.", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -23,12 +44,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], 
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
 app.include_router(policies_router)
 app.include_router(compliance_router)
 app.include_router(health_router)
+app.include_router(analytics_router)
 
 
 @app.get("/health")
@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime, timezone
 from typing import List, Optional
 
-from sqlalchemy import ForeignKey, String, Text, DateTime, func, Enum as SAEnum
+from sqlalchemy import Boolean, Date, ForeignKey, Index, Integer, LargeBinary, String, Text, DateTime, func, Enum as SAEnum
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 import enum
@@ -25,6 +25,16 @@ class PolicyType(str, enum.Enum):
     hr = "hr"
 
 
+# -----------------------------
+# Ingestion Job Status Enum
+# -----------------------------
+class IngestionStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
 # -----------------------------
 # Policy Document Model
 # -----------------------------
@@ -55,20 +65,83 @@ class PolicyChunk(Base):
     document_id: Mapped[int] = mapped_column(ForeignKey("policy_documents.id"))
     section_title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     text: Mapped[str] = mapped_column(Text)
+    # sha256 of text; lets re-ingestion reuse unchanged chunks
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+
+    # order within the document and the (1-based) pages the chunk spans
+    position: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    page_start: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    page_end: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # number of lexical-index tokens; NULL until the chunk has been indexed
+    token_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
     document: Mapped["PolicyDocument"] = relationship(back_populates="chunks")
 
 
+# -----------------------------
+# Lexical Posting Model
+# -----------------------------
+class LexicalPosting(Base):
+    """BM25 inverted index over PolicyChunk.text: one row per (term, chunk)."""
+    __tablename__ = "lexical_postings"
+
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    chunk_id: Mapped[int] = mapped_column(ForeignKey("policy_chunks.id", ondelete="CASCADE"), primary_key=True, index=True)
+    tf: Mapped[int] = mapped_column(Integer)
+
+
+# -----------------------------
+# Ingestion Job Model
+# -----------------------------
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    document_id: Mapped[int] = mapped_column(ForeignKey("policy_documents.id"), index=True)
+    status: Mapped[IngestionStatus] = mapped_column(SAEnum(IngestionStatus), default=IngestionStatus.queued, index=True)
+    # re-upsert every kept chunk (document metadata changed)
+    full_reindex: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    chunk_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    chunks_added: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    chunks_reused: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    chunks_removed: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # lease of a running job: the worker running it and when it last checked in
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    document: Mapped["PolicyDocument"] = relationship()
+
+
 # -----------------------------
 # Compliance Check Model
 # -----------------------------
 class ComplianceCheck(Base):
     __tablename__ = "compliance_checks"
+    # log browsing filters by department and/or overall_risk and pages
+    # newest-first on (created_at, id); see list_compliance_logs
+    __table_args__ = (
+        Index("ix_compliance_checks_created_at_id", "created_at", "id"),
+        Index("ix_compliance_checks_department_created_at_id", "department", "created_at", "id"),
+        Index("ix_compliance_checks_overall_risk_created_at_id", "overall_risk", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)    
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # set client-side too: sub-second precision keeps keyset pages stable
+    # (SQLite's CURRENT_TIMESTAMP only has seconds)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        nullable=False,
+    )
 
     department: Mapped[str | None] = mapped_column(String(100), nullable=True)
     policy_type: Mapped["PolicyType | None"] = mapped_column(
@@ -86,4 +159,75 @@ class ComplianceCheck(Base):
     )
 
     # suggested rewrite
-    suggested_text: Mapped[str | None] = mapped_column(Text, nullable=True)
\ No newline at end of file
+    suggested_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+# -----------------------------
+# Policy Corpus State Model
+# -----------------------------
+class PolicyCorpusState(Base):
+    """Single-row table whose version is bumped whenever ingestion changes the corpus."""
+    __tablename__ = "policy_corpus_state"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# -----------------------------
+# Compliance Cache Entry Model
+# -----------------------------
+class ComplianceCacheEntry(Base):
+    """Shared tier of the verdict cache (see app.verdict_cache)."""
+    __tablename__ = "compliance_cache_entries"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    # ComplianceCheckResponse serialized as JSON
+    response: Mapped[str] = mapped_column(Text, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+# -----------------------------
+# Embedding Cache Entry Model
+# -----------------------------
+class EmbeddingCacheEntry(Base):
+    """Persistent embedding cache (see app.embedding_cache)."""
+    __tablename__ = "embedding_cache"
+
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    dim: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # little-endian float32, dim * 4 bytes
+    vector: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+# -----------------------------
+# Compliance Analytics Rollups
+# -----------------------------
+# Maintained by app.analytics on every logged check; "" stands for a
+# missing department / policy_type so the dimensions can be primary keys.
+class ComplianceDailyRiskCount(Base):
+    """Checks per UTC day, department, policy_type and overall_risk."""
+    __tablename__ = "compliance_daily_risk_counts"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    department: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    policy_type: Mapped[str] = mapped_column(String(50), primary_key=True, default="")
+    overall_risk: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ComplianceDailyIssueCount(Base):
+    """Reported issues per UTC day, department and issue type."""
+    __tablename__ = "compliance_daily_issue_counts"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    department: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    issue_type: Mapped[str] = mapped_column(String(100), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import fitz
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Kept free of app imports: worker processes import this module to run
+# _extract_page_range, and must not build DB / OpenAI / Pinecone clients.
+
+
+class PdfExtractSettings(BaseSettings):
+    # worker processes for page extraction; 1 disables the process pool
+    PDF_EXTRACT_WORKERS: int = max(1, (os.cpu_count() or 1) - 1)
+    # documents with fewer pages are extracted serially in-process
+    PDF_PARALLEL_MIN_PAGES: int = 64
+    PDF_PAGES_PER_TASK: int = 16
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+pdf_settings = PdfExtractSettings()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=pdf_settings.PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[tuple[int, str]]:
+    """Worker: text of pages [start, stop) as (1-based page number, text)."""
+    with fitz.open(file_path) as doc:
+        return [(i + 1, doc[i].get_text()) for i in range(start, stop)]
+
+
+def iter_pdf_pages_serial(file_path: str) -> Iterator[tuple[int, str]]:
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.number + 1, page.get_text()
+
+
+def iter_pdf_pages_parallel(file_path: str, page_count: int, workers: int) -> Iterator[tuple[int, str]]:
+    """
+    Extract page ranges on the shared process pool and yield pages in
+    order. Only `workers * 2` ranges are in flight at a time, so memory
+    stays bounded even when the consumer is slower than extraction.
+    Concurrent ingestions share the pool, spreading several documents'
+    ranges across the same workers.
+    """
+    per_task = max(1, pdf_settings.PDF_PAGES_PER_TASK)
+    ranges = iter([(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)])
+    pool = _get_pool()
+
+    pending = deque()
+    for _ in range(workers * 2):
+        r = next(ranges, None)
+        if r is None:
+            break
+        pending.append(pool.submit(_extract_page_range, file_path, *r))
+
+    while pending:
+        pages = pending.popleft().result()
+        r = next(ranges, None)
+        if r is not None:
+            pending.append(pool.submit(_extract_page_range, file_path, *r))
+        yield from pages
+
+
+def iter_pdf_pages(file_path: str, workers: Optional[int] = None) -> Iterator[tuple[int, str]]:
+    """Yield (page_number, text) in page order, in parallel for large documents."""
+    workers = workers or pdf_settings.PDF_EXTRACT_WORKERS
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count < pdf_settings.PDF_PARALLEL_MIN_PAGES:
+        yield from iter_pdf_pages_serial(file_path)
+    else:
+        yield from iter_pdf_pages_parallel(file_path, page_count, workers)
@@ -0,0 +1,202 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.vector_backends import vector_similarity
+from app.verdict_cache import read_corpus_version
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrescreenSettings(BaseSettings):
+    PRESCREEN_ENABLED: bool = True
+    # text whose best policy match is below this cosine similarity, and
+    # that trips no rule, is answered NONE without calling the LLM
+    PRESCREEN_SIMILARITY_THRESHOLD: float = 0.3
+    # corpus-derived keywords (codenames, acronyms, ids) kept in the rule set
+    PRESCREEN_MAX_CORPUS_TERMS: int = 2000
+    # how often to check whether the corpus changed and rules need a rebuild
+    PRESCREEN_RULES_REFRESH_SECONDS: float = 300.0
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+prescreen_settings = PrescreenSettings()
+
+
+# patterns that always route to the LLM, whatever the corpus says
+BASE_PATTERNS: Dict[str, str] = {
+    "email": r"[\w.+-]+@[\w-]+\.[\w.-]+",
+    "phone_number": r"\+?\d[\d\s().-]{8,}\d",
+    "card_number": r"\b(?:\d[ -]?){13,19}\b",
+    "ssn": r"\b\d{3}-\d{2}-\d{4}\b",
+    "iban": r"\b[A-Z]{2}\d{2}[A-Z0-9]{11,30}\b",
+    "credential": r"(?i)\b(?:password|passwd|api[ _-]?key|secret|access[ _-]?token|credentials?)\b",
+    "confidentiality_marker": r"(?i)\b(?:confidential|internal[ -]only|do not (?:share|forward|distribute)|nda|embargo(?:ed)?|proprietary)\b",
+    "financial_disclosure": r"(?i)\b(?:revenue|earnings|forecast|acquisition|merger|layoffs?|guidance|valuation)\b",
+    "commitment": r"(?i)\b(?:guarantee[ds]?|promise[ds]?|risk[- ]free|warrant(?:y|ies))\b",
+}
+
+# acronyms, product codes and ids as written in policies ("NDA", "FALCON", "ACME-1234")
+_CORPUS_TERM_RE = re.compile(r"\b(?:[A-Z][A-Z0-9]{2,}(?:-[A-Z0-9]+)*|[A-Za-z]+-?\d+[A-Za-z0-9-]*)\b")
+# too common in business text to signal anything
+_COMMON_TERMS = frozenset(["THE", "AND", "FOR", "ALL", "NOT", "ANY", "USA", "FAQ", "PDF", "CEO", "CFO", "CTO", "ISO"])
+
+
+def extract_corpus_terms(texts: Iterable[str], limit: int) -> List[str]:
+    counts: Counter = Counter()
+    for text in texts:
+        counts.update(set(_CORPUS_TERM_RE.findall(text)) - _COMMON_TERMS)
+    return [term for term, _ in counts.most_common(limit)]
+
+
+class PrescreenRules:
+    """Compiled base patterns plus one alternation of corpus keywords."""
+
+    def __init__(self, corpus_terms: List[str], corpus_version: Optional[int] = None):
+        self.corpus_version = corpus_version
+        self.corpus_terms = corpus_terms
+        self._patterns = {name: re.compile(p) for name, p in BASE_PATTERNS.items()}
+        self._corpus_re = None
+        if corpus_terms:
+            # longest first, so "ACME-1234" wins over "ACME"
+            alternation = "|".join(re.escape(t) for t in sorted(corpus_terms, key=len, reverse=True))
+            self._corpus_re = re.compile(rf"\b(?:{alternation})\b")
+
+    def matches(self, text: str) -> List[str]:
+        hits = [name for name, pattern in self._patterns.items() if pattern.search(text)]
+        if self._corpus_re is not None:
+            hits += sorted({f"term:{m}" for m in self._corpus_re.findall(text)})
+        return hits
+
+
+def _load_corpus_terms(db: Session) -> List[str]:
+    texts = db.scalars(select(models.PolicyChunk.text).execution_options(yield_per=1000))
+    return extract_corpus_terms(texts, prescreen_settings.PRESCREEN_MAX_CORPUS_TERMS)
+
+
+class RuleCache:
+    """
+    Serves the current rule set without blocking: starts with the base
+    patterns only, and rebuilds in a background thread when the corpus
+    version has changed (checked every PRESCREEN_RULES_REFRESH_SECONDS).
+    """
+
+    def __init__(self):
+        self._rules = PrescreenRules([])
+        self._checked: Optional[float] = None  # monotonic time of the last refresh
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self) -> PrescreenRules:
+        with self._lock:
+            due = (
+                self._checked is None
+                or time.monotonic() - self._checked > prescreen_settings.PRESCREEN_RULES_REFRESH_SECONDS
+            )
+            if due and not self._refreshing:
+                self._refreshing = True
+                self._checked = time.monotonic()
+                threading.Thread(target=self._refresh_in_background, name="prescreen-rules", daemon=True).start()
+        return self._rules
+
+    def refresh(self) -> PrescreenRules:
+        """Rebuild the rules if the corpus changed since the last build."""
+        with SessionLocal() as db:
+            version = read_corpus_version(db)
+            if version != self._rules.corpus_version:
+                self._rules = PrescreenRules(_load_corpus_terms(db), version)
+        return self._rules
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Rebuilding prescreen rules failed")
+        finally:
+            self._refreshing = False
+
+
+rule_cache = RuleCache()
+
+
+@dataclass
+class PrescreenResult:
+    skip: bool
+    reason: str
+    max_similarity: Optional[float] = None
+    rule_hits: List[str] = field(default_factory=list)
+
+
+class PrescreenStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def record(self, result: PrescreenResult) -> None:
+        with self._lock:
+            self._counters["checked"] += 1
+            self._counters["skipped" if result.skip else "sent_to_llm"] += 1
+            self._counters[f"reason:{result.reason}"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        checked = counters.pop("checked", 0)
+        skipped = counters.pop("skipped", 0)
+        return {
+            "enabled": prescreen_settings.PRESCREEN_ENABLED,
+            "checked": checked,
+            "skipped": skipped,
+            "sent_to_llm": counters.pop("sent_to_llm", 0),
+            "skip_rate": skipped / checked if checked else 0.0,
+            "reasons": {k.removeprefix("reason:"): v for k, v in counters.items()},
+            "corpus_terms": len(rule_cache.get().corpus_terms),
+        }
+
+
+prescreen_stats = PrescreenStats()
+
+
+def _decide(text: str, matches: List[Any]) -> PrescreenResult:
+    if not prescreen_settings.PRESCREEN_ENABLED:
+        return PrescreenResult(skip=False, reason="disabled")
+
+    similarities = [s for s in (vector_similarity(m) for m in matches) if s is not None]
+    max_similarity = max(similarities) if similarities else None
+    rule_hits = rule_cache.get().matches(text)
+
+    if rule_hits:
+        return PrescreenResult(False, "rule_hit", max_similarity, rule_hits)
+    if max_similarity is not None and max_similarity >= prescreen_settings.PRESCREEN_SIMILARITY_THRESHOLD:
+        return PrescreenResult(False, "similar_policy", max_similarity)
+    return PrescreenResult(True, "no_nearby_policy", max_similarity)
+
+
+def screen(text: str, matches: List[Any]) -> PrescreenResult:
+    """
+    Decide whether text can skip the LLM: it must trip no rule and have no
+    retrieved policy chunk at or above PRESCREEN_SIMILARITY_THRESHOLD.
+    """
+    result = _decide(text, matches)
+    prescreen_stats.record(result)
+    return result
+
+
+def would_skip(text: str, matches: List[Any]) -> bool:
+    """screen() without counting it; for deciding early whether other LLM work is needed."""
+    return _decide(text, matches).skip
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.get_db import get_db
+from app import models, schemas
+
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+
+RISK_DIMENSIONS = ("department", "policy_type", "overall_risk")
+
+
+def _since(days: int):
+    return datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+
+@router.get("/risk-by-day", response_model=list[schemas.RiskCountByDay])
+def risk_counts_by_day(
+    days: int = Query(default=90, ge=1, le=3660),
+    group_by: List[str] = Query(default=["department", "overall_risk"]),
+    department: Optional[str] = Query(default=None),
+    policy_type: Optional[schemas.PolicyType] = Query(default=None),
+    risk: Optional[str] = Query(default=None, alias="overall_risk"),
+    db: Session = Depends(get_db),
+):
+    """
+    Checks per UTC day over the last `days` days, from the daily rollup
+    (e.g. ?overall_risk=HIGH&group_by=department for HIGH-risk checks per
+    department per day).
+    """
+    unknown = set(group_by) - set(RISK_DIMENSIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(sorted(unknown))}")
+
+    rollup = models.ComplianceDailyRiskCount
+    dims = [getattr(rollup, d) for d in RISK_DIMENSIONS if d in group_by]
+    stmt = (
+        select(rollup.day, *dims, func.sum(rollup.count).label("count"))
+        .where(rollup.day >= _since(days))
+        .group_by(rollup.day, *dims)
+        .order_by(rollup.day, *dims)
+    )
+    if department is not None:
+        stmt = stmt.where(rollup.department == department)
+    if policy_type is not None:
+        stmt = stmt.where(rollup.policy_type == policy_type.value)
+    if risk:
+        stmt = stmt.where(rollup.overall_risk == risk.upper())
+
+    return [
+        schemas.RiskCountByDay(**{k: (v if v != "" else None) for k, v in row._asdict().items()})
+        for row in db.execute(stmt)
+    ]
+
+
+@router.get("/issue-types", response_model=list[schemas.IssueTypeCount])
+def top_issue_types(
+    days: int = Query(default=90, ge=1, le=3660),
+    department: Optional[str] = Query(default=None),
+    limit: int = Query(default=10, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Most frequently reported issue types over the last `days` days."""
+    rollup = models.ComplianceDailyIssueCount
+    total = func.sum(rollup.count).label("count")
+    stmt = (
+        select(rollup.issue_type, total)
+        .where(rollup.day >= _since(days))
+        .group_by(rollup.issue_type)
+        .order_by(total.desc(), rollup.issue_type)
+        .limit(limit)
+    )
+    if department is not None:
+        stmt = stmt.where(rollup.department == department)
+
+    return [schemas.IssueTypeCount(issue_type=t, count=n) for t, n in db.execute(stmt)]
@@ -1,24 +1,34 @@
+import asyncio
+import base64
+import binascii
 import json
 
+from datetime import datetime, timezone
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from openai import OpenAI
 
-from app.database import SessionLocal
-from app import schemas, models
-from app.agent_graph import compliance_app 
-from app.vectorstore import query_policy_chunks
+from app.get_db import get_db
+from app import log_export, schemas, models
+from app.audit_log import audit_log_writer
+from app.agent_graph import compliance_app, astream_compliance
+from app.vectorstore import aembed_texts, embedding_batcher
+from app.verdict_cache import verdict_cache
+from app.embedding_cache import embedding_cache
+from app.prescreen import prescreen_stats
+from app.classifier import classification_cache
 
 
 router = APIRouter(prefix="/compliance", tags=["compliance"])
 
 
-# --- settings for OpenAI (LLM for analysis) ---
-class LLMSettings(BaseSettings):
-    OPENAI_API_KEY: str
+# --- settings for batch checks ---
+class BatchSettings(BaseSettings):
+    COMPLIANCE_BATCH_CONCURRENCY: int = 8       # default in-flight items per batch
+    COMPLIANCE_BATCH_MAX_CONCURRENCY: int = 32  # cap for per-request overrides
 
     model_config = SettingsConfigDict(
         extra='ignore', 
@@ -26,84 +36,69 @@ class LLMSettings(BaseSettings):
         )
 
 
-llm_settings = LLMSettings()
-llm_client = OpenAI(api_key=llm_settings.OPENAI_API_KEY)
+batch_settings = BatchSettings()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+def _check_row(
+    body: schemas.ComplianceCheckRequest,
+    resp: schemas.ComplianceCheckResponse,
+) -> dict:
+    return {
+        "text": body.text,
+        "department": body.department,
+        "policy_type": body.policy_type,
+        "overall_risk": resp.overall_risk,
+        "issues": [i.model_dump() for i in resp.issues] if resp.issues else [],
+        "suggested_text": resp.suggested_text,
+    }
 
-def classify_context_with_llm(text: str) -> tuple[str | None, models.PolicyType | None]:
+
+async def log_compliance_checks(
+    records: list[tuple[schemas.ComplianceCheckRequest, schemas.ComplianceCheckResponse]],
+) -> None:
     """
-    Use the LLM to infer department and policy_type from the user's text.
-    Returns (department, policy_type_enum_or_None).
+    Hand ComplianceCheck rows to the write-behind audit log writer; they
+    are inserted (with the analytics rollups) in background batches.
     """
-    prompt = f"""
-You are a classifier for an AI compliance system.
-
-Given a piece of text, infer:
-- which department it most likely belongs to (e.g. "Sales", "Support", "HR", "Legal", "Marketing")
-- which policy_type applies, from this fixed list:
-  ["confidentiality", "external_communication", "data_privacy", "security", "hr"]
-
-If you are unsure about a field, set it to null.
-
-Return ONLY a JSON object with this exact shape:
-
-{{
-  "department": "Sales" | "Support" | "HR" | "Legal" | "Marketing" | null,
-  "policy_type": "confidentiality" | "external_communication" | "data_privacy" | "security" | "hr" | null
-}}
-
-Text:
-\"\"\"{text}\"\"\"    
-"""
-
-    completion = llm_client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": "You classify text into department and policy_type for compliance checks."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-    )
-
-    content = completion.choices[0].message.content
-    data = json.loads(content) if hasattr(schemas, "json") else __import__("json").loads(content)
+    now = datetime.now(timezone.utc)
+    await audit_log_writer.enqueue([{**_check_row(body, resp), "created_at": now} for body, resp in records])
 
-    department = data.get("department")
-    policy_type_str = data.get("policy_type")
-
-    policy_type_enum: models.PolicyType | None = None
-    if policy_type_str:
-        try:
-            policy_type_enum = models.PolicyType(policy_type_str)
-        except ValueError:
-            policy_type_enum = None
 
-    return department, policy_type_enum
+def _initial_state(
+    body: schemas.ComplianceCheckRequest,
+    query_embedding: Optional[list[float]] = None,
+) -> dict:
+    state = {
+        "text": body.text,
+        "department": body.department,
+        "policy_type": body.policy_type,
+        "top_k": body.top_k,
+        "rewrite": body.rewrite.value,
+    }
+    if query_embedding is not None:
+        state["query_embedding"] = query_embedding
+    return state
 
 
 @router.post("/check", response_model=schemas.ComplianceCheckResponse)
 async def check_compliance(
     body: schemas.ComplianceCheckRequest,
-    db: Session = Depends(get_db),
 ):
+    # Identical drafts against an unchanged corpus reuse the cached verdict
+    cache_key = await verdict_cache.akey(body)
+    cached = await verdict_cache.aget(cache_key)
+    if cached is not None:
+        resp = schemas.ComplianceCheckResponse.model_validate(cached)
+        await log_compliance_checks([(body, resp)])
+        return resp
+
     # Build initial graph state
-    initial_state = {
-        "text": body.text,
-        "department": body.department,
-        "policy_type": body.policy_type,
-        "top_k": body.top_k,
-    }
+    initial_state = _initial_state(body)
 
     try:
-        # Run synchronous graph
-        final_state = compliance_app.invoke(initial_state)
+        # Run the graph on its async path so embedding, Pinecone and LLM
+        # calls don't block the event loop
+        final_state = await compliance_app.ainvoke(initial_state)
     except Exception as e:
         # If Pinecone/LLM explodes, catch here
         raise HTTPException(
@@ -119,46 +114,253 @@ async def check_compliance(
 
     # Turn dict back into response model
     resp = schemas.ComplianceCheckResponse.model_validate(final_state["response"])
+    await verdict_cache.aset(cache_key, resp.model_dump())
 
-    # ---- Log to DB ----
-    db_obj = models.ComplianceCheck(
-        text=body.text,
-        department=body.department,
-        policy_type=body.policy_type,
-        overall_risk=resp.overall_risk,
-        issues=[i.model_dump() for i in resp.issues] if resp.issues else [],
-        suggested_text=resp.suggested_text,
-    )
-    db.add(db_obj)
-    db.commit()
+    # ---- Log to DB (write-behind: batched off the request path) ----
+    await log_compliance_checks([(body, resp)])
 
     return resp
 
 
-@router.get("/logs", response_model=list[schemas.ComplianceCheckLog])
-def list_compliance_logs(
-    department: Optional[str] = Query(default=None),
-    risk: Optional[str] = Query(default=None, alias="overall_risk"),
-    limit: int = Query(default=100, ge=1, le=500),
-    db: Session = Depends(get_db),
-    ):
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/check/stream")
+async def check_compliance_stream(body: schemas.ComplianceCheckRequest):
+    """
+    Server-sent events variant of /check. Events, in order:
+
+    - policies: retrieved policy references (right after retrieval)
+    - risk: the overall_risk verdict
+    - issue: one per issue, as each is parsed
+    - suggested_text: {"delta": ...} pieces of the rewrite
+    - done: the complete ComplianceCheckResponse (also logged and cached)
+    - error: {"detail": ...} if the pipeline fails mid-stream
+    """
+    cache_key = await verdict_cache.akey(body)
+    cached = await verdict_cache.aget(cache_key)
+
+    async def events():
+        try:
+            if cached is not None:
+                resp = schemas.ComplianceCheckResponse.model_validate(cached)
+                yield _sse("risk", {"overall_risk": resp.overall_risk})
+                for issue in resp.issues:
+                    yield _sse("issue", issue.model_dump())
+                if resp.suggested_text:
+                    yield _sse("suggested_text", {"delta": resp.suggested_text})
+            else:
+                resp = None
+                async for event, data in astream_compliance(_initial_state(body)):
+                    if event == "policies":
+                        yield _sse("policies", {"policies": data})
+                    elif event == "risk":
+                        yield _sse("risk", {"overall_risk": data})
+                    elif event == "issue":
+                        yield _sse("issue", data)
+                    elif event == "suggested_text":
+                        yield _sse("suggested_text", {"delta": data})
+                    elif event == "response":
+                        resp = schemas.ComplianceCheckResponse.model_validate(data)
+                await verdict_cache.aset(cache_key, resp.model_dump())
+        except Exception as e:
+            yield _sse("error", {"detail": f"Compliance graph failed: {str(e)}"})
+            return
+
+        # logged before "done": a client that disconnects after reading it
+        # closes the generator at that yield
+        await log_compliance_checks([(body, resp)])
+        yield _sse("done", resp.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/check/batch", response_model=schemas.ComplianceBatchResponse)
+async def check_compliance_batch(
+    body: schemas.ComplianceBatchRequest,
+):
+    """
+    Check many drafts in one call. All texts are embedded in a single
+    embeddings request, the per-item graph runs are fanned out with bounded
+    concurrency, and the successful checks are logged together.
+    Results come back in input order; a failing item carries its error
+    instead of failing the whole batch.
+    """
+    # Serve what we can from the verdict cache; only misses are embedded
+    keys = [await verdict_cache.akey(item) for item in body.items]
+    cached: dict[int, schemas.ComplianceCheckResponse] = {}
+    for i, key in enumerate(keys):
+        hit = await verdict_cache.aget(key)
+        if hit is not None:
+            cached[i] = schemas.ComplianceCheckResponse.model_validate(hit)
+
+    pending = [i for i in range(len(body.items)) if i not in cached]
+    try:
+        embeddings = await aembed_texts([body.items[i].text for i in pending]) if pending else []
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Batch embedding failed: {str(e)}",
+        )
+    embedding_by_index = dict(zip(pending, embeddings))
+
+    concurrency = min(
+        body.concurrency or batch_settings.COMPLIANCE_BATCH_CONCURRENCY,
+        batch_settings.COMPLIANCE_BATCH_MAX_CONCURRENCY,
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, item: schemas.ComplianceCheckRequest):
+        if index in cached:
+            return schemas.ComplianceBatchItemResult(index=index, result=cached[index])
+
+        async with semaphore:
+            try:
+                final_state = await compliance_app.ainvoke(_initial_state(item, embedding_by_index[index]))
+                if "response" not in final_state:
+                    raise ValueError("Compliance graph returned no response")
+                resp = schemas.ComplianceCheckResponse.model_validate(final_state["response"])
+            except Exception as e:
+                return schemas.ComplianceBatchItemResult(
+                    index=index,
+                    error=f"Compliance graph failed: {str(e)}",
+                )
+        await verdict_cache.aset(keys[index], resp.model_dump())
+        return schemas.ComplianceBatchItemResult(index=index, result=resp)
+
+    results = await asyncio.gather(
+        *(run_item(i, item) for i, item in enumerate(body.items))
+    )
+
+    # ---- Log every successful check ----
+    records = [(body.items[r.index], r.result) for r in results if r.result is not None]
+    await log_compliance_checks(records)
+
+    return schemas.ComplianceBatchResponse(results=list(results))
 
-    q = db.query(models.ComplianceCheck)
 
+@router.get("/stats")
+def compliance_stats():
+    """Runtime counters for the check pipeline (cache hit/miss, ...)."""
+    return {
+        "cache": verdict_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "prescreen": prescreen_stats.stats(),
+        "classifier": classification_cache.stats(),
+        "audit_log": audit_log_writer.stats(),
+    }
+
+
+def encode_cursor(log: models.ComplianceCheck) -> str:
+    raw = json.dumps([log.created_at.isoformat(), log.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, log_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _filter_logs(q, department, risk, created_after, created_before):
+    """Filters shared by the log listing and export (works on Query and Select)."""
     if department: # filter bt department
         q = q.filter(models.ComplianceCheck.department == department)
 
     if risk: # filter by overall_risk
         q = q.filter(models.ComplianceCheck.overall_risk == risk.upper())
 
+    if created_after:
+        q = q.filter(models.ComplianceCheck.created_at >= created_after)
+
+    if created_before:
+        q = q.filter(models.ComplianceCheck.created_at < created_before)
+
+    return q
+
+
+@router.get("/logs", response_model=list[schemas.ComplianceCheckLog])
+def list_compliance_logs(
+    response: Response,
+    department: Optional[str] = Query(default=None),
+    risk: Optional[str] = Query(default=None, alias="overall_risk"),
+    created_after: Optional[datetime] = Query(default=None),
+    created_before: Optional[datetime] = Query(default=None),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(default=100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    ):
+    """
+    Newest first. Pages are keyset-based on (created_at, id): when more
+    rows follow, the X-Next-Cursor header holds the cursor for the next
+    page.
+    """
+    q = _filter_logs(db.query(models.ComplianceCheck), department, risk, created_after, created_before)
+
+    if cursor:
+        # strictly after the last row of the previous page
+        q = q.filter(
+            tuple_(models.ComplianceCheck.created_at, models.ComplianceCheck.id) < decode_cursor(cursor)
+        )
 
     logs = (
-        q.order_by(models.ComplianceCheck.created_at.desc())
-        .limit(limit)
+        q.order_by(models.ComplianceCheck.created_at.desc(), models.ComplianceCheck.id.desc())
+        .limit(limit + 1)  # one extra row tells whether there is a next page
         .all()
     )
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(logs[-1])
     return logs
 
+@router.get("/logs/export")
+def export_compliance_logs(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv|parquet)$"),
+    columns: Optional[str] = Query(default=None, description="comma-separated; default all"),
+    gzip: bool = Query(default=False),
+    department: Optional[str] = Query(default=None),
+    risk: Optional[str] = Query(default=None, alias="overall_risk"),
+    created_after: Optional[datetime] = Query(default=None),
+    created_before: Optional[datetime] = Query(default=None),
+):
+    """
+    Stream matching logs, oldest first, as NDJSON, CSV or Parquet (needs
+    pyarrow). Rows come from a server-side cursor in EXPORT_YIELD_PER
+    batches and are encoded (and gzipped) as they arrive, so memory use
+    does not grow with the export size.
+    """
+    try:
+        selected = log_export.parse_columns(columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "parquet" and log_export.pq is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow on the server.")
+
+    stmt = _filter_logs(log_export.export_statement(selected), department, risk, created_after, created_before)
+    chunks = log_export.ENCODERS[format](selected, log_export.iter_rows(stmt))
+    media_type, extension = log_export.FORMATS[format]
+    if gzip:
+        chunks = log_export.gzip_chunks(chunks)
+        media_type, extension = "application/gzip", f"{extension}.gz"
+
+    return StreamingResponse(
+        # a sync iterator: Starlette pulls it on the threadpool, so the
+        # blocking DB reads stay off the event loop
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="compliance_logs.{extension}"'},
+    )
+
+
 @router.get("/logs/{log_id}", response_model=schemas.ComplianceCheckLog)
 def get_compliance_log(
     log_id: int,
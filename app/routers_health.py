@@ -1,21 +1,13 @@
 from fastapi import APIRouter, HTTPException
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
-from app.vectorstore import index
+from app.database import SessionLocal, pool_stats
+from app.clients import clients
+from app.vectorstore import settings as vector_settings
 
 router = APIRouter(prefix="/health", tags=["health"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("/")
 def health_check():
     db_ok = False
@@ -23,16 +15,16 @@ def health_check():
 
     # Check DB
     try:
-        db = next(get_db())
-        db.execute(text("SELECT 1"))
+        with SessionLocal() as db:
+            db.execute(text("SELECT 1"))
         db_ok = True
     except Exception:
         db_ok = False
 
-    # Check Pinecone
+    # Check the vector store (Pinecone or local)
     try:
         # cheap-ish call to verify connectivity
-        index.describe_index_stats()
+        clients.vector_store.describe()
         pinecone_ok = True
     except Exception:
         pinecone_ok = False
@@ -46,6 +38,8 @@ def health_check():
                 "status": status,
                 "db_ok": db_ok,
                 "pinecone_ok": pinecone_ok,
+                "vector_backend": vector_settings.VECTOR_BACKEND,
+                "db_pool": pool_stats(),
             },
         )
 
@@ -53,4 +47,6 @@ def health_check():
         "status": status,
         "db_ok": db_ok,
         "pinecone_ok": pinecone_ok,
+        "vector_backend": vector_settings.VECTOR_BACKEND,
+        "db_pool": pool_stats(),
     }
@@ -1,37 +1,119 @@
+import shutil
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.get_db import get_async_db, get_db, run_sync
 from app import models, schemas
-from app.ingestion import ingest_policy_document
+from app.ingestion import delete_policy_document
+from app.ingestion_jobs import enqueue_ingestion, retry_ingestion_job
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-router = APIRouter(prefix="/policies", tags=["policies"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+router = APIRouter(prefix="/policies", tags=["policies"])
 
 # ---------- Storage dir ----------
 BASE_DIR = Path(__file__).resolve().parent.parent
 POLICY_STORAGE_DIR = BASE_DIR / "storage" / "policies"
 POLICY_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+UPLOAD_COPY_BUFFER = 1024 * 1024
+
+
+def _save_upload(file: UploadFile, dest_path: Path) -> None:
+    # copy in fixed-size blocks instead of reading the whole upload into memory
+    with dest_path.open("wb") as out:
+        shutil.copyfileobj(file.file, out, UPLOAD_COPY_BUFFER)
+
+
+def _ensure_no_active_job(db: Session, document_id: int) -> None:
+    active = (
+        db.query(models.IngestionJob)
+        .filter(
+            models.IngestionJob.document_id == document_id,
+            models.IngestionJob.status.in_([models.IngestionStatus.queued, models.IngestionStatus.running]),
+        )
+        .first()
+    )
+    if active:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document has an ingestion job in progress (job id={active.id}).",
+        )
+
+
+def _find_document(db: Session, title: str, policy_type: schemas.PolicyType) -> Optional[int]:
+    # same title + policy_type is a new version of an existing document
+    # (it's written to the same file), so re-ingest it in place and only
+    # the chunks that changed get re-embedded
+    doc = (
+        db.query(models.PolicyDocument)
+        .filter(models.PolicyDocument.title == title)
+        .filter(models.PolicyDocument.policy_type == policy_type)
+        .order_by(models.PolicyDocument.created_at.desc())
+        .first()
+    )
+    if doc is None:
+        return None
+    # the running job is reading the file we would overwrite
+    _ensure_no_active_job(db, doc.id)
+    return doc.id
+
+
+def _register_upload(
+    db: Session,
+    document_id: Optional[int],
+    title: str,
+    policy_type: schemas.PolicyType,
+    department: Optional[str],
+    version: Optional[str],
+    file_path: str,
+) -> schemas.PolicyUploadAccepted:
+    full_reindex = False
+    if document_id is None:
+        # create DB row
+        doc = models.PolicyDocument(
+            title=title,
+            file_path=file_path,
+            policy_type=policy_type,  # enum
+            department=department,
+            version=version,
+        )
+        db.add(doc)
+    else:
+        doc = db.get(models.PolicyDocument, document_id)
+        # department is vector metadata, so a change means re-upserting everything
+        full_reindex = doc.department != department
+        doc.file_path = file_path
+        doc.department = department
+        doc.version = version
+    db.commit()
+    db.refresh(doc)
+
+    # parsing, chunking, embedding and indexing happen on the ingestion
+    # workers; poll GET /policies/jobs/{job_id} for progress
+    job = enqueue_ingestion(db, doc.id, full_reindex)
+
+    return schemas.PolicyUploadAccepted(
+        **schemas.PolicyDocumentRead.model_validate(doc).model_dump(),
+        job=schemas.IngestionJobRead.model_validate(job),
+    )
+
 
 # ---------- Endpoints ----------
-@router.post("/upload", response_model=schemas.PolicyDocumentRead)
+@router.post("/upload", response_model=schemas.PolicyUploadAccepted, status_code=202)
 async def upload_policy(
     title: str = Form(...),
     policy_type: schemas.PolicyType = Form(...),
     department: str | None = Form(None),
     version: str | None = Form(None),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: Optional["AsyncSession"] = Depends(get_async_db),
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="File must have a name")
@@ -42,25 +124,12 @@ async def upload_policy(
     dest_filename = f"{safe_name}_{policy_type.value}{ext}"
     dest_path = POLICY_STORAGE_DIR / dest_filename
 
+    document_id = await run_sync(db, _find_document, title, policy_type)
+
     # save file to disk
-    content = await file.read()
-    dest_path.write_bytes(content)
-
-    # create DB row
-    doc = models.PolicyDocument(
-        title=title,
-        file_path=str(dest_path),
-        policy_type=policy_type,  # enum
-        department=department,
-        version=version,
-    )
-    db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    await run_in_threadpool(_save_upload, file, dest_path)
 
-    ingest_policy_document(db, doc.id)
-    
-    return doc
+    return await run_sync(db, _register_upload, document_id, title, policy_type, department, version, str(dest_path))
 
 
 @router.get("/", response_model=list[schemas.PolicyDocumentRead])
@@ -72,3 +141,53 @@ def list_policies(db: Session = Depends(get_db)):
     )
     return docs
 
+
+@router.delete("/{document_id}", status_code=204)
+def delete_policy(document_id: int, db: Session = Depends(get_db)):
+    """
+    Delete a policy document together with its chunks and their vectors.
+    """
+    doc = db.get(models.PolicyDocument, document_id)
+    if not doc:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Policy document with id={document_id} not found.",
+        )
+    _ensure_no_active_job(db, document_id)
+
+    file_path = Path(doc.file_path)
+    delete_policy_document(db, document_id)
+    file_path.unlink(missing_ok=True)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestionJobRead)
+def get_ingestion_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Fetch the status of an ingestion job.
+    """
+    job = db.get(models.IngestionJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingestion job with id={job_id} not found.",
+        )
+    return job
+
+
+@router.post("/jobs/{job_id}/retry", response_model=schemas.IngestionJobRead, status_code=202)
+def retry_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Re-queue a failed ingestion job; it resumes from the last committed batch.
+    """
+    job = db.get(models.IngestionJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingestion job with id={job_id} not found.",
+        )
+    if job.status != models.IngestionStatus.failed:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Only failed jobs can be retried (job is {job.status.value}).",
+        )
+    return retry_ingestion_job(db, job)
@@ -1,8 +1,9 @@
-from datetime import datetime
+import enum
+from datetime import date, datetime
 from typing import Optional, List, Any
 
-from pydantic import BaseModel, ConfigDict, field_validator
-from app.models import PolicyType
+from pydantic import BaseModel, ConfigDict, computed_field, field_validator
+from app.models import PolicyType, IngestionStatus
 
 
 class PolicyDocumentBase(BaseModel):
@@ -23,6 +24,33 @@ class PolicyDocumentRead(PolicyDocumentBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class IngestionJobRead(BaseModel):
+    id: int
+    document_id: int
+    status: IngestionStatus
+    chunk_count: Optional[int] = None
+    chunks_added: Optional[int] = None
+    chunks_reused: Optional[int] = None
+    chunks_removed: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+
+class PolicyUploadAccepted(PolicyDocumentRead):
+    job: IngestionJobRead
+
+
 class ComplianceIssue(BaseModel):
     type: str
     policy_reference: Optional[str] = None
@@ -30,11 +58,18 @@ class ComplianceIssue(BaseModel):
     explanation: str
 
 
+class RewriteMode(str, enum.Enum):
+    never = "never"
+    if_risky = "if_risky"  # only for MEDIUM / HIGH verdicts
+    always = "always"
+
+
 class ComplianceCheckRequest(BaseModel):
     text: str
     department: Optional[str] = None
     policy_type: Optional[PolicyType] = None
     top_k: int = 5  # how many chunks to retrieve
+    rewrite: RewriteMode = RewriteMode.if_risky  # when to produce suggested_text
 
     @field_validator("text")
     @classmethod
@@ -51,6 +86,38 @@ class ComplianceCheckResponse(BaseModel):
     issues: List[ComplianceIssue]
     suggested_text: Optional[str] = None
 
+
+class ComplianceBatchRequest(BaseModel):
+    items: List[ComplianceCheckRequest]
+    concurrency: Optional[int] = None  # overrides the server default, capped
+
+    @field_validator("items")
+    @classmethod
+    def validate_items(cls, v: List[ComplianceCheckRequest]) -> List[ComplianceCheckRequest]:
+        if not v:
+            raise ValueError("Batch must contain at least one item")
+        if len(v) > 500:
+            raise ValueError("Batch must not exceed 500 items")
+        return v
+
+    @field_validator("concurrency")
+    @classmethod
+    def validate_concurrency(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("Concurrency must be at least 1")
+        return v
+
+
+class ComplianceBatchItemResult(BaseModel):
+    index: int  # position in the request's items list
+    result: Optional[ComplianceCheckResponse] = None
+    error: Optional[str] = None
+
+
+class ComplianceBatchResponse(BaseModel):
+    results: List[ComplianceBatchItemResult]
+
+
 class ComplianceCheckLog(BaseModel):
     id: int
     created_at: datetime
@@ -64,4 +131,18 @@ class ComplianceCheckLog(BaseModel):
     model_config = ConfigDict( 
         from_attributes = True   # so we can return ORM model instances
     )
-           
+
+
+class RiskCountByDay(BaseModel):
+    day: date
+    # only the group_by dimensions are set; null department / policy_type
+    # in a grouped row means "not specified on the check"
+    department: Optional[str] = None
+    policy_type: Optional[str] = None
+    overall_risk: Optional[str] = None
+    count: int
+
+
+class IssueTypeCount(BaseModel):
+    issue_type: str
+    count: int
@@ -3,7 +3,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.database import SessionLocal
+from app.database import SessionLocal, init_db
 from app.models import Base
 from fastapi import Depends
 
@@ -24,10 +24,22 @@ def override_get_db():
 @pytest.fixture(scope="session", autouse=True)
 def setup_test_db():
     Base.metadata.create_all(bind=engine)
+    init_db()  # TestClient is used without its lifespan
     app.dependency_overrides[SessionLocal] = override_get_db
     yield
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="session", autouse=True)
+def isolate_storage(tmp_path_factory):
+    # uploads and audit spill files go to a temp dir, not the repo's storage/
+    from app import routers_policies
+    from app.audit_log import audit_log_settings
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(routers_policies, "POLICY_STORAGE_DIR", tmp_path_factory.mktemp("policies"))
+        mp.setattr(audit_log_settings, "AUDIT_LOG_SPILL_DIR", tmp_path_factory.mktemp("audit_spill"))
+        yield
+
 @pytest.fixture
 def client():
     return TestClient(app)
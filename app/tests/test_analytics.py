@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import analytics, models
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def analytics_rows():
+    yield
+    # other tests count every logged check
+    with SessionLocal() as db:
+        db.query(models.ComplianceCheck).filter(models.ComplianceCheck.department == "Analytics").delete()
+        for model in (models.ComplianceDailyRiskCount, models.ComplianceDailyIssueCount):
+            db.query(model).filter(model.department == "Analytics").delete()
+        db.commit()
+
+
+def _risk_rollup(db, since):
+    rollup = models.ComplianceDailyRiskCount
+    return {
+        (r.day, r.department, r.policy_type, r.overall_risk): r.count
+        for r in db.query(rollup).filter(rollup.day >= since, rollup.department == "Analytics")
+    }
+
+
+def test_rollups_track_logged_checks(client, monkeypatch, analytics_rows):
+    class FakeGraph:
+        async def ainvoke(self, state):
+            risk = "HIGH" if "leak" in state["text"] else "LOW"
+            issues = [{"type": "Confidentiality", "excerpt": "leak", "explanation": "x"}] if risk == "HIGH" else []
+            return {"response": {"overall_risk": risk, "issues": issues, "suggested_text": None}}
+
+    monkeypatch.setattr("app.routers_compliance.compliance_app", FakeGraph())
+
+    for text in ["leak roadmap", "leak pricing", "hello team"]:
+        client.post("/compliance/check", json={"text": f"{text} (analytics)", "department": "Analytics"})
+
+    today = datetime.now(timezone.utc).date()
+    resp = client.get("/analytics/risk-by-day", params={"department": "Analytics", "days": 1})
+    assert resp.status_code == 200
+    assert sorted((r["overall_risk"], r["count"]) for r in resp.json()) == [("HIGH", 2), ("LOW", 1)]
+    assert {r["day"] for r in resp.json()} == {today.isoformat()}
+
+    high = client.get("/analytics/risk-by-day", params={"overall_risk": "HIGH", "group_by": "department", "department": "Analytics"}).json()
+    assert high == [{"day": today.isoformat(), "department": "Analytics", "policy_type": None, "overall_risk": None, "count": 2}]
+
+    top = client.get("/analytics/issue-types", params={"department": "Analytics"}).json()
+    assert top == [{"issue_type": "Confidentiality", "count": 2}]
+
+    assert client.get("/analytics/risk-by-day", params={"group_by": "text"}).status_code == 400
+
+    # the compaction job rebuilds the same counts from compliance_checks
+    with SessionLocal() as db:
+        since = today - timedelta(days=1)
+        incremental = _risk_rollup(db, since)
+        analytics.recompute_rollups(db, since, today)
+        assert _risk_rollup(db, since) == incremental
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app import audit_log, models
+from app.audit_log import AuditLogSettings, AuditLogWriter
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def audit_rows():
+    yield
+    # other tests count every logged check
+    with SessionLocal() as db:
+        db.query(models.ComplianceCheck).filter(models.ComplianceCheck.department == "Audit").delete()
+        for model in (models.ComplianceDailyRiskCount, models.ComplianceDailyIssueCount):
+            db.query(model).filter(model.department == "Audit").delete()
+        db.commit()
+
+
+def _row(i):
+    return {
+        "text": f"audit {i}", "department": "Audit", "policy_type": models.PolicyType.hr,
+        "overall_risk": "LOW", "issues": [], "suggested_text": None,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def _logged():
+    with SessionLocal() as db:
+        return sorted(t for (t,) in db.query(models.ComplianceCheck.text).filter(models.ComplianceCheck.department == "Audit"))
+
+
+def test_writer_batches_and_flushes_on_stop(tmp_path, audit_rows):
+    writer = AuditLogWriter(AuditLogSettings(
+        AUDIT_LOG_BATCH_SIZE=2, AUDIT_LOG_FLUSH_INTERVAL_SECONDS=5, AUDIT_LOG_SPILL_DIR=tmp_path,
+    ))
+
+    async def scenario():
+        await writer.start()
+        await writer.enqueue([_row(i) for i in range(3)])
+        for _ in range(100):  # first batch of two is full: flushed without waiting
+            if writer.stats()["written"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert _logged() == ["audit 0", "audit 1"]
+        await writer.stop()  # the third row's batch is still open
+
+    asyncio.run(scenario())
+    assert _logged() == ["audit 0", "audit 1", "audit 2"]
+    assert writer.stats()["batches"] == 2
+
+
+def test_backpressure_falls_back_to_direct_write(tmp_path, audit_rows):
+    writer = AuditLogWriter(AuditLogSettings(
+        AUDIT_LOG_QUEUE_SIZE=1, AUDIT_LOG_ENQUEUE_TIMEOUT_SECONDS=0.01,
+        AUDIT_LOG_FLUSH_INTERVAL_SECONDS=5, AUDIT_LOG_SPILL_DIR=tmp_path,
+    ))
+
+    async def scenario():
+        await writer.start()
+        await writer.enqueue([_row(0)])
+        await asyncio.sleep(0.01)  # the writer takes row 0 and holds its batch open
+        await writer.enqueue([_row(1), _row(2), _row(3)])  # 1 is queued, 2 and 3 don't fit
+        assert _logged() == ["audit 2", "audit 3"]
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert _logged() == ["audit 0", "audit 1", "audit 2", "audit 3"]
+    assert writer.stats()["backpressure_waits"] == 1 and writer.stats()["direct_writes"] == 1
+
+
+def test_failed_batches_spill_and_replay(tmp_path, monkeypatch, audit_rows):
+    writer = AuditLogWriter(AuditLogSettings(AUDIT_LOG_SPILL_DIR=tmp_path))
+    real_write = audit_log.write_check_rows_in_new_session
+
+    def db_down(rows):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(audit_log, "write_check_rows_in_new_session", db_down)
+    writer._write_or_spill([_row(0), _row(1)])
+    assert len(list(tmp_path.glob("*.ndjson"))) == 1 and _logged() == []
+
+    monkeypatch.setattr(audit_log, "write_check_rows_in_new_session", real_write)
+    writer._write_or_spill([_row(2)])  # a successful write replays the spill
+
+    assert _logged() == ["audit 0", "audit 1", "audit 2"]
+    assert list(tmp_path.glob("*.ndjson")) == []
+    assert writer.stats()["spilled"] == 2 and writer.stats()["replayed"] == 2
@@ -0,0 +1,98 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app import agent_graph, classifier
+from app.models import PolicyType
+from app.vector_backends import VectorMatch
+
+
+def _match(chunk_id, department, policy_type, similarity=0.8):
+    meta = {"document_id": chunk_id, "chunk_id": chunk_id, "text": f"policy {chunk_id}",
+            "department": department, "policy_type": policy_type}
+    return VectorMatch(id=f"chunk-{chunk_id}", score=similarity, metadata=meta, vector_score=similarity)
+
+
+def test_rerank_prefers_agreeing_candidates():
+    candidates = [_match(1, "Sales", "security"), _match(2, "HR", "hr"), _match(3, "hr", "confidentiality")]
+
+    assert [m.id for m in classifier.rerank(candidates, "HR", None, 2)] == ["chunk-2", "chunk-3"]
+    assert [m.id for m in classifier.rerank(candidates, "HR", PolicyType.hr, 3)] == ["chunk-2", "chunk-1", "chunk-3"]
+    assert [m.id for m in classifier.rerank(candidates, None, None, 2)] == ["chunk-1", "chunk-2"]
+
+
+def test_graph_classifies_alongside_retrieval(monkeypatch):
+    queries, calls = [], []
+
+    async def fake_query(**kwargs):
+        queries.append(kwargs)
+        return [_match(1, "Sales", "security"), _match(2, "HR", "hr"), _match(3, "HR", "security")]
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            prompt = kwargs["messages"][-1]["content"]
+            if "You are a classifier" in prompt:
+                calls.append("classify")
+                content = json.dumps({"department": "HR", "policy_type": None})
+            else:
+                calls.append("analysis")
+                content = json.dumps({"overall_risk": "NONE", "issues": []})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(agent_graph, "aquery_policy_chunks", fake_query)
+    monkeypatch.setattr(agent_graph.clients.async_openai.chat, "completions", FakeCompletions())
+    monkeypatch.setattr(agent_graph, "classification_cache", classifier.ClassificationCache(classifier.classifier_settings))
+
+    state = {"text": "Can I share salary bands with a candidate?", "top_k": 2}
+    for _ in range(2):
+        result = asyncio.run(agent_graph.compliance_app.ainvoke(state))
+        assert [m.id for m in result["matches"]] == ["chunk-2", "chunk-3"]
+        assert result["classification"] == {"department": "HR", "policy_type": None}
+
+    # unfiltered and deeper; the second run's classification came from the cache
+    assert queries[0]["filters"] is None and queries[0]["top_k"] == 2 * classifier.classifier_settings.CLASSIFIER_CANDIDATE_MULTIPLIER
+    assert calls == ["classify", "analysis", "analysis"]
+    assert agent_graph.classification_cache.stats()["hits"] == 1
+
+    # a caller-supplied department is kept as a filter and not re-inferred
+    result = asyncio.run(agent_graph.compliance_app.ainvoke({**state, "department": "Sales"}))
+    assert queries[-1]["filters"] == {"department": "Sales"}
+    assert result["classification"] == {"department": None, "policy_type": None}
+
+
+def test_sync_retrieval_classifies_concurrently(monkeypatch):
+    import threading
+
+    classifying = threading.Event()
+
+    def fake_classify(text):
+        classifying.set()
+        return "HR", None
+
+    def fake_query(**kwargs):
+        # only returns once classification has started on another thread
+        assert classifying.wait(5), "classification did not run alongside retrieval"
+        return [_match(1, "Sales", "security"), _match(2, "HR", "hr")]
+
+    monkeypatch.setattr(agent_graph, "classify_context_with_llm", fake_classify)
+    monkeypatch.setattr(agent_graph, "query_policy_chunks", fake_query)
+
+    result = agent_graph.retrieve_policies({"text": "Can I share salary bands?", "top_k": 1})
+    assert [m.id for m in result["matches"]] == ["chunk-2"]
+    assert result["classification"] == {"department": "HR", "policy_type": None}
+
+
+def test_cache_counters_are_exact_under_concurrent_updates():
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = classifier.ClassificationCache(classifier.ClassifierSettings())
+
+    def lookups(n):
+        for i in range(n):
+            cache.get(f"draft {i}")
+            cache.record_error()
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lookups, [500] * 8))
+    stats = cache.stats()
+    assert stats["misses"] == 4000 and stats["errors"] == 4000
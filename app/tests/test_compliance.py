@@ -7,7 +7,7 @@ def test_compliance_check_flow(client, monkeypatch):
     }
 
     class FakeGraph:
-        def invoke(self, state):
+        async def ainvoke(self, state):
             return {"response": fake_response}
 
     monkeypatch.setattr("app.routers_compliance.compliance_app", FakeGraph())
@@ -28,3 +28,141 @@ def test_compliance_check_flow(client, monkeypatch):
     resp2 = client.get("/compliance/logs")
     assert resp2.status_code == 200
     assert len(resp2.json()) == 1
+
+
+def test_compliance_check_batch(client, monkeypatch):
+    class FakeGraph:
+        async def ainvoke(self, state):
+            assert state["query_embedding"] == [0.0, 1.0]
+            if state["text"] == "boom":
+                raise RuntimeError("llm down")
+            return {"response": {"overall_risk": "NONE", "issues": [], "suggested_text": None}}
+
+    async def fake_embed(texts):
+        return [[0.0, 1.0] for _ in texts]
+
+    monkeypatch.setattr("app.routers_compliance.compliance_app", FakeGraph())
+    monkeypatch.setattr("app.routers_compliance.aembed_texts", fake_embed)
+
+    body = {"items": [{"text": "first"}, {"text": "boom"}, {"text": "third"}], "concurrency": 2}
+
+    resp = client.post("/compliance/check/batch", json=body)
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["result"]["overall_risk"] == "NONE"
+    assert results[1]["result"] is None
+    assert "llm down" in results[1]["error"]
+
+
+def test_check_stream_emits_events_in_order(client, monkeypatch):
+    import json as _json
+    from types import SimpleNamespace
+    from app import agent_graph
+    from app.vector_backends import VectorMatch
+
+    async def fake_query(**kwargs):
+        return [VectorMatch(id="chunk-5", score=0.9, vector_score=0.9, metadata={"document_id": 1, "chunk_id": 5, "text": "No codenames."})]
+
+    analysis = _json.dumps({
+        "overall_risk": "HIGH",
+        "issues": [{"type": "Confidentiality", "excerpt": "Falcon", "explanation": "codename"}],
+    })
+    rewrite = "Our new product ships soon."
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            # JSON mode for the analysis, plain text for the rewrite
+            answer = analysis if "response_format" in kwargs else rewrite
+
+            async def chunks():
+                for i in range(0, len(answer), 7):
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=answer[i:i + 7]))])
+            return chunks()
+
+    monkeypatch.setattr(agent_graph, "aquery_policy_chunks", fake_query)
+    monkeypatch.setattr(agent_graph.clients.async_openai.chat, "completions", FakeCompletions())
+    monkeypatch.setattr(agent_graph.classifier_settings, "CLASSIFIER_ENABLED", False)
+
+    resp = client.post("/compliance/check/stream", json={"text": "Falcon ships in May (stream test)", "top_k": 1})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line.removeprefix("event: "), _json.loads(data_line.removeprefix("data: "))))
+
+    names = [name for name, _ in events]
+    assert names[0] == "policies" and names[1] == "risk" and names[2] == "issue" and names[-1] == "done"
+    assert events[0][1]["policies"][0]["chunk_id"] == 5
+    assert "".join(data["delta"] for name, data in events if name == "suggested_text") == "Our new product ships soon."
+    assert events[-1][1]["overall_risk"] == "HIGH"
+
+
+def test_rewrite_runs_only_for_risky_verdicts(monkeypatch):
+    import asyncio
+    import json as _json
+    from types import SimpleNamespace
+    from app import agent_graph
+    from app.vector_backends import VectorMatch
+
+    async def fake_query(**kwargs):
+        return [VectorMatch(id="chunk-5", score=0.9, vector_score=0.9, metadata={"document_id": 1, "chunk_id": 5, "text": "No codenames."})]
+
+    calls = []
+
+    def fake_llm(risk):
+        class FakeCompletions:
+            async def create(self, **kwargs):
+                calls.append("analysis" if "response_format" in kwargs else "rewrite")
+                content = _json.dumps({"overall_risk": risk, "issues": []}) if calls[-1] == "analysis" else " Rewritten. "
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        return FakeCompletions()
+
+    monkeypatch.setattr(agent_graph, "aquery_policy_chunks", fake_query)
+    monkeypatch.setattr(agent_graph.classifier_settings, "CLASSIFIER_ENABLED", False)
+
+    cases = [("LOW", "if_risky", None), ("HIGH", "if_risky", "Rewritten."), ("HIGH", "never", None), ("LOW", "always", "Rewritten.")]
+    for risk, mode, expected in cases:
+        calls.clear()
+        monkeypatch.setattr(agent_graph.clients.async_openai.chat, "completions", fake_llm(risk))
+        state = {"text": "Falcon ships in May", "top_k": 1, "rewrite": mode}
+        result = asyncio.run(agent_graph.compliance_app.ainvoke(state))
+        assert result["response"]["suggested_text"] == expected, (risk, mode)
+        assert calls == (["analysis", "rewrite"] if expected else ["analysis"])
+
+
+def test_check_stream_logs_before_done(monkeypatch):
+    import asyncio
+
+    from app import routers_compliance, schemas
+
+    verdict = {"overall_risk": "LOW", "issues": [], "suggested_text": None, "policies": []}
+    logged = []
+
+    async def fake_aget(key):
+        return verdict
+
+    async def fake_akey(body):
+        return "key"
+
+    async def fake_log(records):
+        logged.extend(records)
+
+    monkeypatch.setattr(routers_compliance.verdict_cache, "akey", fake_akey)
+    monkeypatch.setattr(routers_compliance.verdict_cache, "aget", fake_aget)
+    monkeypatch.setattr(routers_compliance, "log_compliance_checks", fake_log)
+
+    async def read_until_done():
+        response = await routers_compliance.check_compliance_stream(schemas.ComplianceCheckRequest(text="Hello there"))
+        events = response.body_iterator
+        async for chunk in events:
+            if chunk.startswith("event: done"):
+                break
+        # the client goes away right after "done"
+        await events.aclose()
+
+    asyncio.run(read_until_done())
+    assert len(logged) == 1
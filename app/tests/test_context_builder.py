@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from app import context_builder
+from app.context_builder import build_context
+
+
+def _match(chunk_id, text, position=None, document_id=1):
+    return SimpleNamespace(metadata={"document_id": document_id, "chunk_id": chunk_id, "text": text, "position": position})
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    first = "Employees must not share customer data. Access is logged."
+    second = "Access is logged. Violations are reported to Legal."
+    matches = [_match(11, second, position=4), _match(10, first, position=3)]
+
+    context = build_context(matches, token_budget=1000, count=len)
+
+    assert context == (
+        "[doc_id=1, chunk_ids=10,11] Employees must not share customer data. "
+        "Access is logged. Violations are reported to Legal."
+    )
+
+
+def test_near_duplicates_dropped_and_relevance_order_kept():
+    boilerplate = "This policy applies to all employees and contractors of the company worldwide."
+    matches = [
+        _match(1, "Never discuss unreleased products with press.", position=0, document_id=1),
+        _match(2, boilerplate, position=9, document_id=1),
+        _match(3, boilerplate + " ", position=2, document_id=2),
+    ]
+
+    context = build_context(matches, token_budget=1000, count=len)
+
+    assert context.index("chunk_id=1]") < context.index("chunk_id=2]")
+    assert "chunk_id=3]" not in context
+
+
+def test_budget_truncates_last_snippet(monkeypatch):
+    monkeypatch.setattr(context_builder.context_settings, "CONTEXT_MIN_TAIL_TOKENS", 5)
+    matches = [_match(1, "a" * 40, position=0), _match(2, "b" * 400, position=5)]
+
+    context = build_context(matches, token_budget=120, count=context_builder.count_tokens)
+
+    assert context.startswith("[doc_id=1, chunk_id=1]")
+    assert "chunk_id=2]" in context
+    assert context_builder.count_tokens(context) <= 120
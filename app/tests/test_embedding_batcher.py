@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from app.embedding_batcher import EmbeddingBatcher, EmbeddingBatcherSettings
+
+
+def test_batcher_coalesces_concurrent_requests():
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(len(texts))
+        return [[float(len(t))] for t in texts]
+
+    settings = EmbeddingBatcherSettings(EMBEDDING_BATCH_WINDOW_MS=50, EMBEDDING_BATCH_MAX_ITEMS=8)
+    batcher = EmbeddingBatcher(fake_embed, settings)
+
+    results = [None] * 20
+
+    def worker(i):
+        results[i] = batcher.embed(["x" * i])[0]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [[float(i)] for i in range(20)]
+    assert sum(calls) == 20
+    assert max(calls) <= 8
+    assert len(calls) < 20
+
+
+def test_short_embedding_response_fails_every_caller():
+    batcher = EmbeddingBatcher(
+        lambda texts: [[0.0]] * (len(texts) - 1),
+        EmbeddingBatcherSettings(EMBEDDING_BATCH_WINDOW_MS=20),
+    )
+    futures = batcher.submit(["a", "b", "c"])
+
+    for future in futures:
+        with pytest.raises(ValueError, match="2 vectors for 3 inputs"):
+            future.result(timeout=5)
+    assert batcher.stats()["errors"] == 1
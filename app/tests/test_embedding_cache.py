@@ -0,0 +1,22 @@
+from app.embedding_cache import SingleFlight, pack_vector, unpack_vector
+
+
+def test_pack_vector_roundtrip_is_float32():
+    vec = [0.5, -1.25, 3.0]
+    packed = pack_vector(vec)
+    assert len(packed) == 4 * len(vec)
+    assert unpack_vector(packed) == vec
+
+
+def test_single_flight_shares_inflight_keys():
+    flight = SingleFlight()
+    owned, waiting = flight.claim(["a", "b"])
+    assert owned == ["a", "b"] and waiting == {}
+
+    owned2, waiting2 = flight.claim(["b", "c"])
+    assert owned2 == ["c"]
+    assert set(waiting2) == {"b"}
+
+    flight.resolve({"a": 1, "b": 2, "c": 3})
+    assert waiting2["b"].result() == 2
+    assert len(flight) == 0
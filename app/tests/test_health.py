@@ -1,8 +1,30 @@
+from app.vectorstore import settings as vector_settings
+
+
 def test_health_endpoint(client, monkeypatch):
-    # stub pinecone
-    monkeypatch.setattr("app.routers_health.index.describe_index_stats", lambda: {})
-    
-    response = client.get("/health")
-    assert response.status_code in (200, 503)
-    assert "db_ok" in response.json()
-    assert "pinecone_ok" in response.json()
\ No newline at end of file
+    # stub the vector store
+    monkeypatch.setattr("app.clients.clients.vector_store.describe", lambda: {})
+
+    # the router's check; /health itself is main's liveness probe
+    response = client.get("/health/")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["db_ok"] is True
+    assert body["pinecone_ok"] is True
+    assert body["vector_backend"] == vector_settings.VECTOR_BACKEND
+
+
+def test_health_reports_an_unreachable_vector_store(client, monkeypatch):
+    def unreachable():
+        raise ConnectionError("vector store down")
+
+    # the check goes through the shared, lazily built client
+    monkeypatch.setattr("app.clients.clients.vector_store.describe", unreachable)
+
+    response = client.get("/health/")
+    assert response.status_code == 503
+    detail = response.json()["detail"]
+    assert detail["status"] == "degraded"
+    assert detail["db_ok"] is True and detail["pinecone_ok"] is False
+    assert "sync" in detail["db_pool"]
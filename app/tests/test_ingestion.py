@@ -0,0 +1,66 @@
+from app.ingestion import iter_text_chunks, split_text_into_chunks
+
+
+def test_chunks_span_pages_and_keep_page_numbers():
+    pages = [(1, "A" * 1200), (2, "B" * 1200), (3, "C" * 1200)]
+    chunks = list(iter_text_chunks(pages, chunk_size=2000, overlap=200))
+
+    assert [c.position for c in chunks] == [0, 1]
+    assert [(c.page_start, c.page_end) for c in chunks] == [(1, 2), (2, 3)]
+    assert all(len(c.text) <= 2000 for c in chunks)
+
+
+def test_split_text_into_chunks_overlaps():
+    text = "".join(str(i % 10) for i in range(5000))
+    chunks = split_text_into_chunks(text, chunk_size=2000, overlap=200)
+
+    assert len(chunks) == 3
+    assert chunks[0][-200:] == chunks[1][:200]
+    assert chunks[-1] == text[3600:]
+
+
+def test_blank_text_has_no_chunks():
+    assert split_text_into_chunks("   \n ") == []
+    assert list(iter_text_chunks([(1, ""), (2, "  ")])) == []
+
+
+def test_chunk_boundaries_resync_after_edit():
+    paragraphs = [f"Section {i}. " + "Employees must not share data. " * 12 for i in range(60)]
+    original = "\n\n".join(paragraphs)
+    edited = original.replace("Section 3.", "Section 3. Newly added clause.", 1)
+
+    before = set(split_text_into_chunks(original))
+    after = split_text_into_chunks(edited)
+
+    # only the chunk(s) around the edit differ
+    assert sum(1 for c in after if c not in before) <= 2
+
+
+def test_failed_commit_removes_the_batch_vectors(monkeypatch):
+    import pytest
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import sessionmaker
+
+    from app import ingestion, models
+
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(bind=engine)
+    indexed, deleted = [], []
+    monkeypatch.setattr(ingestion, "index_policy_chunks", lambda chunks: indexed.extend(c.id for c in chunks))
+    monkeypatch.setattr(ingestion, "delete_policy_chunks", lambda ids: deleted.extend(ids))
+
+    with sessionmaker(bind=engine)() as db:
+        doc = models.PolicyDocument(title="P", file_path="x.pdf", policy_type=models.PolicyType.hr)
+        db.add(doc)
+        db.commit()
+        batch = [models.PolicyChunk(document_id=doc.id, text=t) for t in ("a", "b")]
+
+        def failing_commit():
+            raise RuntimeError("connection lost")
+
+        monkeypatch.setattr(db, "commit", failing_commit)
+        with pytest.raises(RuntimeError):
+            ingestion._store_chunk_batch(db, batch)
+
+        assert indexed and sorted(deleted) == sorted(indexed)
+        assert db.scalars(select(models.PolicyChunk)).all() == []
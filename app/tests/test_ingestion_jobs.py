@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete
+
+from app import ingestion_jobs, models
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def document_id():
+    with SessionLocal() as db:
+        doc = models.PolicyDocument(title="Leases", file_path="/nonexistent.pdf", policy_type=models.PolicyType.hr)
+        db.add(doc)
+        db.commit()
+        doc_id = doc.id
+    yield doc_id
+    with SessionLocal() as db:
+        db.execute(delete(models.IngestionJob).where(models.IngestionJob.document_id == doc_id))
+        db.execute(delete(models.PolicyDocument).where(models.PolicyDocument.id == doc_id))
+        db.commit()
+
+
+def test_only_running_jobs_with_expired_leases_are_requeued(document_id):
+    now = datetime.now()
+    stale = now - timedelta(seconds=ingestion_jobs.job_settings.INGESTION_LEASE_SECONDS + 5)
+    with SessionLocal() as db:
+        jobs = {
+            "live": models.IngestionJob(claimed_by="other-worker", heartbeat_at=now),
+            "expired": models.IngestionJob(claimed_by="dead-worker", heartbeat_at=stale),
+            "unleased": models.IngestionJob(),  # started before leases existed
+        }
+        for job in jobs.values():
+            job.document_id = document_id
+            job.status = models.IngestionStatus.running
+        db.add_all(jobs.values())
+        db.commit()
+
+        assert sorted(ingestion_jobs.requeue_expired_jobs(db)) == sorted([jobs["expired"].id, jobs["unleased"].id])
+        for job in jobs.values():
+            db.refresh(job)
+        assert jobs["live"].status == models.IngestionStatus.running
+        assert jobs["live"].claimed_by == "other-worker"
+        assert jobs["expired"].status == models.IngestionStatus.queued
+        assert jobs["expired"].claimed_by is None
+        assert jobs["unleased"].status == models.IngestionStatus.queued
+
+
+def test_sweep_submits_only_the_jobs_it_requeued(document_id, monkeypatch):
+    stale = datetime.now() - timedelta(seconds=ingestion_jobs.job_settings.INGESTION_LEASE_SECONDS + 5)
+    with SessionLocal() as db:
+        expired = models.IngestionJob(
+            document_id=document_id, status=models.IngestionStatus.running,
+            claimed_by="dead-worker", heartbeat_at=stale,
+        )
+        waiting = models.IngestionJob(document_id=document_id, status=models.IngestionStatus.queued)
+        db.add_all([expired, waiting])
+        db.commit()
+        expired_id = expired.id
+
+    submitted = []
+    sweeps = iter([False, False, True])  # two sweeps, then stop
+    monkeypatch.setattr(ingestion_jobs, "_sweeper_stop", SimpleNamespace(wait=lambda timeout: next(sweeps)))
+    monkeypatch.setattr(ingestion_jobs, "_executor", SimpleNamespace(submit=lambda fn, job_id: submitted.append(job_id)))
+
+    ingestion_jobs._sweep_expired_leases()
+
+    assert submitted == [expired_id]
+
+
+def test_run_claims_the_lease_and_releases_it_when_done(document_id, monkeypatch):
+    seen = {}
+
+    def fake_ingest(db, doc_id, full_reindex=False, on_progress=None):
+        job = db.get(models.IngestionJob, seen["job_id"])
+        seen["claimed_by"] = job.claimed_by
+        return ingestion_jobs.ingestion.IngestionResult(chunk_count=0, chunks_added=0, chunks_reused=0, chunks_removed=0)
+
+    monkeypatch.setattr(ingestion_jobs.ingestion, "ingest_policy_document", fake_ingest)
+    with SessionLocal() as db:
+        job = models.IngestionJob(document_id=document_id, status=models.IngestionStatus.queued)
+        db.add(job)
+        db.commit()
+        seen["job_id"] = job.id
+
+    ingestion_jobs.run_ingestion_job(seen["job_id"])
+
+    assert seen["claimed_by"] == ingestion_jobs.WORKER_ID
+    with SessionLocal() as db:
+        job = db.get(models.IngestionJob, seen["job_id"])
+        assert job.status == models.IngestionStatus.done
+        assert job.claimed_by is None and job.heartbeat_at is not None
+
+
+def test_job_waits_while_another_job_of_the_document_runs(document_id, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ingestion_jobs.ingestion, "ingest_policy_document", lambda *a, **kw: calls.append(a))
+    with SessionLocal() as db:
+        running = models.IngestionJob(
+            document_id=document_id, status=models.IngestionStatus.running,
+            claimed_by="other-worker", heartbeat_at=datetime.now(),
+        )
+        waiting = models.IngestionJob(document_id=document_id, status=models.IngestionStatus.queued)
+        db.add_all([running, waiting])
+        db.commit()
+        waiting_id = waiting.id
+
+    ingestion_jobs.run_ingestion_job(waiting_id)
+
+    assert calls == []
+    with SessionLocal() as db:
+        assert db.get(models.IngestionJob, waiting_id).status == models.IngestionStatus.queued
@@ -0,0 +1,33 @@
+import json
+
+from app.json_stream import JSONObjectStream
+
+
+def test_events_survive_arbitrary_chunking():
+    doc = {
+        "overall_risk": "MEDIUM",
+        "issues": [{"type": "Privacy", "excerpt": "a \"quoted\", [bracketed] }", "explanation": "x"}, {"type": "Other", "explanation": "y"}],
+        "suggested_text": "Line one\nLine é \U0001F600 \\ two",
+        "score": 3,
+    }
+    raw = json.dumps(doc, indent=2)
+
+    for size in (1, 2, 5, 13):
+        parser = JSONObjectStream()
+        events = []
+        for i in range(0, len(raw), size):
+            events += parser.feed(raw[i:i + size])
+
+        assert {key: value for kind, key, value in events if kind == "field"} == doc
+        assert [value for kind, key, value in events if kind == "item"] == doc["issues"]
+        deltas = [value for kind, key, value in events if kind == "delta" and key == "suggested_text"]
+        assert "".join(deltas) == doc["suggested_text"]
+        if size == 1:
+            assert len(deltas) > 1
+
+
+def test_risk_is_reported_before_the_rest_arrives():
+    parser = JSONObjectStream()
+    assert parser.feed('{"overall_risk": "HI') == [("delta", "overall_risk", "HI")]
+    events = parser.feed('GH", "issues": [')
+    assert ("field", "overall_risk", "HIGH") in events
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import lexical_index, models, vectorstore
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(lexical_index, "corpus_stats", lexical_index._CorpusStats())
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def _add_document(db, department, texts):
+    doc = models.PolicyDocument(title="Policy", file_path="x.pdf", policy_type=models.PolicyType.confidentiality, department=department)
+    doc.chunks = [models.PolicyChunk(text=t) for t in texts]
+    db.add(doc)
+    db.flush()
+    lexical_index.index_chunks(db, doc.chunks)
+    db.commit()
+    return doc
+
+
+def test_tokenize_drops_stopwords_and_splits_codes():
+    assert lexical_index.tokenize("The NDA-2024 is for Project Falcon.") == ["nda", "2024", "project", "falcon"]
+
+
+def test_bm25_ranks_exact_terms_and_applies_filters(db):
+    sales = _add_document(db, "Sales", [
+        "Never share Project Falcon roadmaps outside the company.",
+        "Expense reports are due monthly.",
+        "Customer lists are confidential.",
+    ])
+    hr = _add_document(db, "HR", ["Project Falcon hiring plans are confidential."])
+
+    hits = lexical_index.search(db, "can I mention falcon externally?", limit=5)
+    assert {h.chunk_id for h in hits[:2]} == {sales.chunks[0].id, hr.chunks[0].id}
+    assert sales.chunks[1].id not in {h.chunk_id for h in hits}
+
+    hits = lexical_index.search(db, "falcon", limit=5, filters={"department": "HR", "policy_type": "confidentiality"})
+    assert [h.chunk_id for h in hits] == [hr.chunks[0].id]
+
+    lexical_index.remove_chunks(db, [hr.chunks[0].id])
+    db.commit()
+    hits = lexical_index.search(db, "falcon", limit=5)
+    assert [h.chunk_id for h in hits] == [sales.chunks[0].id]
+
+
+def test_fuse_interleaves_rankings_and_loads_lexical_only_hits(monkeypatch):
+    chunk = SimpleNamespace(id=7, document_id=2, document=None, text="NDA terms", position=0, page_start=1, page_end=1)
+    monkeypatch.setattr(lexical_index, "load_chunks", lambda ids: {7: chunk} if 7 in ids else {})
+
+    vector_matches = [
+        SimpleNamespace(id="chunk-1", score=0.9, metadata={"chunk_id": 1, "text": "a"}),
+        SimpleNamespace(id="chunk-2", score=0.8, metadata={"chunk_id": 2, "text": "b"}),
+    ]
+    lexical_hits = [lexical_index.LexicalHit(chunk_id=7, score=12.0), lexical_index.LexicalHit(chunk_id=2, score=3.0)]
+
+    fused = vectorstore._fuse(vector_matches, lexical_hits, top_k=3)
+
+    # chunk 2 is ranked by both, chunk 7 only by BM25 but first there
+    assert fused[0].id == "chunk-2"
+    assert {m.id for m in fused} == {"chunk-1", "chunk-2", "chunk-7"}
+    assert next(m for m in fused if m.id == "chunk-7").metadata["text"] == "NDA terms"
+
+
+def test_search_scores_only_the_rarest_query_terms(db, monkeypatch):
+    doc = _add_document(db, "Sales", [
+        "Falcon roadmap review.",
+        "Roadmap planning for the quarter.",
+        "Roadmap owners and budget.",
+        "Budget approvals.",
+        "Quarterly review.",
+        "Hiring plans.",
+    ])
+    monkeypatch.setattr(lexical_index.lexical_settings, "LEXICAL_MAX_QUERY_TERMS", 1)
+
+    # "roadmap" is in half the chunks, "falcon" in one: only "falcon" is scored
+    hits = lexical_index.search(db, "roadmap falcon", limit=5)
+    assert [h.chunk_id for h in hits] == [doc.chunks[0].id]
+    assert hits[0].score > 0
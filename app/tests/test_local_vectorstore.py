@@ -0,0 +1,111 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.local_vectorstore import LocalVectorStore
+
+
+def _vec(id, values, **metadata):
+    return {"id": id, "values": values, "metadata": metadata}
+
+
+def test_query_ranks_by_cosine_and_filters(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.upsert([
+        _vec("chunk-1", [1.0, 0.0, 0.0], department="Sales", policy_type="CODE_OF_CONDUCT"),
+        _vec("chunk-2", [0.9, 0.1, 0.0], department="HR", policy_type="CODE_OF_CONDUCT"),
+        _vec("chunk-3", [0.0, 1.0, 0.0], department="Sales", policy_type="DATA_PRIVACY"),
+    ])
+
+    matches = store.query([1.0, 0.0, 0.0], top_k=2)
+    assert [m.id for m in matches] == ["chunk-1", "chunk-2"]
+    assert matches[0].score == pytest.approx(1.0)
+
+    matches = store.query([1.0, 0.0, 0.0], top_k=5, filter={"department": "Sales"})
+    assert [m.id for m in matches] == ["chunk-1", "chunk-3"]
+
+    matches = store.query([1.0, 0.0, 0.0], top_k=5, filter={"department": "Sales", "policy_type": {"$eq": "DATA_PRIVACY"}})
+    assert [m.id for m in matches] == ["chunk-3"]
+    assert matches[0].metadata["department"] == "Sales"
+
+
+def test_upsert_overwrites_and_delete_frees_rows(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.upsert([_vec("chunk-1", [1.0, 0.0]), _vec("chunk-2", [0.0, 1.0])])
+    store.upsert([_vec("chunk-1", [0.0, 1.0], department="HR")])
+    store.delete(["chunk-2"])
+
+    matches = store.query([0.0, 1.0], top_k=5)
+    assert [m.id for m in matches] == ["chunk-1"]
+    assert matches[0].metadata == {"department": "HR"}
+    assert store.describe()["total_vector_count"] == 1
+
+
+def test_reopen_and_compact_preserve_state(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.upsert([_vec(f"chunk-{i}", [float(i), 1.0]) for i in range(1, 6)])
+    store.delete(["chunk-2", "chunk-4"])
+
+    # a second handle (e.g. another worker process) sees the same index
+    other = LocalVectorStore(tmp_path)
+    assert sorted(m.id for m in other.query([1.0, 1.0], top_k=10)) == ["chunk-1", "chunk-3", "chunk-5"]
+
+    store.compact()
+    other.upsert([_vec("chunk-6", [6.0, 1.0])])
+    reopened = LocalVectorStore(tmp_path)
+    assert sorted(m.id for m in reopened.query([1.0, 1.0], top_k=10)) == ["chunk-1", "chunk-3", "chunk-5", "chunk-6"]
+
+
+def test_ivf_index_is_used_past_threshold_and_survives_reopen(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(8, 16))
+    data = centers[rng.integers(0, 8, 400)] + 0.05 * rng.normal(size=(400, 16))
+
+    store = LocalVectorStore(tmp_path, ann_min_vectors=200, nlist=8, nprobe=2)
+    store.upsert([_vec(f"chunk-{i}", data[i].tolist()) for i in range(300)])
+    store.wait_for_training()
+    assert store.describe()["ann_lists"] == 8
+
+    # inserts after training are assigned to lists incrementally
+    store.upsert([_vec(f"chunk-{i}", data[i].tolist()) for i in range(300, 400)])
+    store.delete(["chunk-350"])
+
+    reopened = LocalVectorStore(tmp_path, ann_min_vectors=200, nlist=8, nprobe=2)
+    for i in (10, 320, 399):
+        exact = [m.id for m in reopened.query(data[i].tolist(), top_k=5, exact=True)]
+        approx = [m.id for m in reopened.query(data[i].tolist(), top_k=5)]
+        assert approx[0] == f"chunk-{i}"
+        assert len(set(exact) & set(approx)) >= 4
+    assert "chunk-350" not in {m.id for m in reopened.query(data[350].tolist(), top_k=5)}
+
+
+def test_training_runs_off_the_lock_and_assigns_rows_written_meanwhile(tmp_path, monkeypatch):
+    import threading
+
+    from app import local_vectorstore
+
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(260, 8))
+    started, release = threading.Event(), threading.Event()
+    train_kmeans = local_vectorstore.train_kmeans
+
+    def slow_train_kmeans(sample, nlist):
+        started.set()
+        release.wait(5)
+        return train_kmeans(sample, nlist)
+
+    monkeypatch.setattr(local_vectorstore, "train_kmeans", slow_train_kmeans)
+    store = LocalVectorStore(tmp_path, ann_min_vectors=200, nlist=4, nprobe=4)
+    store.upsert([_vec(f"chunk-{i}", data[i].tolist()) for i in range(200)])
+    assert started.wait(5)
+
+    # training is in progress: queries and upserts go through
+    assert store.query(data[5].tolist(), top_k=1)[0].id == "chunk-5"
+    store.upsert([_vec(f"chunk-{i}", data[i].tolist()) for i in range(200, 260)])
+    assert store.describe()["ann_lists"] is None
+
+    release.set()
+    store.wait_for_training()
+    assert store.describe()["ann_lists"] == 4
+    for i in (5, 230, 259):
+        assert store.query(data[i].tolist(), top_k=1)[0].id == f"chunk-{i}"
@@ -1,7 +1,7 @@
 def test_logs_filtering(client, monkeypatch):
     # stub graph again
     class FakeGraph:
-        def invoke(self, state):
+        async def ainvoke(self, state):
             return {"response": {
                 "overall_risk": "HIGH",
                 "issues": [],
@@ -19,3 +19,59 @@ def test_logs_filtering(client, monkeypatch):
     logs = resp.json()
     assert len(logs) >= 1
     assert logs[0]["department"] == "HR"
+
+
+def test_logs_keyset_pagination(client, monkeypatch):
+    class FakeGraph:
+        async def ainvoke(self, state):
+            return {"response": {"overall_risk": "LOW", "issues": [], "suggested_text": None}}
+
+    monkeypatch.setattr("app.routers_compliance.compliance_app", FakeGraph())
+
+    for i in range(5):
+        client.post("/compliance/check", json={"text": f"page me {i}", "department": "Paging"})
+
+    seen, cursor = [], None
+    while True:
+        params = {"department": "Paging", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/compliance/logs", params=params)
+        assert resp.status_code == 200
+        seen += [log["text"] for log in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [f"page me {i}" for i in reversed(range(5))]
+    assert client.get("/compliance/logs", params={"cursor": "not-a-cursor"}).status_code == 400
+    later = client.get("/compliance/logs", params={"department": "Paging", "created_after": "2999-01-01T00:00:00"})
+    assert later.json() == []
+
+
+def test_logs_export_streams_selected_columns(client, monkeypatch):
+    import csv
+    import gzip
+    import io
+    import json
+
+    class FakeGraph:
+        async def ainvoke(self, state):
+            return {"response": {"overall_risk": "MEDIUM", "issues": [{"type": "T", "excerpt": "e", "explanation": "x"}], "suggested_text": None}}
+
+    monkeypatch.setattr("app.routers_compliance.compliance_app", FakeGraph())
+    for i in range(3):
+        client.post("/compliance/check", json={"text": f"export me {i}", "department": "Export"})
+
+    resp = client.get("/compliance/logs/export", params={"department": "Export", "columns": "id,text,issues"})
+    assert resp.status_code == 200
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["text"] for r in rows] == ["export me 0", "export me 1", "export me 2"]
+    assert set(rows[0]) == {"id", "text", "issues"} and rows[0]["issues"][0]["type"] == "T"
+
+    resp = client.get("/compliance/logs/export", params={"department": "Export", "format": "csv", "columns": "text,overall_risk", "gzip": "true"})
+    assert resp.headers["content-disposition"].endswith('.csv.gz"')
+    table = list(csv.reader(io.StringIO(gzip.decompress(resp.content).decode())))
+    assert table[0] == ["text", "overall_risk"] and table[1] == ["export me 0", "MEDIUM"] and len(table) == 4
+
+    assert client.get("/compliance/logs/export", params={"columns": "text,password"}).status_code == 400
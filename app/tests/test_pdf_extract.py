@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+
+import fitz
+import pytest
+
+from app import pdf_extract
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "policy.pdf"
+    doc = fitz.open()
+    for i in range(11):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}: section {i + 1} of the policy.")
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def small_ranges(monkeypatch):
+    monkeypatch.setattr(pdf_extract.pdf_settings, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_extract.pdf_settings, "PDF_PAGES_PER_TASK", 2)
+
+
+def test_parallel_extraction_matches_serial(pdf_path, small_ranges, monkeypatch):
+    monkeypatch.setattr(pdf_extract.pdf_settings, "PDF_EXTRACT_WORKERS", 2)
+    try:
+        pages = list(pdf_extract.iter_pdf_pages(pdf_path, workers=2))
+    finally:
+        pdf_extract.shutdown_extraction_pool()
+
+    assert [n for n, _ in pages] == list(range(1, 12))
+    assert pages == list(pdf_extract.iter_pdf_pages_serial(pdf_path))
+    assert "Page 11" in pages[-1][1]
+
+
+class InlinePool:
+    """Runs tasks on submit; records how many submitted ranges the consumer has not finished."""
+
+    def __init__(self, consumed):
+        self.consumed = consumed
+        self.range_ends = []
+        self.max_in_flight = 0
+
+    def submit(self, fn, file_path, start, stop):
+        self.range_ends.append(stop)
+        in_flight = sum(1 for end in self.range_ends if end > len(self.consumed))
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        future = Future()
+        future.set_result(fn(file_path, start, stop))
+        return future
+
+
+def test_parallel_extraction_keeps_a_bounded_window(pdf_path, small_ranges, monkeypatch):
+    pages = []
+    pool = InlinePool(pages)
+    monkeypatch.setattr(pdf_extract, "_get_pool", lambda: pool)
+
+    for page in pdf_extract.iter_pdf_pages(pdf_path, workers=2):
+        pages.append(page)
+
+    assert [n for n, _ in pages] == list(range(1, 12))
+    assert len(pool.range_ends) == 6  # 11 pages in ranges of 2
+    # workers * 2 ranges queued, plus the one being yielded
+    assert pool.max_in_flight <= 2 * 2 + 1
@@ -1,5 +1,5 @@
 def test_upload_and_list_policies(client, monkeypatch):
-    monkeypatch.setattr("app.ingestion.extract_text_from_pdf", lambda x: "test pdf")
+    monkeypatch.setattr("app.ingestion.iter_pdf_pages", lambda x: iter([(1, "test pdf")]))
     monkeypatch.setattr("app.ingestion.index_policy_chunks", lambda x: None)
 
     file = ("policy.pdf", b"hello world", "application/pdf")
@@ -10,11 +10,65 @@ def test_upload_and_list_policies(client, monkeypatch):
         data={"title": "Test Policy", "policy_type": "security"}
     )
 
-    assert resp.status_code == 200
+    assert resp.status_code == 202
     data = resp.json()
     assert data["title"] == "Test Policy"
+    assert data["job"]["status"] in ("queued", "running", "done")
+
+    # job status
+    resp_job = client.get(f"/policies/jobs/{data['job']['id']}")
+    assert resp_job.status_code == 200
+    assert resp_job.json()["document_id"] == data["id"]
 
     # list
     resp2 = client.get("/policies")
     assert resp2.status_code == 200
     assert len(resp2.json()) == 1
+
+
+def test_delete_policy_removes_chunks_and_vectors(client, monkeypatch):
+    from app import models
+    from app.database import SessionLocal
+
+    deleted_vectors = []
+    monkeypatch.setattr("app.ingestion.delete_policy_chunks", lambda ids: deleted_vectors.extend(ids))
+
+    with SessionLocal() as db:
+        doc = models.PolicyDocument(title="Old", file_path="/nonexistent.pdf", policy_type=models.PolicyType.hr)
+        doc.chunks = [models.PolicyChunk(text="a"), models.PolicyChunk(text="b")]
+        db.add(doc)
+        db.commit()
+        doc_id = doc.id
+        chunk_ids = [c.id for c in doc.chunks]
+
+    assert client.delete(f"/policies/{doc_id}").status_code == 204
+    assert sorted(deleted_vectors) == sorted(chunk_ids)
+    assert client.delete(f"/policies/{doc_id}").status_code == 404
+
+
+def test_upload_is_rejected_while_the_document_is_being_ingested(client):
+    from sqlalchemy import delete
+
+    from app import models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        doc = models.PolicyDocument(title="Busy Policy", file_path="/nonexistent.pdf", policy_type=models.PolicyType.hr)
+        db.add(doc)
+        db.flush()
+        db.add(models.IngestionJob(document_id=doc.id, status=models.IngestionStatus.running))
+        db.commit()
+        doc_id = doc.id
+
+    try:
+        resp = client.post(
+            "/policies/upload",
+            files={"file": ("policy.pdf", b"v2", "application/pdf")},
+            data={"title": "Busy Policy", "policy_type": "hr"},
+        )
+        assert resp.status_code == 409
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(models.IngestionJob).where(models.IngestionJob.document_id == doc_id))
+            db.execute(delete(models.PolicyDocument).where(models.PolicyDocument.id == doc_id))
+            db.commit()
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from app import agent_graph, prescreen
+from app.vector_backends import VectorMatch
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    rules = prescreen.PrescreenRules(prescreen.extract_corpus_terms(
+        ["Details of Project FALCON and contract ACME-1234 are covered by the NDA."], limit=10,
+    ))
+    monkeypatch.setattr(prescreen.rule_cache, "get", lambda: rules)
+    monkeypatch.setattr(prescreen, "prescreen_stats", prescreen.PrescreenStats())
+    return rules
+
+
+def _match(similarity):
+    return VectorMatch(id="chunk-1", score=similarity, metadata={"chunk_id": 1, "text": "policy"}, vector_score=similarity)
+
+
+def test_corpus_terms_and_base_patterns(rules):
+    assert set(rules.corpus_terms) == {"FALCON", "ACME-1234", "NDA"}
+    assert rules.matches("Lunch at noon?") == []
+    assert "term:FALCON" in rules.matches("FALCON ships in May")
+    assert "email" in rules.matches("mail jane.doe@example.com")
+    assert "credential" in rules.matches("the password is hunter2")
+
+
+def test_screen_skips_only_clear_text(rules):
+    assert prescreen.screen("Team lunch is at noon.", [_match(0.12)]).skip
+    assert prescreen.screen("Team lunch is at noon.", []).skip
+
+    near = prescreen.screen("Team lunch is at noon.", [_match(0.55)])
+    assert not near.skip and near.reason == "similar_policy"
+
+    flagged = prescreen.screen("Revenue guidance for Q3", [_match(0.1)])
+    assert not flagged.skip and "financial_disclosure" in flagged.rule_hits
+
+    assert prescreen.prescreen_stats.stats()["skip_rate"] == 0.5
+
+
+def test_graph_short_circuits_without_llm(rules, monkeypatch):
+    async def fake_query(**kwargs):
+        return [_match(0.05)]
+
+    class NoLLM:
+        async def create(self, **kwargs):
+            raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(agent_graph, "aquery_policy_chunks", fake_query)
+    monkeypatch.setattr(agent_graph.clients.async_openai.chat, "completions", NoLLM())
+
+    result = asyncio.run(agent_graph.compliance_app.ainvoke({"text": "See you at the offsite!", "top_k": 3}))
+
+    assert result["response"] == {"overall_risk": "NONE", "issues": [], "suggested_text": None}
+    assert result["prescreen"]["reason"] == "no_nearby_policy"
+
+    state = {"text": "See you at the offsite!", "top_k": 3, "rewrite": "always"}
+    result = asyncio.run(agent_graph.compliance_app.ainvoke(state))
+    assert result["response"]["suggested_text"] == "See you at the offsite!"
+
+
+def test_rule_cache_refreshes_on_first_use(monkeypatch):
+    # a host booted less than PRESCREEN_RULES_REFRESH_SECONDS ago
+    monkeypatch.setattr("app.prescreen.time.monotonic", lambda: 1.0)
+    cache = prescreen.RuleCache()
+    refreshed = []
+    monkeypatch.setattr(cache, "_refresh_in_background", lambda: refreshed.append(True))
+
+    cache.get()
+    cache.get()  # already refreshing: no second thread
+    deadline = time.monotonic_ns() + 1_000_000_000
+    while not refreshed and time.monotonic_ns() < deadline:
+        time.sleep(0.01)
+    assert refreshed == [True]
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+from app import vectorstore
+
+
+class FlakyStore:
+    def __init__(self):
+        self.upserted = []
+        self.failures = 1
+
+    def upsert(self, vectors, namespace=None):
+        if self.failures:
+            self.failures -= 1
+            raise TimeoutError("transient")
+        self.upserted.extend(v["id"] for v in vectors)
+
+
+def test_index_policy_chunks_batches_and_retries(monkeypatch):
+    fake_store = FlakyStore()
+    monkeypatch.setattr(vectorstore.clients, "vector_store", fake_store)
+    monkeypatch.setattr(vectorstore, "embed_texts", lambda texts: [[0.1, 0.2] for _ in texts])
+    monkeypatch.setattr(vectorstore.time, "sleep", lambda s: None)
+    monkeypatch.setattr(vectorstore.settings, "PINECONE_UPSERT_BATCH_SIZE", 10)
+
+    doc = SimpleNamespace(policy_type=None, department="Sales")
+    chunks = [
+        SimpleNamespace(id=i, document_id=1, document=doc, text=f"chunk {i}", position=i, page_start=1, page_end=1)
+        for i in range(35)
+    ]
+    progress = []
+
+    vectorstore.index_policy_chunks(chunks, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert sorted(fake_store.upserted) == sorted(f"chunk-{i}" for i in range(35))
+    assert progress[-1] == (35, 35)
+    assert len(progress) == 4  # 10 + 10 + 10 + 5
+
+
+def test_partitioned_queries_route_by_department_and_policy_type(monkeypatch, tmp_path):
+    import asyncio
+    import pytest
+
+    pytest.importorskip("numpy")
+    from app.local_vectorstore import PartitionedLocalVectorStore
+    from app.models import PolicyType
+
+    store = PartitionedLocalVectorStore(tmp_path)
+    monkeypatch.setattr(vectorstore.clients, "vector_store", store)
+    monkeypatch.setattr(vectorstore.settings, "VECTOR_PARTITIONING", True)
+    monkeypatch.setattr(vectorstore, "embed_texts", lambda texts: [[1.0, float(len(t))] for t in texts])
+
+    docs = {
+        1: SimpleNamespace(policy_type=PolicyType.security, department="Sales Ops"),
+        2: SimpleNamespace(policy_type=PolicyType.security, department="HR"),
+        3: SimpleNamespace(policy_type=PolicyType.hr, department=None),
+    }
+    chunks = [
+        SimpleNamespace(id=i, document_id=d, document=docs[d], text="x" * i, position=0, page_start=1, page_end=1)
+        for i, d in [(1, 1), (2, 1), (3, 2), (4, 3)]
+    ]
+    vectorstore.index_policy_chunks(chunks)
+
+    assert store.namespaces() == ["hr.", "security.HR", "security.Sales%20Ops"]
+
+    q = [1.0, 0.0]
+    ids = lambda matches: sorted(m.metadata["chunk_id"] for m in matches)
+    assert ids(vectorstore.query_policy_chunks("q", filters={"department": "Sales Ops", "policy_type": "security"}, query_embedding=q)) == [1, 2]
+    assert ids(vectorstore.query_policy_chunks("q", filters={"policy_type": "security"}, query_embedding=q)) == [1, 2, 3]
+    assert ids(vectorstore.query_policy_chunks("q", top_k=3, query_embedding=q)) == [1, 2, 3]
+    assert ids(asyncio.run(vectorstore.aquery_policy_chunks("q", filters={"policy_type": "hr"}, query_embedding=q))) == [4]
+
+    # document moved to another department: old partition copies are dropped
+    vectorstore.delete_policy_chunks([3], except_partition=vectorstore.partition_for("security", "Legal"))
+    assert vectorstore.query_policy_chunks("q", filters={"department": "HR"}, query_embedding=q) == []
+
+
+def test_filtered_queries_still_search_unpartitioned_vectors(monkeypatch, tmp_path):
+    import pytest
+
+    pytest.importorskip("numpy")
+    from app.local_vectorstore import PartitionedLocalVectorStore
+
+    store = PartitionedLocalVectorStore(tmp_path)
+    monkeypatch.setattr(vectorstore.clients, "vector_store", store)
+    monkeypatch.setattr(vectorstore.settings, "VECTOR_PARTITIONING", True)
+
+    # indexed before partitioning: default namespace, filterable metadata only
+    store.upsert([
+        {"id": "chunk-1", "values": [1.0, 0.0], "metadata": {"chunk_id": 1, "department": "HR", "text": "a"}},
+        {"id": "chunk-2", "values": [1.0, 0.1], "metadata": {"chunk_id": 2, "department": "Sales", "text": "b"}},
+    ])
+    store.upsert(
+        [{"id": "chunk-3", "values": [1.0, 0.2], "metadata": {"chunk_id": 3, "department": "HR", "text": "c"}}],
+        vectorstore.partition_for(None, "HR"),
+    )
+
+    q = [1.0, 0.0]
+    ids = lambda matches: sorted(m.metadata["chunk_id"] for m in matches)
+    assert ids(vectorstore.query_policy_chunks("q", filters={"department": "HR"}, query_embedding=q)) == [1, 3]
+
+    vectorstore.drop_legacy_vectors([1, 2])
+    assert ids(vectorstore.query_policy_chunks("q", filters={"department": "HR"}, query_embedding=q)) == [3]
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+def test_only_network_errors_and_retryable_statuses_are_transient():
+    assert vectorstore._is_transient(TimeoutError())
+    assert vectorstore._is_transient(ConnectionResetError())
+    assert vectorstore._is_transient(ApiError(503))
+    assert vectorstore._is_transient(ApiError(429))
+    assert not vectorstore._is_transient(ApiError(400))
+    assert not vectorstore._is_transient(KeyError("metadata"))
+    assert not vectorstore._is_transient(TypeError("bad call"))
+    assert not vectorstore._is_transient(ValueError("dimension mismatch"))
+
+
+def test_pinecone_async_index_resolves_host_off_the_event_loop():
+    import asyncio
+    import threading
+
+    from app.vector_backends import PineconeVectorStore
+
+    calls = []
+
+    class FakeAsyncIndex:
+        async def query(self, **kwargs):
+            return SimpleNamespace(matches=["m"])
+
+    class FakePinecone:
+        def describe_index(self, name):
+            calls.append(threading.current_thread())
+            return SimpleNamespace(host="idx.example")
+
+        def IndexAsyncio(self, host):
+            assert host == "idx.example"
+            return FakeAsyncIndex()
+
+    store = PineconeVectorStore("key", "policies")
+    store._pc = FakePinecone()
+
+    async def run():
+        loop_thread = threading.current_thread()
+        results = await asyncio.gather(*(store.aquery([0.1], 1) for _ in range(3)))
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(run())
+    assert results == [["m"]] * 3
+    assert len(calls) == 1 and calls[0] is not loop_thread
+
+
+def test_pinecone_namespaces_are_listed_on_first_use(monkeypatch):
+    from app.vector_backends import PineconeVectorStore
+
+    # a host booted less than NAMESPACES_TTL_SECONDS ago
+    monkeypatch.setattr("app.vector_backends.time.monotonic", lambda: 1.0)
+    store = PineconeVectorStore("key", "policies")
+    store._index = SimpleNamespace(
+        describe_index_stats=lambda: SimpleNamespace(namespaces={"hr.": {}, "security.HR": {}})
+    )
+    assert store.namespaces() == ["hr.", "security.HR"]
@@ -0,0 +1,59 @@
+from app.lru_cache import LRUCache
+from app.models import PolicyType
+from app.verdict_cache import cache_key
+
+
+def test_cache_key_normalizes_whitespace_and_tracks_corpus_version():
+    a = cache_key("Hello   world\n", "Sales", PolicyType.security, 5, 1)
+    b = cache_key(" Hello world", "Sales", PolicyType.security, 5, 1)
+    assert a == b
+
+    assert a != cache_key("Hello world", "Sales", PolicyType.security, 5, 2)
+    assert a != cache_key("Hello world", "HR", PolicyType.security, 5, 1)
+    assert a != cache_key("Hello world", "Sales", PolicyType.security, 5, 1, "never")
+
+
+def test_lru_cache_evicts_oldest():
+    cache = LRUCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # touch a so b is the oldest
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_bump_corpus_version_upserts_the_state_row(monkeypatch):
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import sessionmaker
+
+    from app import models, verdict_cache
+
+    engine = create_engine("sqlite:///:memory:")
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(verdict_cache, "verdict_cache", verdict_cache.VerdictCache(verdict_cache.cache_settings))
+
+    with sessionmaker(bind=engine)() as db:
+        assert verdict_cache.read_corpus_version(db) == 0
+        assert verdict_cache.bump_corpus_version(db) == 1
+        assert verdict_cache.bump_corpus_version(db) == 2
+        assert db.scalar(select(func.count()).select_from(models.PolicyCorpusState)) == 1
+
+
+def test_counters_are_exact_under_concurrent_updates():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.verdict_cache import CacheSettings, VerdictCache
+
+    cache = VerdictCache(CacheSettings(COMPLIANCE_CACHE_SHARED=False))
+
+    def lookups(n):
+        for i in range(n):
+            asyncio.run(cache.aget(f"missing-{i}"))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lookups, [200] * 8))
+    assert cache.stats()["misses"] == 1600
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any
+
+from pinecone import Pinecone
+
+
+@dataclass
+class VectorMatch:
+    """A query hit; mirrors the id/score/metadata shape of Pinecone matches.
+
+    After hybrid fusion, score is the fused rank score; vector_score keeps
+    the cosine similarity (None when only lexical search found the chunk).
+    """
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    vector_score: Optional[float] = None
+    lexical_score: Optional[float] = None
+
+
+def vector_similarity(match: Any) -> Optional[float]:
+    """Cosine similarity of a match from any backend, fused or not."""
+    if isinstance(match, VectorMatch):
+        return match.vector_score
+    return getattr(match, "score", None)
+
+
+class VectorStore:
+    """
+    Interface behind index_policy_chunks / query_policy_chunks.
+
+    Vectors are dicts of {"id", "values", "metadata"} (Pinecone's upsert
+    format); filters use Pinecone's metadata filter syntax for equality
+    ({"department": "Sales"} or {"department": {"$eq": "Sales"}}) and
+    {"$in": [...]}.
+
+    Every call takes an optional namespace: a partition of the index that
+    is searched on its own ("" / None is the default namespace).
+    """
+
+    name = "base"
+
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def query(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[Any]:
+        raise NotImplementedError
+
+    async def aquery(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[Any]:
+        return await asyncio.to_thread(self.query, vector, top_k, filter, namespace)
+
+    def namespaces(self) -> List[str]:
+        """Namespaces that currently hold vectors."""
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Pinecone-backed store. Index handles are created on first use so that
+    importing the app never reaches out to Pinecone.
+    """
+
+    name = "pinecone"
+
+    # namespaces are listed via describe_index_stats; cache it between queries
+    NAMESPACES_TTL_SECONDS = 30.0
+
+    def __init__(self, api_key: str, index_name: str, pool_threads: int = 1):
+        self.index_name = index_name
+        self.pool_threads = pool_threads
+        self._pc = Pinecone(api_key=api_key)
+        self._index = None
+        # asyncio index handle owns an aiohttp session that must be opened
+        # inside the running event loop, so it is created separately
+        self._async_index = None
+        self._async_index_lock: Optional[asyncio.Lock] = None
+        self._host: Optional[str] = None
+        self._lock = threading.Lock()
+        self._namespaces: set[str] = set()
+        self._namespaces_checked: Optional[float] = None  # monotonic time of the last listing
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._pc.Index(self.index_name, pool_threads=self.pool_threads)
+        return self._index
+
+    def host(self) -> str:
+        """Data-plane host of the index (a blocking control-plane call the first time)."""
+        if self._host is None:
+            self._host = self._pc.describe_index(self.index_name).host
+        return self._host
+
+    async def async_index(self):
+        if self._async_index is None:
+            if self._async_index_lock is None:
+                self._async_index_lock = asyncio.Lock()
+            async with self._async_index_lock:
+                if self._async_index is None:
+                    # describe_index is synchronous: keep it off the event loop
+                    host = self._host or await asyncio.to_thread(self.host)
+                    self._async_index = self._pc.IndexAsyncio(host=host)
+        return self._async_index
+
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None) -> None:
+        self.index.upsert(vectors=vectors, namespace=namespace or "")
+        self._namespaces.add(namespace or "")
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None) -> None:
+        self.index.delete(ids=ids, namespace=namespace or "")
+
+    def query(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[Any]:
+        resp = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            filter=filter or {},
+            namespace=namespace or "",
+        )
+        return resp.matches
+
+    async def aquery(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[Any]:
+        index = await self.async_index()
+        resp = await index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            filter=filter or {},
+            namespace=namespace or "",
+        )
+        return resp.matches
+
+    def namespaces(self) -> List[str]:
+        if (
+            self._namespaces_checked is None
+            or time.monotonic() - self._namespaces_checked > self.NAMESPACES_TTL_SECONDS
+        ):
+            stats = self.index.describe_index_stats()
+            self._namespaces = set((getattr(stats, "namespaces", None) or {}).keys())
+            self._namespaces_checked = time.monotonic()
+        return sorted(self._namespaces)
+
+    def describe(self) -> dict:
+        stats = self.index.describe_index_stats()
+        return {
+            "backend": self.name,
+            "total_vector_count": getattr(stats, "total_vector_count", None),
+            "dimension": getattr(stats, "dimension", None),
+            "namespaces": len(getattr(stats, "namespaces", None) or {}),
+        }
+
+
+def filter_condition(cond: Any) -> tuple[str, Any]:
+    """Normalize one metadata filter condition to ("$eq", value) or ("$in", values)."""
+    if isinstance(cond, dict):
+        if "$eq" in cond:
+            return "$eq", cond["$eq"]
+        if "$in" in cond:
+            return "$in", list(cond["$in"])
+        raise ValueError(f"Unsupported filter operator: {sorted(cond)}")
+    return "$eq", cond
+
+
+def metadata_matches(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    for key, cond in (filter or {}).items():
+        op, value = filter_condition(cond)
+        actual = metadata.get(key)
+        if op == "$eq" and actual != value:
+            return False
+        if op == "$in" and actual not in value:
+            return False
+    return True
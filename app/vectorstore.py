@@ -1,15 +1,67 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, List, Dict, Any
+from urllib.parse import quote, unquote
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pinecone import Pinecone
-from openai import OpenAI
 
-from app import models
+from app import lexical_index, models
+from app.clients import clients
+from app.embedding_cache import embedding_cache, inflight_embeddings, text_hash
+from app.embedding_batcher import EmbeddingBatcher, embedding_batcher_settings, estimate_tokens
+from app.lexical_index import lexical_settings
+from app.vector_backends import PineconeVectorStore, VectorMatch, VectorStore, filter_condition, vector_similarity
+
+try:
+    import urllib3  # transport of the Pinecone client
+except ImportError:
+    urllib3 = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# connection / timeout failures of the vector store clients (TimeoutError
+# and ConnectionError cover socket-level errors and the local backend)
+_NETWORK_ERRORS: tuple = (TimeoutError, ConnectionError)
+if urllib3 is not None:
+    _NETWORK_ERRORS += (
+        urllib3.exceptions.TimeoutError,
+        urllib3.exceptions.ProtocolError,
+        urllib3.exceptions.MaxRetryError,
+        urllib3.exceptions.NewConnectionError,
+    )
 
 class VectorSettings(BaseSettings):
-    OPENAI_API_KEY: str
-    PINECONE_API_KEY: str
-    PINECONE_INDEX_NAME: str
+    # "pinecone" or "local" (NumPy index on disk, no external service)
+    VECTOR_BACKEND: str = "pinecone"
+    PINECONE_API_KEY: Optional[str] = None
+    PINECONE_INDEX_NAME: Optional[str] = None
+    LOCAL_VECTOR_DIR: Path = BASE_DIR / "storage" / "vectors"
+    # local backend switches from exact search to an IVF index at this size
+    LOCAL_ANN_MIN_VECTORS: int = 20000
+    LOCAL_ANN_LISTS: Optional[int] = None  # default: 4 * sqrt(vector count)
+    LOCAL_ANN_NPROBE: int = 16
+
+    # one namespace / shard per (policy_type, department); filtered queries
+    # only search matching partitions, plus the default namespace while it
+    # still holds vectors indexed before partitioning (move them with
+    # `python -m app.ingestion --repartition`)
+    VECTOR_PARTITIONING: bool = True
+    VECTOR_PARTITION_QUERY_CONCURRENCY: int = 8
+
+    # hybrid retrieval: both rankings are cut at top_k * multiplier, then fused
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATE_MULTIPLIER: int = 2
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+
+    # indexing pipeline
+    PINECONE_UPSERT_BATCH_SIZE: int = 100
+    PINECONE_UPSERT_CONCURRENCY: int = 4
+    PINECONE_MAX_RETRIES: int = 5
+    PINECONE_RETRY_BASE_DELAY: float = 0.5  # seconds, doubled per attempt
 
     model_config = SettingsConfigDict(
         extra='ignore', 
@@ -18,23 +70,268 @@ class VectorSettings(BaseSettings):
 
 settings = VectorSettings()
 
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-index = pc.Index(settings.PINECONE_INDEX_NAME)
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+def build_vector_store(settings: VectorSettings, pool_threads: int = 1) -> VectorStore:
+    """The configured backend; app code gets the shared one from clients.vector_store."""
+    if settings.VECTOR_BACKEND == "local":
+        # numpy is only needed for the local backend
+        from app.local_vectorstore import PartitionedLocalVectorStore
+        return PartitionedLocalVectorStore(
+            settings.LOCAL_VECTOR_DIR,
+            ann_min_vectors=settings.LOCAL_ANN_MIN_VECTORS,
+            nlist=settings.LOCAL_ANN_LISTS,
+            nprobe=settings.LOCAL_ANN_NPROBE,
+        )
+    if settings.VECTOR_BACKEND == "pinecone":
+        if not settings.PINECONE_API_KEY or not settings.PINECONE_INDEX_NAME:
+            raise ValueError("PINECONE_API_KEY and PINECONE_INDEX_NAME are required when VECTOR_BACKEND=pinecone")
+        return PineconeVectorStore(settings.PINECONE_API_KEY, settings.PINECONE_INDEX_NAME, pool_threads=pool_threads)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND!r}")
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+# metadata fields encoded in partition (namespace) names
+PARTITION_FIELDS = ("policy_type", "department")
+
+
+def partition_for(policy_type: Optional[str], department: Optional[str]) -> str:
+    """Namespace for a (policy_type, department) pair, e.g. "security.Sales%20Ops"."""
+    if not settings.VECTOR_PARTITIONING:
+        return ""
+    return f"{policy_type or ''}.{quote(department or '', safe='')}"
+
+
+def _parse_partition(namespace: str) -> Optional[Dict[str, Optional[str]]]:
+    if "." not in namespace:
+        return None  # default namespace (pre-partitioning vectors)
+    policy_type, department = namespace.split(".", 1)
+    return {"policy_type": policy_type or None, "department": unquote(department) or None}
+
+
+def _document_partition(doc: Optional[models.PolicyDocument]) -> str:
+    if doc is None:
+        return partition_for(None, None)
+    return partition_for(doc.policy_type.value if doc.policy_type else None, doc.department)
+
+
+def _route_query(filters: Optional[Dict[str, Any]]) -> List[tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    (partition, filter) pairs a query has to search. Filters on
+    policy_type / department select partitions instead of being evaluated
+    per vector; other conditions are passed through. The default namespace
+    holds vectors indexed before partitioning, so it is searched with the
+    full filter.
+    """
+    if not settings.VECTOR_PARTITIONING:
+        return [("", filters)]
+
+    residual = dict(filters or {})
+    wanted: Dict[str, List[Any]] = {}
+    for field in PARTITION_FIELDS:
+        if field in residual:
+            op, value = filter_condition(residual.pop(field))
+            wanted[field] = [value] if op == "$eq" else value
+
+    routes = []
+    for namespace in clients.vector_store.namespaces():
+        fields = _parse_partition(namespace)
+        if fields is None:
+            routes.append((namespace, filters or None))
+        elif all(fields[f] in values for f, values in wanted.items()):
+            routes.append((namespace, residual or None))
+    return routes
+
+
+def _merge_matches(results: Iterable[List[Any]], top_k: int) -> List[Any]:
+    matches = [m for result in results for m in result]
+    matches.sort(key=lambda m: m.score, reverse=True)
+    return matches[:top_k]
+
+
+_partition_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_partition_pool() -> ThreadPoolExecutor:
+    global _partition_pool
+    if _partition_pool is None:
+        _partition_pool = ThreadPoolExecutor(
+            max_workers=settings.VECTOR_PARTITION_QUERY_CONCURRENCY,
+            thread_name_prefix="vector-query",
+        )
+    return _partition_pool
+
+
+def _embed_request(texts: List[str]) -> List[List[float]]:
     """Call OpenAI embeddings on a batch of texts."""
-    resp = client.embeddings.create(
+    resp = clients.openai.embeddings.create(
+        input=texts,
+        model=settings.EMBEDDING_MODEL,
+    )
+    return [d.embedding for d in resp.data]
+
+
+# shared by queries and ingestion, so concurrent single-text queries ride
+# along in the same embeddings call
+embedding_batcher = EmbeddingBatcher(_embed_request, embedding_batcher_settings)
+
+
+def _embed_remote(texts: List[str]) -> List[List[float]]:
+    if embedding_batcher_settings.EMBEDDING_BATCH_ENABLED:
+        return embedding_batcher.embed(texts)
+    return _embed_request(texts)
+
+
+async def _aembed_remote(texts: List[str]) -> List[List[float]]:
+    if embedding_batcher_settings.EMBEDDING_BATCH_ENABLED:
+        return await embedding_batcher.aembed(texts)
+    resp = await clients.async_openai.embeddings.create(
         input=texts,
-        model="text-embedding-3-small",
+        model=settings.EMBEDDING_MODEL,
     )
     return [d.embedding for d in resp.data]
 
 
-def index_policy_chunks(chunks: List[models.PolicyChunk]) -> None:
-    """Upsert a batch of PolicyChunk rows into Pinecone."""
+def _unique_missing(texts: List[str], keys: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+    return {k: t for k, t in zip(keys, texts) if k not in found}
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed a batch of texts. Cached embeddings (by model + text hash) are
+    reused, concurrent requests for the same text share one in-flight call,
+    and only the remaining texts go to OpenAI.
+    """
+    if not texts:
+        return []
+    model = settings.EMBEDDING_MODEL
+    keys = [text_hash(t) for t in texts]
+    found = embedding_cache.get_many(model, list(dict.fromkeys(keys)))
+
+    missing = _unique_missing(texts, keys, found)
+    if missing:
+        owned, waiting = inflight_embeddings.claim(list(missing))
+        if owned:
+            try:
+                fresh = dict(zip(owned, _embed_remote([missing[k] for k in owned])))
+            except BaseException as e:
+                inflight_embeddings.fail(owned, e)
+                raise
+            inflight_embeddings.resolve(fresh)
+            embedding_cache.put_many(model, fresh)
+            found.update(fresh)
+        for key, fut in waiting.items():
+            found[key] = fut.result()
+
+    return [found[k] for k in keys]
+
+
+async def aembed_texts(texts: List[str]) -> List[List[float]]:
+    """Async variant of embed_texts; cache I/O runs in a worker thread."""
+    if not texts:
+        return []
+    model = settings.EMBEDDING_MODEL
+    keys = [text_hash(t) for t in texts]
+    unique_keys = list(dict.fromkeys(keys))
+    found = embedding_cache.get_local(model, unique_keys)
+    not_local = [k for k in unique_keys if k not in found]
+    if not_local:
+        found.update(await asyncio.to_thread(embedding_cache.get_persistent, model, not_local))
+
+    missing = _unique_missing(texts, keys, found)
+    if missing:
+        owned, waiting = inflight_embeddings.claim(list(missing))
+        if owned:
+            try:
+                fresh = dict(zip(owned, await _aembed_remote([missing[k] for k in owned])))
+            except BaseException as e:
+                inflight_embeddings.fail(owned, e)
+                raise
+            inflight_embeddings.resolve(fresh)
+            await asyncio.to_thread(embedding_cache.put_many, model, fresh)
+            found.update(fresh)
+        for key, fut in waiting.items():
+            found[key] = await asyncio.wrap_future(fut)
+
+    return [found[k] for k in keys]
+
+
+def _chunk_vector(chunk: models.PolicyChunk, emb: List[float], doc: Optional[models.PolicyDocument]) -> dict:
+    metadata = {
+        "document_id": chunk.document_id,
+        "chunk_id": chunk.id,
+        "policy_type": doc.policy_type.value if doc and doc.policy_type else None,
+        "department": doc.department if doc else None,
+        "position": chunk.position,
+        "page_start": chunk.page_start,
+        "page_end": chunk.page_end,
+        "text": chunk.text,
+    }
+    return {
+        "id": f"chunk-{chunk.id}",
+        "values": emb,
+        # Pinecone rejects null metadata values
+        "metadata": {k: v for k, v in metadata.items() if v is not None},
+    }
+
+
+def _token_batches(chunks: List[models.PolicyChunk]) -> Iterator[List[models.PolicyChunk]]:
+    """Group chunks into embedding requests bounded by item count and estimated tokens."""
+    batch: List[models.PolicyChunk] = []
+    tokens = 0
+    for chunk in chunks:
+        chunk_tokens = estimate_tokens(chunk.text)
+        if batch and (
+            len(batch) >= embedding_batcher_settings.EMBEDDING_BATCH_MAX_ITEMS
+            or tokens + chunk_tokens > embedding_batcher_settings.EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += chunk_tokens
+    if batch:
+        yield batch
+
+
+def _is_transient(exc: Exception) -> bool:
+    """
+    Rate limits, server errors and network failures / timeouts are worth
+    retrying; anything else (4xx, bad input, bugs) is raised at once.
+    """
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(exc, _NETWORK_ERRORS)
+
+
+def _with_retries(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call fn, retrying transient failures with exponential backoff and jitter."""
+    for attempt in range(settings.PINECONE_MAX_RETRIES + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == settings.PINECONE_MAX_RETRIES or not _is_transient(e):
+                raise
+            delay = settings.PINECONE_RETRY_BASE_DELAY * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+
+
+def _upsert_batch(vectors: List[dict], namespace: str) -> int:
+    _with_retries(clients.vector_store.upsert, vectors, namespace)
+    return len(vectors)
+
+
+def index_policy_chunks(
+    chunks: List[models.PolicyChunk],
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> None:
+    """Upsert a batch of PolicyChunk rows into the vector store.
+
+    Chunks are embedded in token-budgeted batches and upserted in batches
+    of PINECONE_UPSERT_BATCH_SIZE on a pool of PINECONE_UPSERT_CONCURRENCY
+    threads (upserts overlap with embedding the next batch). Transient
+    failures are retried with backoff; on_progress(upserted, total) is
+    called as upsert batches complete. Each chunk goes to the partition
+    of its document's (policy_type, department).
+    """
     if not chunks:
         return
     
@@ -43,38 +340,162 @@ def index_policy_chunks(chunks: List[models.PolicyChunk]) -> None:
         if chunk.document_id not in documents_by_id:
             documents_by_id[chunk.document_id] = chunk.document
 
-    texts = [c.text for c in chunks]
-    embeddings = embed_texts(texts)
-
-    vectors = []
-    for chunk, emb in zip(chunks, embeddings):
-        doc = documents_by_id.get(chunk.document_id)
-        vectors.append(
-            {
-                "id": f"chunk-{chunk.id}",
-                "values": emb,
-                "metadata": {
-                    "document_id": chunk.document_id,
-                    "chunk_id": chunk.id,
-                    "policy_type": doc.policy_type.value if doc and doc.policy_type else None,
-                    "department": doc.department if doc else None,
-                    "text": chunk.text,
-                },
-            }
-        )
+    total = len(chunks)
+    done = 0
+    pending: set[Future] = set()
+
+    def collect(block: bool) -> None:
+        nonlocal done, pending
+        if not pending:
+            return
+        finished, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            done += fut.result()
+            if on_progress:
+                on_progress(done, total)
+
+    with ThreadPoolExecutor(max_workers=settings.PINECONE_UPSERT_CONCURRENCY) as pool:
+        for batch in _token_batches(chunks):
+            embeddings = embed_texts([c.text for c in batch])
+            by_partition: Dict[str, List[dict]] = {}
+            for chunk, emb in zip(batch, embeddings):
+                doc = documents_by_id.get(chunk.document_id)
+                by_partition.setdefault(_document_partition(doc), []).append(_chunk_vector(chunk, emb, doc))
+
+            # upsert to the vector store
+            size = settings.PINECONE_UPSERT_BATCH_SIZE
+            for namespace, vectors in by_partition.items():
+                for start in range(0, len(vectors), size):
+                    pending.add(pool.submit(_upsert_batch, vectors[start:start + size], namespace))
+            collect(block=False)
+
+        while pending:
+            collect(block=True)
+
 
-    # upsert to Pinecone
-    index.upsert(vectors=vectors)
+def delete_policy_chunks(chunk_ids: List[int], except_partition: Optional[str] = None) -> None:
+    """Remove the vectors of PolicyChunk rows from the vector store.
 
-def query_policy_chunks(query: str, top_k: int = 8, filters: Optional[Dict[str, Any]] = None,) -> List[models.PolicyChunk]:
-    """Query Pinecone for relevant PolicyChunk rows given a query string."""
-    query_emb = embed_texts([query])[0]
+    Vectors are deleted from every partition, since a document may have
+    moved between partitions; pass except_partition to keep the copies in
+    the document's current one (after re-indexing it there).
+    """
+    ids = [f"chunk-{chunk_id}" for chunk_id in chunk_ids]
+    namespaces = clients.vector_store.namespaces() if settings.VECTOR_PARTITIONING else [""]
+    for namespace in namespaces:
+        if namespace == except_partition:
+            continue
+        for start in range(0, len(ids), 1000):
+            _with_retries(clients.vector_store.delete, ids[start:start + 1000], namespace)
 
-    resp = index.query(
-        vector=query_emb,
-        top_k=top_k,
-        include_metadata=True,
-        filter=filters or {},
+
+def drop_legacy_vectors(chunk_ids: List[int]) -> None:
+    """Delete chunks' copies in the default namespace, once they are indexed in their partitions."""
+    if not settings.VECTOR_PARTITIONING:
+        return  # the default namespace is where they live
+    ids = [f"chunk-{chunk_id}" for chunk_id in chunk_ids]
+    for start in range(0, len(ids), 1000):
+        _with_retries(clients.vector_store.delete, ids[start:start + 1000], "")
+
+
+def _vector_query(query_emb: List[float], top_k: int, filters: Optional[Dict[str, Any]]) -> List[Any]:
+    routes = _route_query(filters)
+    if len(routes) == 1:
+        namespace, residual = routes[0]
+        return clients.vector_store.query(query_emb, top_k, residual, namespace)
+    results = _get_partition_pool().map(
+        lambda route: clients.vector_store.query(query_emb, top_k, route[1], route[0]),
+        routes,
     )
+    return _merge_matches(results, top_k)
+
+
+async def _avector_query(query_emb: List[float], top_k: int, filters: Optional[Dict[str, Any]]) -> List[Any]:
+    # listing Pinecone namespaces is a blocking call
+    routes = await asyncio.to_thread(_route_query, filters)
+    results = await asyncio.gather(*(
+        clients.vector_store.aquery(query_emb, top_k, residual, namespace)
+        for namespace, residual in routes
+    ))
+    return _merge_matches(results, top_k)
+
+
+def _match_chunk_id(match: Any) -> int:
+    chunk_id = (match.metadata or {}).get("chunk_id")
+    return int(chunk_id) if chunk_id is not None else int(match.id.removeprefix("chunk-"))
+
+
+def _fuse(vector_matches: List[Any], lexical_hits: List[lexical_index.LexicalHit], top_k: int) -> List[VectorMatch]:
+    """
+    Reciprocal rank fusion of vector and BM25 rankings. Chunks found only
+    by BM25 are loaded from the database so every result carries the same
+    metadata as a vector match; score is the fused RRF score.
+    """
+    rrf_k = settings.HYBRID_RRF_K
+    scores: Dict[int, float] = defaultdict(float)
+    metadata: Dict[int, dict] = {}
+    similarity: Dict[int, Optional[float]] = {}
+    bm25: Dict[int, float] = {}
+    for rank, match in enumerate(vector_matches):
+        chunk_id = _match_chunk_id(match)
+        scores[chunk_id] += 1.0 / (rrf_k + rank + 1)
+        metadata[chunk_id] = dict(match.metadata or {})
+        similarity[chunk_id] = vector_similarity(match)
+    for rank, hit in enumerate(lexical_hits):
+        scores[hit.chunk_id] += 1.0 / (rrf_k + rank + 1)
+        bm25[hit.chunk_id] = hit.score
+
+    top = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    missing = [chunk_id for chunk_id in top if chunk_id not in metadata]
+    for chunk_id, chunk in lexical_index.load_chunks(missing).items():
+        metadata[chunk_id] = _chunk_vector(chunk, [], chunk.document)["metadata"]
+
+    return [
+        VectorMatch(
+            id=f"chunk-{chunk_id}",
+            score=scores[chunk_id],
+            metadata=metadata[chunk_id],
+            vector_score=similarity.get(chunk_id),
+            lexical_score=bm25.get(chunk_id),
+        )
+        for chunk_id in top
+        if chunk_id in metadata  # deleted since it was indexed
+    ]
+
+
+def query_policy_chunks(query: str, top_k: int = 8, filters: Optional[Dict[str, Any]] = None, query_embedding: Optional[List[float]] = None,) -> List[models.PolicyChunk]:
+    """Query the vector store for relevant PolicyChunk rows given a query string.
+
+    Pass query_embedding when the caller has already embedded the query
+    (e.g. a batch request) to skip the embeddings call. Department /
+    policy_type filters are answered from the matching partitions only;
+    queries spanning several partitions merge their top-k by score.
+
+    With lexical search enabled, the vector ranking is fused with a BM25
+    ranking over the same filters, so exact-term matches (codenames, "NDA",
+    account numbers) surface even when their embeddings rank them low.
+    """
+    query_emb = query_embedding or embed_texts([query])[0]
+
+    if not lexical_settings.LEXICAL_SEARCH_ENABLED:
+        return _vector_query(query_emb, top_k, filters)
 
-    return resp.matches
+    depth = top_k * settings.HYBRID_CANDIDATE_MULTIPLIER
+    lexical_hits = _get_partition_pool().submit(lexical_index.search_with_session, query, depth, filters)
+    vector_matches = _vector_query(query_emb, depth, filters)
+    return _fuse(vector_matches, lexical_hits.result(), top_k)
+
+
+async def aquery_policy_chunks(query: str, top_k: int = 8, filters: Optional[Dict[str, Any]] = None, query_embedding: Optional[List[float]] = None,) -> List[models.PolicyChunk]:
+    """Async variant of query_policy_chunks."""
+    query_emb = query_embedding or (await aembed_texts([query]))[0]
+
+    if not lexical_settings.LEXICAL_SEARCH_ENABLED:
+        return await _avector_query(query_emb, top_k, filters)
+
+    depth = top_k * settings.HYBRID_CANDIDATE_MULTIPLIER
+    vector_matches, lexical_hits = await asyncio.gather(
+        _avector_query(query_emb, depth, filters),
+        asyncio.to_thread(lexical_index.search_with_session, query, depth, filters),
+    )
+    return await asyncio.to_thread(_fuse, vector_matches, lexical_hits, top_k)
@@ -0,0 +1,270 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.database import SessionLocal, get_async_sessionmaker
+from app.lru_cache import LRUCache
+
+
+class CacheSettings(BaseSettings):
+    COMPLIANCE_CACHE_ENABLED: bool = True
+    COMPLIANCE_CACHE_MAX_ENTRIES: int = 10_000
+    COMPLIANCE_CACHE_TTL_SECONDS: int = 3600
+    # also read/write the compliance_cache_entries table, shared by all workers
+    COMPLIANCE_CACHE_SHARED: bool = False
+    # how long a worker trusts its copy of the corpus version before re-reading it
+    COMPLIANCE_CACHE_VERSION_TTL_SECONDS: float = 5.0
+    # prune expired / excess shared entries every N shared writes
+    COMPLIANCE_CACHE_PRUNE_EVERY: int = 500
+
+    model_config = SettingsConfigDict(
+        extra="ignore",
+        env_file=".env",
+    )
+
+
+cache_settings = CacheSettings()
+
+
+# ---------- Keys ----------
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different drafts share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(
+    text: str,
+    department: Optional[str],
+    policy_type: Optional[models.PolicyType],
+    top_k: int,
+    corpus_version: int,
+    rewrite: str = "if_risky",
+) -> str:
+    parts = [
+        normalize_text(text),
+        department or "",
+        policy_type.value if policy_type else "",
+        str(top_k),
+        str(corpus_version),
+        rewrite,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+# ---------- Corpus version ----------
+
+def read_corpus_version(db: Session) -> int:
+    version = db.scalar(select(models.PolicyCorpusState.version).where(models.PolicyCorpusState.id == 1))
+    return version or 0
+
+
+def _increment_corpus_version(db: Session) -> None:
+    # increment in SQL so concurrent ingestions can't lose a bump, and
+    # upsert so two first bumps can't both insert row 1
+    state = models.PolicyCorpusState
+    now = datetime.now()
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(state).values(id=1, version=1, updated_at=now)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"version": state.version + 1, "updated_at": now},
+        ))
+        return
+    result = db.execute(update(state).where(state.id == 1).values(version=state.version + 1, updated_at=now))
+    if result.rowcount == 0:
+        db.add(state(id=1, version=1))
+
+
+def bump_corpus_version(db: Session) -> int:
+    """
+    Mark the policy corpus as changed. Every cached verdict is keyed on the
+    version, so bumping it invalidates them all; the shared tier is purged
+    and this worker's LRU is cleared right away.
+    """
+    _increment_corpus_version(db)
+    if cache_settings.COMPLIANCE_CACHE_SHARED:
+        db.execute(delete(models.ComplianceCacheEntry))
+    db.commit()
+
+    version = read_corpus_version(db)
+    verdict_cache.on_corpus_changed(version)
+    return version
+
+
+# ---------- Verdict cache ----------
+
+class VerdictCache:
+    """
+    Two-tier cache of ComplianceCheckResponse dicts in front of compliance_app:
+    an in-process LRU and, optionally, the shared compliance_cache_entries table.
+    """
+
+    def __init__(self, settings: CacheSettings):
+        self.settings = settings
+        self.local = LRUCache(settings.COMPLIANCE_CACHE_MAX_ENTRIES, settings.COMPLIANCE_CACHE_TTL_SECONDS)
+        self._version: Optional[int] = None
+        self._version_read_at = 0.0
+        self._shared_writes = 0
+        # bumped from the event loop and from threadpool workers
+        self._counters_lock = threading.Lock()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    # --- corpus version ---
+
+    def on_corpus_changed(self, version: int) -> None:
+        self._version = version
+        self._version_read_at = time.monotonic()
+        self.local.clear()
+
+    def _current_version(self) -> int:
+        """Blocking: may read policy_corpus_state."""
+        now = time.monotonic()
+        if self._version is None or now - self._version_read_at > self.settings.COMPLIANCE_CACHE_VERSION_TTL_SECONDS:
+            with SessionLocal() as db:
+                version = read_corpus_version(db)
+            if self._version is not None and version != self._version:
+                self.local.clear()
+            self._version = version
+            self._version_read_at = now
+        return self._version
+
+    async def akey(self, body: schemas.ComplianceCheckRequest) -> Optional[str]:
+        """Cache key for a request, or None if the cache is disabled/unavailable."""
+        if not self.settings.COMPLIANCE_CACHE_ENABLED:
+            return None
+        try:
+            fresh = (
+                self._version is not None
+                and time.monotonic() - self._version_read_at <= self.settings.COMPLIANCE_CACHE_VERSION_TTL_SECONDS
+            )
+            version = self._version if fresh else await run_in_threadpool(self._current_version)
+        except Exception:
+            # a cache we can't version is a cache we can't trust; just bypass it
+            self._count("errors")
+            return None
+        return cache_key(body.text, body.department, body.policy_type, body.top_k, version, body.rewrite.value)
+
+    # --- lookups ---
+
+    def _shared_get(self, key: str) -> Optional[dict]:
+        with SessionLocal() as db:
+            entry = db.get(models.ComplianceCacheEntry, key)
+            if entry is None or entry.expires_at < datetime.now():
+                return None
+            return schemas.ComplianceCheckResponse.model_validate_json(entry.response).model_dump()
+
+    async def _ashared_get(self, key: str) -> Optional[dict]:
+        maker = get_async_sessionmaker()
+        if maker is None:
+            return await run_in_threadpool(self._shared_get, key)
+        async with maker() as db:
+            entry = await db.get(models.ComplianceCacheEntry, key)
+            if entry is None or entry.expires_at < datetime.now():
+                return None
+            return schemas.ComplianceCheckResponse.model_validate_json(entry.response).model_dump()
+
+    def _shared_set(self, key: str, response: dict) -> None:
+        payload = schemas.ComplianceCheckResponse.model_validate(response).model_dump_json()
+        now = datetime.now()
+        with SessionLocal() as db:
+            db.merge(
+                models.ComplianceCacheEntry(
+                    key=key,
+                    response=payload,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.settings.COMPLIANCE_CACHE_TTL_SECONDS),
+                )
+            )
+            db.commit()
+
+            with self._counters_lock:
+                self._shared_writes += 1
+                prune = self._shared_writes % self.settings.COMPLIANCE_CACHE_PRUNE_EVERY == 0
+            if prune:
+                self._prune_shared(db)
+
+    def _prune_shared(self, db: Session) -> None:
+        """Drop expired entries, then the oldest ones beyond COMPLIANCE_CACHE_MAX_ENTRIES."""
+        db.execute(delete(models.ComplianceCacheEntry).where(models.ComplianceCacheEntry.expires_at < datetime.now()))
+        excess = (db.scalar(select(func.count()).select_from(models.ComplianceCacheEntry)) or 0) - self.settings.COMPLIANCE_CACHE_MAX_ENTRIES
+        if excess > 0:
+            oldest = (
+                select(models.ComplianceCacheEntry.key)
+                .order_by(models.ComplianceCacheEntry.created_at)
+                .limit(excess)
+            )
+            db.execute(delete(models.ComplianceCacheEntry).where(models.ComplianceCacheEntry.key.in_(oldest)))
+        db.commit()
+
+    async def aget(self, key: Optional[str]) -> Optional[dict]:
+        if key is None:
+            return None
+
+        response = self.local.get(key)
+        if response is not None:
+            self._count("local_hits")
+            return response
+
+        if self.settings.COMPLIANCE_CACHE_SHARED:
+            try:
+                response = await self._ashared_get(key)
+            except Exception:
+                self._count("errors")
+                response = None
+            if response is not None:
+                self._count("shared_hits")
+                self.local.set(key, response)
+                return response
+
+        self._count("misses")
+        return None
+
+    async def aset(self, key: Optional[str], response: dict) -> None:
+        if key is None:
+            return
+        self.local.set(key, response)
+        self._count("stores")
+
+        if self.settings.COMPLIANCE_CACHE_SHARED:
+            try:
+                await run_in_threadpool(self._shared_set, key, response)
+            except Exception:
+                self._count("errors")
+
+    # --- metrics ---
+
+    def _count(self, name: str) -> None:
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        hits = counters["local_hits"] + counters["shared_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+            "corpus_version": self._version,
+            "shared_enabled": self.settings.COMPLIANCE_CACHE_SHARED,
+        }
+
+
+verdict_cache = VerdictCache(cache_settings)